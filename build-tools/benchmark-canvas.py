@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""Frame times of the raster and the OpenGL canvas for a zoom sweep and a
+pan over a large synthetic image.
+
+    python build-tools/benchmark-canvas.py [--size 8000x6000] [--frames 40] [--opengl]
+
+Only the raster canvas is measured unless --opengl is given. Without a GPU,
+run that under X with Mesa's software renderer (llvmpipe):
+
+    LIBGL_ALWAYS_SOFTWARE=1 python build-tools/benchmark-canvas.py --opengl
+
+For the raster canvas, "paint" is the GUI thread paint and "frame" the time
+until the full quality frame rendered off the GUI thread is on screen. The
+OpenGL canvas paints in full quality right away; its times include glFinish().
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from libs.canvas import Canvas
+from libs.perfCounters import percentile
+from libs.tileGrid import TileGrid, buildMipmaps
+
+
+def makeImage(width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    p = QPainter(image)
+    gradient = QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QColor(30, 90, 160))
+    gradient.setColorAt(1, QColor(220, 180, 60))
+    p.fillRect(image.rect(), gradient)
+    p.setPen(QPen(QColor(0, 0, 0), 3))
+    for x in range(0, width, 97):
+        p.drawLine(x, 0, width - x, height)
+    p.end()
+    return image
+
+
+def glFinisher(canvas):
+    """A callable waiting for the GL commands of canvas to complete."""
+    canvas.makeCurrent()
+    context = canvas.context()
+    if context.isOpenGLES():
+        return lambda: None
+    profile = QOpenGLVersionProfile()
+    profile.setVersion(2, 0)
+    functions = context.versionFunctions(profile)
+    if functions is None:
+        return lambda: None
+    functions.initializeOpenGLFunctions()
+
+    def finish():
+        canvas.makeCurrent()
+        functions.glFinish()
+    return finish
+
+
+def steps(canvas, scroll, frames):
+    """(name, scale, scroll x, scroll y) of the zoom sweep and the pan."""
+    view = scroll.viewport().size()
+    fit = min(view.width() / float(canvas.imageSize.width()), view.height() / float(canvas.imageSize.height()))
+    for i in range(frames):
+        yield 'zoom', fit * (2.0 / fit) ** (i / float(frames - 1)), None, None
+    for i in range(frames):
+        yield 'pan', 1.0, 40 * i, 25 * i
+
+
+def run(canvas, scroll, frames):
+    app = QApplication.instance()
+    finish = glFinisher(canvas) if not canvas.renderOffThread else None
+    times = {}
+    for name, scale, x, y in steps(canvas, scroll, frames):
+        canvas.scale = scale
+        canvas.adjustSize()
+        app.processEvents()
+        if x is not None:
+            scroll.horizontalScrollBar().setValue(x)
+            scroll.verticalScrollBar().setValue(y)
+        start = time.perf_counter()
+        canvas.repaint()
+        if finish is not None:
+            finish()
+        paint = (time.perf_counter() - start) * 1000.0
+        if canvas.renderOffThread:
+            # Until the frame for this view is rendered and blitted
+            while canvas._frameRequest is not None:
+                canvas.renderer.wait()
+                app.processEvents()
+            canvas.repaint()
+        frame = (time.perf_counter() - start) * 1000.0
+        times.setdefault((name, 'paint'), []).append(paint)
+        times.setdefault((name, 'frame'), []).append(frame)
+    return times
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    argparser.add_argument('--size', default='8000x6000', help='image size, WxH')
+    argparser.add_argument('--frames', type=int, default=40, help='frames per scenario')
+    argparser.add_argument('--view', default='1280x800', help='viewport size, WxH')
+    argparser.add_argument('--opengl', action='store_true', help='measure the OpenGL canvas as well')
+    args = argparser.parse_args()
+    width, height = [int(v) for v in args.size.split('x')]
+    viewWidth, viewHeight = [int(v) for v in args.view.split('x')]
+
+    app = QApplication(sys.argv[:1])
+    image = makeImage(width, height)
+    mipmaps = buildMipmaps(image)
+    backends = [('raster', Canvas, QScrollArea)]
+    if args.opengl:
+        try:
+            from libs.glCanvas import GLCanvas, GLScrollArea, openGLAvailable
+        except ImportError:
+            openGLAvailable = lambda: False
+        if not openGLAvailable():
+            argparser.error('OpenGL is not available')
+        backends.append(('opengl', GLCanvas, GLScrollArea))
+
+    print('%dx%d image, %dx%d view, %d frames per scenario'
+          % (width, height, viewWidth, viewHeight, args.frames))
+    print('%-7s %-5s %-6s %8s %8s' % ('canvas', 'steps', 'time', 'p50 ms', 'p95 ms'))
+    for backend, canvasClass, scrollClass in backends:
+        canvas, scroll = canvasClass(), scrollClass()
+        scroll.setWidget(canvas)
+        scroll.setWidgetResizable(True)
+        scroll.resize(viewWidth, viewHeight)
+        scroll.show()
+        tiles = TileGrid(image)
+        tiles.setMipmaps(mipmaps)
+        canvas.loadTiles(tiles)
+        # Warm up the tile pixmaps or textures
+        run(canvas, scroll, 4)
+        times = run(canvas, scroll, args.frames)
+        kinds = ('paint', 'frame') if canvas.renderOffThread else ('paint',)
+        for name, kind in [(name, kind) for name in ('zoom', 'pan') for kind in kinds]:
+            values = sorted(times[(name, kind)])
+            print('%-7s %-5s %-6s %8.1f %8.1f'
+                  % (backend, name, kind, percentile(values, 0.50), percentile(values, 0.95)))
+        canvas.renderer.shutdown()
+        scroll.close()
+
+
+if __name__ == '__main__':
+    main()
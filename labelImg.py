@@ -33,13 +33,29 @@ from libs.utils import *
 from libs.settings import Settings
 from libs.stringBundle import StringBundle
 from libs.canvas import Canvas
+from libs.dirScanner import DirScanner
+from libs.dirWatcher import DirWatcher
+from libs.fileCatalog import FileCatalog
+from libs.fileListModel import FileListModel
+try:
+    from libs.glCanvas import GLCanvas, GLScrollArea, openGLAvailable
+except ImportError:
+    GLCanvas = None
 from libs.zoomWidget import ZoomWidget
 from libs.attributeTable import AttributeTable
 from libs.attributeDialog import AttributeDialog
 from libs.attributeFile import AttributeFile, AttributeFileError, AttributeFileFormat, ATTRIBUTE_KEYS
 from libs.toolBar import ToolBar
-from libs.attributeJSONIO import AttributeJSONWriter, AttributeJSONReader
-from libs.attributeJSONIO import JSON_EXT
+from libs.attributeJSONIO import AttributeJSONWriter
+from libs.attributeJSONIO import JSON_EXT, readSidecar
+from libs.imageCache import ImageCache, imageKey, mipmapKey
+from libs.imagePrefetcher import ImagePrefetcher
+from libs.imageLoader import ImageLoader
+from libs.perfOverlay import PerfOverlay
+from libs.tileGrid import MipmapBuilder, TileGrid
+from libs.tilePyramid import PyramidBuilder
+from libs.thumbnailAtlas import ThumbnailAtlas
+from libs.thumbnailView import ThumbnailModel, ThumbnailView
 from libs.ustr import ustr
 
 __appname__ = 'David Corbitt Photo Organizer'
@@ -66,8 +82,9 @@ class WindowMixin(object):
 
 class MainWindow(QMainWindow, WindowMixin):
     FIT_WINDOW, FIT_WIDTH, MANUAL_ZOOM = list(range(3))
+    fullImageDecoded = pyqtSignal(str, QImage)
 
-    def __init__(self, defaultFilename=None, defaultSaveDir=None):
+    def __init__(self, defaultFilename=None, defaultSaveDir=None, openGL=False):
         super(MainWindow, self).__init__()
         self.setWindowTitle(__appname__)
 
@@ -89,10 +106,42 @@ class MainWindow(QMainWindow, WindowMixin):
         self.defaultSaveDir = defaultSaveDir
         self.attributeFileFormat = settings.get(SETTING_ATTRIBUTE_FILE_FORMAT, AttributeFileFormat.JSON)
         # For loading all image under a directory
-        self.mImgFileList = []
+        self.mImgFileList = FileCatalog()
         self.dirname = None
         self.globalLabelList = []
         self.lastOpenDir = None
+        # Decoded images are kept in a byte-budgeted LRU cache, which the prefetcher fills
+        # with the neighbours of the current image, following the direction of navigation
+        self.imageCache = ImageCache(settings.get(SETTING_IMAGE_CACHE_SIZE, DEFAULT_IMAGE_CACHE_SIZE) * 1024 * 1024)
+        self.prefetcher = ImagePrefetcher(self.imageCache,
+                                          ahead=settings.get(SETTING_PREFETCH_AHEAD, 3),
+                                          behind=settings.get(SETTING_PREFETCH_BEHIND, 1))
+        self.navDirection = 1
+        # Images are read and decoded off the GUI thread; only the latest request is shown
+        self.imageLoader = ImageLoader(self.prefetcher, self)
+        self.imageLoader.opened.connect(self.fileOpened)
+        self.imageLoader.thumbnailLoaded.connect(self.showThumbnail)
+        self.imageLoader.loaded.connect(self.imageLoaded)
+        self.imageLoader.tilesLoaded.connect(self.tilesLoaded)
+        # Large images get a tile pyramid on disk so that reopening them needs no decode
+        self.pyramidBuilder = PyramidBuilder(settings.get(SETTING_PYRAMID_MIN_PIXELS, DEFAULT_PYRAMID_MIN_PIXELS))
+        self.mipmapBuilder = MipmapBuilder(self.imageCache)
+        # Path whose full resolution is being decoded to replace a preview
+        self.fullImagePending = None
+        self.fullImageDecoded.connect(self.swapInFullImage)
+        # Persistent thumbnails of the opened folder, filled in the background
+        self.thumbnailAtlas = None
+        # Folders are listed off the GUI thread and streamed into the file list
+        self.dirScanner = DirScanner(self)
+        self.dirScanner.found.connect(self.dirScanned)
+        self.dirScanner.restored.connect(self.dirScanRestored)
+        self.dirScanner.finished.connect(self.dirScanFinished)
+        # ... and followed afterwards, as images are added, deleted and renamed
+        self.dirWatcher = DirWatcher(self)
+        self.dirWatcher.changed.connect(self.dirChanged)
+        self.dirWatcher.fileChanged.connect(self.sidecarChanged)
+        # (size, mtime) of the current image, to recognise it when renamed
+        self.imgFileStat = None
 
         # Whether we need to save or not.
         self.dirty = False
@@ -125,11 +174,26 @@ class MainWindow(QMainWindow, WindowMixin):
         self.photoAttributeDock.setObjectName(getStr('attributes'))
         self.photoAttributeDock.setWidget(tableWidgetContainer)
 
-        self.fileListWidget = QListWidget()
-        self.fileListWidget.itemDoubleClicked.connect(self.fileitemDoubleClicked)
+        # The file list and the thumbnail grid show the same model over mImgFileList
+        self.fileListModel = FileListModel(self)
+        self.fileListView = QListView()
+        # Rows are laid out without measuring every item, a batch at a time,
+        # so appending and selecting stay cheap in large folders
+        self.fileListView.setUniformItemSizes(True)
+        self.fileListView.setLayoutMode(QListView.Batched)
+        self.fileListView.setModel(self.fileListModel)
+        self.fileListView.doubleClicked.connect(self.fileitemDoubleClicked)
         fileListLayout = QVBoxLayout()
         fileListLayout.setContentsMargins(0, 0, 0, 0)
-        fileListLayout.addWidget(self.fileListWidget)
+        fileListLayout.addWidget(self.fileListView)
+        # Alternate grid of thumbnails, only decoding what is visible
+        self.thumbnailModel = ThumbnailModel(self)
+        self.thumbnailModel.setSourceModel(self.fileListModel)
+        self.thumbnailView = ThumbnailView()
+        self.thumbnailView.setModel(self.thumbnailModel)
+        self.thumbnailView.doubleClicked.connect(self.fileitemDoubleClicked)
+        self.thumbnailView.hide()
+        fileListLayout.addWidget(self.thumbnailView)
         fileListContainer = QWidget()
         fileListContainer.setLayout(fileListLayout)
 
@@ -139,11 +203,19 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.zoomWidget = ZoomWidget()
 
-        self.canvas = Canvas(parent=self)
+        # The OpenGL canvas has not been benchmarked yet: it is only used
+        # when asked for on the command line, and not remembered.
+        openGLFallback = False
+        if openGL and GLCanvas is not None and openGLAvailable():
+            self.canvas = GLCanvas(parent=self)
+            scroll = GLScrollArea()
+        else:
+            openGLFallback = openGL
+            self.canvas = Canvas(parent=self)
+            scroll = QScrollArea()
         self.canvas.zoomRequest.connect(self.zoomRequest)
         self.canvas.setDrawingShapeToSquare(settings.get(SETTING_DRAW_SQUARE, False))
 
-        scroll = QScrollArea()
         scroll.setWidget(self.canvas)
         scroll.setWidgetResizable(True)
         self.scrollBars = {
@@ -152,8 +224,10 @@ class MainWindow(QMainWindow, WindowMixin):
         }
         self.scrollArea = scroll
         self.canvas.scrollRequest.connect(self.scrollRequest)
+        self.canvas.panRequest.connect(self.panRequest)
 
         self.setCentralWidget(scroll)
+        self.perfOverlay = PerfOverlay(self.canvas.perf, parent=scroll.viewport())
         self.addDockWidget(Qt.RightDockWidgetArea, self.photoAttributeDock)
         self.addDockWidget(Qt.RightDockWidgetArea, self.fileDock)
 
@@ -205,6 +279,11 @@ class MainWindow(QMainWindow, WindowMixin):
         fitWidth = action(getStr('fitWidth'), self.setFitWidth,
                           'Ctrl+Shift+F', 'fit-width', getStr('fitWidthDetail'),
                           checkable=True, enabled=False)
+        thumbnailGrid = action(getStr('thumbnailGrid'), self.setThumbnailGrid,
+                               'Ctrl+Shift+G', None, getStr('thumbnailGridDetail'), checkable=True)
+        perfOverlay = action(getStr('perfOverlay'), self.perfOverlay.setActive,
+                             'Ctrl+Shift+P', None, getStr('perfOverlayDetail'), checkable=True)
+
         # Group zoom controls into a list for easier toggling.
         zoomActions = (self.zoomWidget, zoomIn, zoomOut,
                        zoomOrg, fitWindow, fitWidth)
@@ -224,6 +303,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.actions = struct(save=save, open=open, close=close, resetAll = resetAll,
                               zoom=zoom, zoomIn=zoomIn, zoomOut=zoomOut, zoomOrg=zoomOrg,
                               fitWindow=fitWindow, fitWidth=fitWidth,
+                              thumbnailGrid=thumbnailGrid, perfOverlay=perfOverlay,
                               zoomActions=zoomActions,
                               fileMenuActions=(
                                   open, opendir, save, close, resetAll, quit),
@@ -246,7 +326,8 @@ class MainWindow(QMainWindow, WindowMixin):
         self.singleClassMode.setChecked(settings.get(SETTING_SINGLE_CLASS, False))
 
         addActions(self.menus.file, (open, opendir, self.menus.recentFiles, save, close, resetAll, quit))
-        addActions(self.menus.view, (self.autoSaving, None, zoomIn, zoomOut, zoomOrg, None, fitWindow, fitWidth))
+        addActions(self.menus.view, (self.autoSaving, None, zoomIn, zoomOut, zoomOrg, None, fitWindow, fitWidth,
+                                     None, thumbnailGrid, perfOverlay))
 
         self.menus.file.aboutToShow.connect(self.updateFileMenu)
 
@@ -295,8 +376,13 @@ class MainWindow(QMainWindow, WindowMixin):
             self.statusBar().showMessage('%s started. Attributes will be saved to %s' %
                                          (__appname__, self.defaultSaveDir))
             self.statusBar().show()
+        if openGLFallback:
+            self.status('OpenGL is not available, using the raster canvas')
 
         self.restoreState(settings.get(SETTING_WIN_STATE, QByteArray()))
+        if settings.get(SETTING_THUMBNAIL_GRID, False):
+            thumbnailGrid.setChecked(True)
+            self.setThumbnailGrid(True)
 
         # Populate the File menu dynamically.
         self.updateFileMenu()
@@ -314,6 +400,17 @@ class MainWindow(QMainWindow, WindowMixin):
         self.labelCoordinates = QLabel('')
         self.statusBar().addPermanentWidget(self.labelCoordinates)
 
+        # Progress and cancellation of the folder scan
+        self.scanProgress = QProgressBar()
+        self.scanProgress.setRange(0, 0)
+        self.scanProgress.setMaximumWidth(120)
+        self.scanCancel = QToolButton()
+        self.scanCancel.setText(getStr('cancelScan'))
+        self.scanCancel.clicked.connect(self.cancelDirScan)
+        for widget in (self.scanProgress, self.scanCancel):
+            widget.hide()
+            self.statusBar().addPermanentWidget(widget)
+
         # Open Folder if default file
         if self.imgFilePath and os.path.isdir(self.imgFilePath):
             self.openDirDialog(dirpath=self.imgFilePath, silent=True)
@@ -343,7 +440,11 @@ class MainWindow(QMainWindow, WindowMixin):
         self.attributeTableWidget.clear()
         self.imgFilePath = None
         self.imageData = None
+        self.image = QImage()
         self.attributeFile = None
+        self.imgFileStat = None
+        self.fullImagePending = None
+        self.imageLoader.cancel()
         self.canvas.resetState()
 
     def currentItem(self):
@@ -427,15 +528,22 @@ class MainWindow(QMainWindow, WindowMixin):
             self.setDirty()
 
     # Tzutalin 20160906 : Add file list and photoAttributeDock to move faster
-    def fileitemDoubleClicked(self, item=None):
-        currIndex = self.mImgFileList.index(ustr(item.text()))
+    def fileitemDoubleClicked(self, index):
+        currIndex = index.row()
         if currIndex < len(self.mImgFileList):
             filename = self.mImgFileList[currIndex]
             if filename:
                 if self.dirty is True:
                     self.saveFile()
+                position = self.mImgFileList.position(self.imgFilePath)
+                if position is not None:
+                    self.navDirection = 1 if currIndex >= position else -1
                 self.loadFile(filename)
 
+    def setThumbnailGrid(self, value=True):
+        self.fileListView.setVisible(not value)
+        self.thumbnailView.setVisible(value)
+
     # React to canvas signals.
     def shapeSelectionChanged(self, selected=False):
         if self._noSelectionSlot:
@@ -509,7 +617,14 @@ class MainWindow(QMainWindow, WindowMixin):
     def scrollRequest(self, delta, orientation):
         units = - delta / (8 * 15)
         bar = self.scrollBars[orientation]
-        bar.setValue(bar.value() + bar.singleStep() * units)
+        bar.setValue(int(bar.value() + bar.singleStep() * units))
+
+    def panRequest(self, dx, dy):
+        """Scroll so that the image point grabbed for panning, now dx, dy
+        image units away, is back under the cursor."""
+        for orientation, delta in ((Qt.Horizontal, dx), (Qt.Vertical, dy)):
+            bar = self.scrollBars[orientation]
+            bar.setValue(int(round(bar.value() - delta * self.canvas.scale)))
 
     def setZoom(self, value):
         self.actions.fitWidth.setChecked(False)
@@ -558,7 +673,7 @@ class MainWindow(QMainWindow, WindowMixin):
         # zoom in
         units = delta / (8 * 15)
         scale = 10
-        self.addZoom(scale * units)
+        self.addZoom(int(round(scale * units)))
 
         # get the difference in scrollbar values
         # this is how far we can move
@@ -569,8 +684,8 @@ class MainWindow(QMainWindow, WindowMixin):
         new_h_bar_value = h_bar.value() + move_x * d_h_bar_max
         new_v_bar_value = v_bar.value() + move_y * d_v_bar_max
 
-        h_bar.setValue(new_h_bar_value)
-        v_bar.setValue(new_v_bar_value)
+        h_bar.setValue(int(new_h_bar_value))
+        v_bar.setValue(int(new_v_bar_value))
 
     def setFitWindow(self, value=True):
         if value:
@@ -604,15 +719,19 @@ class MainWindow(QMainWindow, WindowMixin):
         unicodeFilePath = os.path.abspath(unicodeFilePath)
         # Tzutalin 20160906 : Add file list and photoAttributeDock to move faster
         # Highlight the file item
-        if unicodeFilePath and self.fileListWidget.count() > 0:
-            if unicodeFilePath in self.mImgFileList:
-                index = self.mImgFileList.index(unicodeFilePath)
-                fileWidgetItem = self.fileListWidget.item(index)
-                fileWidgetItem.setSelected(True)
+        index = self.mImgFileList.position(unicodeFilePath)
+        if unicodeFilePath and index is None:
+            # A file from elsewhere: the folder being scanned is left
+            self.stopDirScan()
+            self.dirWatcher.stop()
+        if unicodeFilePath and self.mImgFileList:
+            if index is not None:
+                self.selectFileItem(index)
             else:
-                self.fileListWidget.clear()
-                self.mImgFileList.clear()
-        if unicodeFilePath and os.path.exists(unicodeFilePath):
+                self.mImgFileList = FileCatalog()
+                self.fileListModel.setFilePaths(self.mImgFileList)
+                self.prefetcher.clear()
+        if unicodeFilePath:
             if AttributeFile.isAttributeFile(unicodeFilePath):
                 self.errorMessage(u'Error opening file',
                                   u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
@@ -628,45 +747,73 @@ class MainWindow(QMainWindow, WindowMixin):
                 #     self.status("Error reading %s" % unicodeFilePath)
                 #     return False
             else:
-                # Load image:
-                # read data first and store for saving into attribute file.
-                # not initiating attribute file yet. (intentially set as None)
-                reader = QImageReader(unicodeFilePath)
-                reader.setAutoTransform(True)
-                self.imageData = reader.read()
-                self.attributeFile = None
                 self.canvas.verified = False
 
-            if isinstance(self.imageData, QImage):
-                image = self.imageData
-            else:
-                image = QImage.fromData(self.imageData)
-            if image.isNull():
-                self.errorMessage(u'Error opening file',
-                                  u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
-                self.status("Error reading %s" % unicodeFilePath)
-                return False
-            self.status("Loaded %s" % os.path.basename(unicodeFilePath))
-            self.image = image
+            # Show the file name right away. Its stat, attributes and pixels
+            # follow from the image loader, which does all the disk access.
             self.imgFilePath = unicodeFilePath
-            self.canvas.loadPixmap(QPixmap.fromImage(image))
-            if not self.attributeFile:
-                self.attributeFile = AttributeFile(unicodeFilePath)
-                self.loadJsonByFilename(self.attributeFile.jsonFilePath)
+            self.attributeFile = AttributeFile(unicodeFilePath)
 
             self.setClean()
-            self.canvas.setEnabled(True)
-            self.adjustScale(initial=True)
-            self.paintCanvas()
             self.addRecentFile(self.imgFilePath)
-            self.toggleActions(True)
             self.setWindowTitle(__appname__ + ' ' + filePath)
-            self.canvas.setFocus(True)
             self.lastOpenDir = os.path.dirname(filePath)
             self.defaultSaveDir = self.lastOpenDir
+            self.status("Loading %s..." % os.path.basename(unicodeFilePath), 0)
+            self.imageLoader.request(unicodeFilePath, self.previewSize(), self.attributeFile.jsonFilePath)
+            self.pyramidBuilder.request(unicodeFilePath)
+            if index is not None:
+                self.prefetcher.prefetch(self.mImgFileList, index, self.navDirection, self.previewSize())
             return True
         return False
 
+    def fileOpened(self, generation, filePath, opened):
+        """Take in what the image loader found about the file being loaded
+        before its pixels: its stat and attributes."""
+        if not self.imageLoader.isCurrent(generation) or filePath != self.imgFilePath:
+            return
+        if opened.stat is None:
+            self.resetState()
+            self.setWindowTitle(__appname__)
+            self.status("Cannot open %s" % filePath)
+            return
+        self.imgFileStat = (opened.stat.st_size, opened.stat.st_mtime_ns)
+        self.loadAttributes(opened.attributes)
+        self.setClean()
+        self.dirWatcher.setFile(self.attributeFile.jsonFilePath)
+
+    def imageLoaded(self, generation, filePath, image, fullSize):
+        if not self.imageLoader.isCurrent(generation) or filePath != self.imgFilePath:
+            return
+        if image.isNull():
+            self.errorMessage(u'Error opening file',
+                              u"<p>Make sure <i>%s</i> is a valid image file." % filePath)
+            self.status("Error reading %s" % filePath)
+            return
+        self.showImage(image, fullSize)
+
+    def tilesLoaded(self, generation, filePath, tiles, image):
+        """Show a file that needs no decoding: a pyramid, with its overview
+        as the image, or a mapped file."""
+        if not self.imageLoader.isCurrent(generation) or filePath != self.imgFilePath:
+            return
+        self.showImage(image, tiles.imageSize, tiles)
+
+    def showImage(self, image, fullSize, tiles=None):
+        """Display the decoded image of the current file, or its tiles if
+        they come from somewhere else (e.g. a pyramid)."""
+        self.status("Loaded %s" % os.path.basename(self.imgFilePath))
+        self.imageData = self.image = image
+        if tiles is not None:
+            self.canvas.loadTiles(tiles)
+        else:
+            self.canvas.loadImage(image, fullSize)
+        self.canvas.setEnabled(True)
+        self.adjustScale(initial=True)
+        self.paintCanvas()
+        self.toggleActions(True)
+        self.canvas.setFocus(True)
+
     def resizeEvent(self, event):
         if self.canvas and not self.image.isNull()\
            and self.zoomMode != self.MANUAL_ZOOM:
@@ -675,31 +822,90 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def paintCanvas(self):
         assert not self.image.isNull(), "cannot paint null image"
-        self.canvas.scale = 0.01 * self.zoomWidget.value()
-        self.canvas.labelFontSize = int(0.02 * max(self.image.width(), self.image.height()))
+        with self.canvas.perf.timer('paintCanvas'):
+            self.canvas.scale = 0.01 * self.zoomWidget.value()
+            self.canvas.labelFontSize = int(0.02 * max(self.canvas.imageSize.width(), self.canvas.imageSize.height()))
+            self.canvas.adjustSize()
+            self.canvas.update()
+            self.refineImage()
+            self.requestMipmaps()
+
+    def previewSize(self):
+        """Device pixel size of the area the image is shown in."""
+        ratio = self.devicePixelRatioF()
+        area = self.centralWidget().size()
+        return QSize(int(area.width() * ratio), int(area.height() * ratio))
+
+    def refineImage(self):
+        """Start decoding the full resolution once the preview would be magnified."""
+        if self.imgFilePath is None or self.fullImagePending == self.imgFilePath\
+           or self.canvas.tiles is None or self.canvas.tiles.sourceFactor() >= 1:
+            return
+        previewScale = self.canvas.tiles.sourceFactor()
+        if self.canvas.scale * self.devicePixelRatioF() > previewScale * 1.01:
+            filePath = self.fullImagePending = self.imgFilePath
+            future = self.prefetcher.decode(filePath)
+            future.add_done_callback(
+                lambda f: f.cancelled() or self.fullImageDecoded.emit(filePath, f.result()))
+
+    def requestMipmaps(self):
+        """Have the image halved in the background once it is shown at less
+        than half its resolution."""
+        tiles = self.canvas.tiles
+        if self.imgFilePath is None or not isinstance(tiles, TileGrid) or tiles.hasMipmaps()\
+           or self.canvas.scale * self.devicePixelRatioF() >= tiles.sourceFactor() / 2:
+            return
+        try:
+            key = mipmapKey(imageKey(self.imgFilePath), tiles.image.size())
+        except OSError:
+            return
+        self.mipmapBuilder.request(tiles, key)
+
+    def showThumbnail(self, generation, filePath, thumbnail, fullSize):
+        """Paint the embedded EXIF/JFIF thumbnail, upscaled to fit the window,
+        while the image itself is decoded."""
+        if not self.imageLoader.isCurrent(generation) or filePath != self.imgFilePath:
+            return
+        self.canvas.loadImage(thumbnail, fullSize)
+        self.canvas.scale = self.scaleFitWindow()
         self.canvas.adjustSize()
-        self.canvas.update()
+        self.canvas.repaint()
+
+    def swapInFullImage(self, filePath, image):
+        if filePath != self.imgFilePath or image.isNull():
+            return
+        self.image = self.imageData = image
+        self.canvas.replaceImage(image)
 
     def adjustScale(self, initial=False):
-        value = self.scalers[self.FIT_WINDOW if initial else self.zoomMode]()
-        self.zoomWidget.setValue(int(100 * value))
+        with self.canvas.perf.timer('adjustScale'):
+            value = self.scalers[self.FIT_WINDOW if initial else self.zoomMode]()
+            self.zoomWidget.setValue(int(100 * value))
+
+    def perfCounters(self):
+        """Paint timings and sizes shown by the developer overlay, together
+        with the image cache and prefetcher counters."""
+        counters = self.canvas.perf.counters()
+        counters['imageCache'] = self.imageCache.counters()
+        counters['prefetcher'] = self.prefetcher.counters()
+        return counters
 
     def scaleFitWindow(self):
-        """Figure out the size of the pixmap in order to fit the main widget."""
+        """Figure out the size of the image in order to fit the main widget."""
         e = 2.0  # So that no scrollbars are generated.
         w1 = self.centralWidget().width() - e
         h1 = self.centralWidget().height() - e
         a1 = w1 / h1
-        # Calculate a new scale value based on the pixmap's aspect ratio.
-        w2 = self.canvas.pixmap.width() - 0.0
-        h2 = self.canvas.pixmap.height() - 0.0
+        # Calculate a new scale value based on the image's aspect ratio.
+        w2 = self.canvas.imageSize.width() - 0.0
+        h2 = self.canvas.imageSize.height() - 0.0
         a2 = w2 / h2
         return w1 / w2 if a2 >= a1 else h1 / h2
 
     def scaleFitWidth(self):
         # The epsilon does not seem to work too well here.
         w = self.centralWidget().width() - 2.0
-        return w / self.canvas.pixmap.width()
+        return w / self.canvas.imageSize.width()
 
     def closeEvent(self, event):
         if not self.mayContinue():
@@ -728,25 +934,23 @@ class MainWindow(QMainWindow, WindowMixin):
             settings[SETTING_SAVE_DIR] = ustr('')
         settings[SETTING_AUTO_SAVE] = self.autoSaving.isChecked()
         settings[SETTING_ATTRIBUTE_FILE_FORMAT] = self.attributeFileFormat
+        settings[SETTING_IMAGE_CACHE_SIZE] = self.imageCache.budget // (1024 * 1024)
+        settings[SETTING_THUMBNAIL_GRID] = self.actions.thumbnailGrid.isChecked()
         settings.save()
+        self.imageLoader.shutdown()
+        self.pyramidBuilder.shutdown()
+        self.mipmapBuilder.shutdown()
+        self.canvas.renderer.shutdown()
+        self.prefetcher.shutdown()
+        self.dirScanner.shutdown()
+        self.dirWatcher.shutdown()
+        self.thumbnailModel.loader.stop()
+        self.closeThumbnailAtlas()
 
     def loadRecent(self, filename):
         if self.mayContinue():
             self.loadFile(filename)
 
-    def scanAllImages(self, folderPath):
-        extensions = ['.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats()]
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relativePath))
-                    images.append(path)
-        natural_sort(images, key=lambda x: x.lower())
-        return images
-
     def changeSavedirDialog(self, _value=False):
         self.defaultSaveDir = os.path.dirname(self.imgFilePath)
         return
@@ -776,12 +980,144 @@ class MainWindow(QMainWindow, WindowMixin):
         self.lastOpenDir = dirpath
         self.dirname = dirpath
         self.imgFilePath = None
-        self.fileListWidget.clear()
-        self.mImgFileList = self.scanAllImages(dirpath)
-        self.openNextImg()
-        for imgPath in self.mImgFileList:
-            item = QListWidgetItem(imgPath)
-            self.fileListWidget.addItem(item)
+        self.prefetcher.clear()
+        self.closeThumbnailAtlas()
+        self.dirWatcher.stop()
+        # The file list model appends the scanned paths to this same list
+        self.mImgFileList = FileCatalog()
+        self.fileListModel.setFilePaths(self.mImgFileList)
+        self.dirScanner.scan(dirpath)
+        self.showScanProgress(True)
+        self.status('Scanning %s...' % dirpath, 0)
+
+    def dirScanned(self, generation, filePaths, folders):
+        if not self.dirScanner.isCurrent(generation):
+            return
+        if filePaths:
+            first = not self.mImgFileList
+            self.fileListModel.appendFilePaths(filePaths)
+            if first:
+                self.openNextImg()
+        self.status('Scanning %s: %d images in %d folders' % (self.dirname, len(self.mImgFileList), folders), 0)
+
+    def dirScanRestored(self, generation, catalog):
+        """List the images saved from the last scan while it is checked."""
+        if not self.dirScanner.isCurrent(generation):
+            return
+        self.mImgFileList = catalog
+        self.fileListModel.setFilePaths(self.mImgFileList)
+        if catalog:
+            self.openNextImg()
+        self.status('Checking %s for changes...' % self.dirname, 0)
+
+    def dirScanFinished(self, generation, catalog, snapshot):
+        """Put the file list in natural order once the scan is complete."""
+        if not self.dirScanner.isCurrent(generation):
+            return
+        self.showScanProgress(False)
+        if catalog == self.mImgFileList:
+            # Same rows, but only the scan's catalog is in natural order for
+            # the images added later and for next/previous.
+            self.mImgFileList = self.fileListModel.filePaths = catalog
+        else:
+            self.mImgFileList = catalog
+            self.fileListModel.setFilePaths(self.mImgFileList)
+            index = self.mImgFileList.position(self.imgFilePath)
+            if index is not None:
+                self.selectFileItem(index)
+        self.status('%d images in %s' % (len(self.mImgFileList), self.dirname))
+        self.openThumbnailAtlas(self.dirname)
+        unwatched = self.dirWatcher.watch(snapshot)
+        if unwatched:
+            self.status('%d images in %s, %d of %d folders not watched for changes' % (
+                len(self.mImgFileList), self.dirname, unwatched, len(snapshot.folders)))
+
+    def dirChanged(self, generation, change):
+        """Apply images added, deleted and renamed in the opened folder."""
+        if not self.dirWatcher.isCurrent(generation):
+            return
+        self.dirWatcher.addFolders(change.folders)
+        for filePath in change.removed:
+            self.fileListModel.removeFilePath(filePath)
+        for filePath in change.added:
+            self.fileListModel.insertFilePath(filePath)
+        self.status('%d images in %s: %d added, %d removed' % (
+            len(self.mImgFileList), self.dirname, len(change.added), len(change.removed)))
+        current = self.imgFilePath
+        if current is None:
+            if self.mImgFileList:
+                self.loadFile(self.mImgFileList[0])
+            return
+        if current in self.mImgFileList:
+            return
+        renamed = [filePath for filePath, stat in change.added.items() if stat == self.imgFileStat]
+        if renamed:
+            self.currentFileRenamed(renamed[0])
+        elif self.dirty:
+            self.status('%s was deleted; its labels are not saved' % os.path.basename(current))
+        else:
+            filePath = self.mImgFileList.next(current) or self.mImgFileList.previous(current)
+            if filePath is not None:
+                self.loadFile(filePath)
+            else:
+                self.resetState()
+                self.setClean()
+                self.toggleActions(False)
+
+    def currentFileRenamed(self, filePath):
+        """Keep showing the current image, under its new name, with the
+        sidecar of that name."""
+        self.imgFilePath = filePath
+        self.attributeFile = AttributeFile(filePath)
+        self.dirWatcher.setFile(self.attributeFile.jsonFilePath)
+        if not self.dirty and os.path.isfile(self.attributeFile.jsonFilePath):
+            self.loadJsonByFilename(self.attributeFile.jsonFilePath)
+            self.setClean()
+        self.setWindowTitle(__appname__ + ' ' + filePath)
+        self.selectFileItem(self.mImgFileList.index(filePath))
+
+    def sidecarChanged(self, jsonPath):
+        """Show attributes written by someone else, unless ours are unsaved."""
+        if self.dirty or self.attributeFile is None or jsonPath != self.attributeFile.jsonFilePath:
+            return
+        if os.path.isfile(jsonPath):
+            self.loadJsonByFilename(jsonPath)
+            self.setClean()
+
+    def stopDirScan(self):
+        self.dirScanner.cancel()
+        self.showScanProgress(False)
+
+    def cancelDirScan(self):
+        """Keep the images listed so far, in the order they were found."""
+        self.stopDirScan()
+        self.status('Scan cancelled, %d images listed' % len(self.mImgFileList))
+        self.openThumbnailAtlas(self.dirname)
+
+    def showScanProgress(self, value):
+        self.scanProgress.setVisible(value)
+        self.scanCancel.setVisible(value)
+
+    def selectFileItem(self, index):
+        self.fileListView.setCurrentIndex(self.fileListModel.index(index))
+        self.thumbnailView.setCurrentIndex(self.thumbnailModel.index(index, 0))
+
+    def openThumbnailAtlas(self, dirpath):
+        self.closeThumbnailAtlas()
+        try:
+            self.thumbnailAtlas = ThumbnailAtlas(os.path.join(dirpath, CACHE_DIR_NAME))
+        except (IOError, OSError) as e:
+            # e.g. a read-only collection: browse without persistent thumbnails
+            self.status('Thumbnail cache unavailable: %s' % e)
+            return
+        self.thumbnailModel.setAtlas(self.thumbnailAtlas)
+        self.thumbnailAtlas.fill(self.mImgFileList.table())
+
+    def closeThumbnailAtlas(self):
+        if self.thumbnailAtlas is not None:
+            self.thumbnailModel.setAtlas(None)
+            self.thumbnailAtlas.close()
+            self.thumbnailAtlas = None
 
     def openPrevImg(self, _value=False):
         # Proceding prev image without dialog if having any label
@@ -802,11 +1138,14 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.imgFilePath is None:
             return
 
-        currIndex = self.mImgFileList.index(self.imgFilePath)
-        if currIndex - 1 >= 0:
-            filename = self.mImgFileList[currIndex - 1]
-            if filename:
-                self.loadFile(filename)
+        filename = self.mImgFileList.previous(self.imgFilePath)
+        while filename and not os.path.exists(filename):
+            # Deleted, and not (yet) reported by the watcher
+            self.fileListModel.removeFilePath(filename)
+            filename = self.mImgFileList.previous(filename)
+        if filename:
+            self.navDirection = -1
+            self.loadFile(filename)
 
     def openNextImg(self, _value=False):
         # Proceding prev image without dialog if having any label
@@ -824,15 +1163,17 @@ class MainWindow(QMainWindow, WindowMixin):
         if len(self.mImgFileList) <= 0:
             return
 
-        filename = None
         if self.imgFilePath is None:
             filename = self.mImgFileList[0]
         else:
-            currIndex = self.mImgFileList.index(self.imgFilePath)
-            if currIndex + 1 < len(self.mImgFileList):
-                filename = self.mImgFileList[currIndex + 1]
+            filename = self.mImgFileList.next(self.imgFilePath)
+        while filename and not os.path.exists(filename):
+            # Deleted, and not (yet) reported by the watcher
+            self.fileListModel.removeFilePath(filename)
+            filename = self.mImgFileList.next(filename)
 
         if filename:
+            self.navDirection = 1
             self.loadFile(filename)
 
     def openFile(self, _value=False):
@@ -928,12 +1269,7 @@ class MainWindow(QMainWindow, WindowMixin):
         pass
 
     def loadJsonByFilename(self, jsonPath):
-        if not os.path.isfile(jsonPath):
-            jsonNewWriter = AttributeJSONWriter(jsonPath, attributeDict={})
-            jsonNewWriter.write()
-            self.attributeDict = {}
-        jsonParseReader = AttributeJSONReader(jsonPath)
-        self.loadAttributes(jsonParseReader.attributeDict)
+        self.loadAttributes(readSidecar(jsonPath))
 
 def get_main_app(argv=[]):
     """
@@ -947,9 +1283,12 @@ def get_main_app(argv=[]):
     argparser = argparse.ArgumentParser()
     argparser.add_argument("image_dir", nargs="?")
     argparser.add_argument("save_dir", nargs="?")
+    # Not listed while the OpenGL canvas has not been benchmarked against
+    # the raster one.
+    argparser.add_argument("--opengl", action="store_true", help=argparse.SUPPRESS)
     args = argparser.parse_args(argv[1:])
     # Usage : labelImg.py image predefClassFile saveDir
-    win = MainWindow(args.image_dir, args.save_dir)
+    win = MainWindow(args.image_dir, args.save_dir, args.opengl)
     win.show()
     return app, win
 
@@ -60,3 +60,11 @@ class AttributeJSONReader:
 
         if loadedJSONDict.get("image", "") == self.filenameWithoutExt:
             self.attributeDict = loadedJSONDict
+
+
+def readSidecar(jsonPath):
+    """The attributes in the sidecar file jsonPath, which is created with
+    empty ones if there is none yet."""
+    if not os.path.isfile(jsonPath):
+        AttributeJSONWriter(jsonPath, attributeDict={}).write()
+    return AttributeJSONReader(jsonPath).attributeDict
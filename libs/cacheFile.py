@@ -0,0 +1,79 @@
+import json
+import os
+import struct
+import sys
+from array import array
+
+# Files of the cache folder start with this, the version of their format
+# and the length of a JSON header. The blobs the header lists follow it.
+CACHE_FILE_MAGIC = b'labelImg'
+_PREFIX = struct.Struct('<8sII')
+
+
+def writeCacheFile(path, version, header, blobs):
+    """Write header, a dict of JSON values, and blobs, bytes or arrays, to
+    path. The file is replaced at once, so readers never see half of it."""
+    blobs = [arrayBytes(blob) if isinstance(blob, array) else bytes(blob) for blob in blobs]
+    header = dict(header, blobs=[len(blob) for blob in blobs])
+    encoded = json.dumps(header).encode('utf-8')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(_PREFIX.pack(CACHE_FILE_MAGIC, version, len(encoded)))
+        f.write(encoded)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(path + '.tmp', path)
+
+
+def readCacheFile(path, version):
+    """(header, blobs) of a file written by writeCacheFile() with version.
+    Raises ValueError if the file is anything else, e.g. cut short."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _PREFIX.size:
+        raise ValueError('%s is too short' % path)
+    magic, fileVersion, headerLength = _PREFIX.unpack_from(data)
+    if magic != CACHE_FILE_MAGIC or fileVersion != version:
+        raise ValueError('%s is not a version %d cache file' % (path, version))
+    offset = _PREFIX.size + headerLength
+    header = json.loads(data[_PREFIX.size:offset].decode('utf-8'))
+    lengths = header.get('blobs') if isinstance(header, dict) else None
+    if (not isinstance(lengths, list) or not all(isinstance(n, int) and n >= 0 for n in lengths)
+            or offset + sum(lengths) != len(data)):
+        raise ValueError('%s does not match its header' % path)
+    blobs = []
+    for length in lengths:
+        blobs.append(data[offset:offset + length])
+        offset += length
+    return header, blobs
+
+
+def arrayBytes(values):
+    """The items of an array as little-endian bytes."""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def bytesArray(typecode, data, count):
+    """The array of count items written by arrayBytes() as data."""
+    values = array(typecode)
+    if len(data) != count * values.itemsize:
+        raise ValueError('expected %d items of type %r' % (count, typecode))
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def joinNames(names):
+    """Strings, none of which holds a NUL, as one blob."""
+    return '\0'.join(names).encode('utf-8', 'surrogateescape')
+
+
+def splitNames(data, count):
+    """The count strings joined by joinNames() into data."""
+    names = data.decode('utf-8', 'surrogateescape').split('\0') if count else []
+    if len(names) != count:
+        raise ValueError('expected %d names' % count)
+    return names
@@ -7,9 +7,13 @@ except ImportError:
     from PyQt4.QtGui import *
     from PyQt4.QtCore import *
 
-#from PyQt4.QtOpenGL import *
+import time
 
+from libs.canvasRenderer import CanvasRenderer
+from libs.perfCounters import PerfCounters
 from libs.shape import Shape
+from libs.shapeIndex import ShapeIndex
+from libs.tileGrid import TileGrid
 from libs.utils import distance
 
 CURSOR_DEFAULT = Qt.ArrowCursor
@@ -18,12 +22,22 @@ CURSOR_DRAW = Qt.CrossCursor
 CURSOR_MOVE = Qt.ClosedHandCursor
 CURSOR_GRAB = Qt.OpenHandCursor
 
-# class Canvas(QGLWidget):
+# Pan steps, wheel zoom steps and status bar updates are coalesced to one
+# per this many ms.
+FRAME_INTERVAL = 16
+# The image is painted fast while zooming or panning, and again in full
+# quality once there was no interaction for this many ms.
+IDLE_INTERVAL = 150
+# Widget pixels rendered around the visible area, so short pans still show
+# a rendered frame.
+FRAME_MARGIN = 256
 
+class CanvasBase(object):
+    """The canvas logic, shared by Canvas and the OpenGL canvas."""
 
-class Canvas(QWidget):
     zoomRequest = pyqtSignal(int)
     scrollRequest = pyqtSignal(int, int)
+    panRequest = pyqtSignal(float, float)
     newShape = pyqtSignal()
     selectionChanged = pyqtSignal(bool)
     shapeMoved = pyqtSignal()
@@ -32,12 +46,18 @@ class Canvas(QWidget):
     CREATE, EDIT = list(range(2))
 
     epsilon = 11.0
+    # Render frames on a worker thread and blit them, see requestFrame()
+    renderOffThread = True
 
     def __init__(self, *args, **kwargs):
-        super(Canvas, self).__init__(*args, **kwargs)
+        super(CanvasBase, self).__init__(*args, **kwargs)
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
+        # Grid of the shape bounding boxes for hit testing, kept in step with self.shapes
+        self.shapeIndex = ShapeIndex()
+        # Paint timings and sizes for the developer overlay
+        self.perf = PerfCounters()
         self.current = None
         self.selectedShape = None  # save the selected shape here
         self.selectedShapeCopy = None
@@ -48,7 +68,11 @@ class Canvas(QWidget):
         self.offsets = QPointF(), QPointF()
         self.scale = 1.0
         self.labelFontSize = 8
-        self.pixmap = QPixmap()
+        # The image is painted from a grid of tiles, only where exposed.
+        self.tiles = None
+        # Size of the image in image coordinates. The tiles may hold a
+        # lower resolution preview that is stretched over this area.
+        self.imageSize = QSize()
         self.visible = {}
         self._hideBackround = False
         self.hideBackround = False
@@ -66,6 +90,31 @@ class Canvas(QWidget):
 
         #initialisation for panning
         self.pan_initial_pos = QPoint()
+        # Pan delta, wheel zoom and coordinates text waiting for the next frame
+        self._pendingPan = None
+        self._pendingZoom = 0
+        self._pendingCoordinates = None
+        self._frameTimer = QTimer(self)
+        self._frameTimer.setSingleShot(True)
+        self._frameTimer.setInterval(FRAME_INTERVAL)
+        self._frameTimer.timeout.connect(self.flushFrame)
+        # Set while the user zooms or pans, see beginInteraction()
+        self.interactive = False
+        self._idleTimer = QTimer(self)
+        self._idleTimer.setSingleShot(True)
+        self._idleTimer.setInterval(IDLE_INTERVAL)
+        self._idleTimer.timeout.connect(self.endInteraction)
+        # The image and the background shapes are rendered into frames off
+        # the GUI thread; paintEvent blits them and paints the rest on top.
+        self.renderer = CanvasRenderer(self.perf, parent=self)
+        self.renderer.frameReady.connect(self.frameRendered)
+        # Bumped whenever the image or what the shape layer shows changes
+        self._sceneVersion = 0
+        self._frameShapes = None
+        # (view, sceneVersion, rect, image layer, shape layer) of the last
+        # frame, and (generation, view, sceneVersion, rect) of the one pending
+        self._frame = None
+        self._frameRequest = None
 
     def setDrawingColor(self, qColor):
         self.drawingLineColor = qColor
@@ -105,6 +154,148 @@ class Canvas(QWidget):
     def selectedVertex(self):
         return self.hVertex is not None
 
+    def toWidgetRect(self, rect):
+        """Widget pixels covered by rect, given in image coordinates."""
+        s = self.scale
+        offset = self.offsetToCenter()
+        return QRectF((rect.left() + offset.x()) * s, (rect.top() + offset.y()) * s,
+                      rect.width() * s, rect.height() * s).toAlignedRect()
+
+    def shapeRect(self, shape):
+        """Widget area painted by shape, including its vertices, outline and label."""
+        if shape is None or not len(shape):
+            return QRect()
+        rect = shape.boundingRect()
+        if shape.paintLabel and shape.label:
+            font = QFont()
+            font.setPointSize(self.labelFontSize)
+            font.setBold(True)
+            metrics = QFontMetricsF(font)
+            rect = rect.united(QRectF(rect.left(), rect.top() - metrics.height(),
+                                      metrics.width(shape.label), 2 * metrics.height() + 1.25 * self.labelFontSize))
+        # Highlighted vertices are drawn at up to 4 times point_size pixels.
+        margin = 2 * Shape.point_size + 2
+        return self.toWidgetRect(rect).adjusted(-margin, -margin, margin, margin)
+
+    def crosshairRegion(self, point):
+        if point.isNull():
+            return QRegion()
+        width = int(self.scale) + 2
+        line = self.toWidgetRect(QRectF(point, point))
+        image = self.toWidgetRect(QRectF(QPointF(0, 0), QSizeF(self.imageSize)))
+        return QRegion(line.x() - width, image.top(), 2 * width, image.height()).united(
+            QRegion(image.left(), line.y() - width, image.width(), 2 * width))
+
+    def drawingRegion(self):
+        """Widget area of the shape being drawn and of the crosshair."""
+        region = self.crosshairRegion(self.prevPoint)
+        if self.current:
+            region = region.united(QRegion(self.shapeRect(self.current)))
+            # The guide line is painted as a shape and spans the rectangle drawn.
+            region = region.united(QRegion(self.shapeRect(self.line)))
+        return region
+
+    def updateShapes(self, *shapes):
+        region = QRegion()
+        for shape in shapes:
+            region = region.united(QRegion(self.shapeRect(shape)))
+        self.update(region)
+
+    def setCoordinates(self, text):
+        """Show text in the status bar with the next frame."""
+        self._pendingCoordinates = text
+        if not self._frameTimer.isActive():
+            self._frameTimer.start()
+
+    def requestPan(self, dx, dy):
+        """Pan by the latest delta with the next frame. Until then the view
+        does not move, so the latest delta already includes the earlier ones."""
+        self._pendingPan = (dx, dy)
+        if not self._frameTimer.isActive():
+            self._frameTimer.start()
+
+    def requestZoom(self, delta):
+        """Zoom by the wheel deltas received until the next frame, as one step."""
+        self._pendingZoom += delta
+        if not self._frameTimer.isActive():
+            self._frameTimer.start()
+
+    def flushFrame(self):
+        if self._pendingCoordinates is not None:
+            self.parent().window().labelCoordinates.setText(self._pendingCoordinates)
+            self._pendingCoordinates = None
+        if self._pendingZoom:
+            delta, self._pendingZoom = self._pendingZoom, 0
+            self.zoomRequest.emit(delta)
+        if self._pendingPan is not None:
+            dx, dy = self._pendingPan
+            self._pendingPan = None
+            self.panRequest.emit(dx, dy)
+
+    def beginInteraction(self):
+        """Paint with nearest neighbour scaling and without antialiasing
+        until the user stopped zooming or panning for IDLE_INTERVAL ms."""
+        self.interactive = True
+        self._idleTimer.start()
+
+    def endInteraction(self):
+        self.interactive = False
+        self.update()
+
+    def invalidateFrame(self):
+        """The image or the background shapes changed since the last frame."""
+        self._sceneVersion += 1
+
+    def frameView(self):
+        offset = self.offsetToCenter()
+        return (self.scale, self.devicePixelRatioF(), offset.x(), offset.y(), self.labelFontSize)
+
+    def backgroundShapes(self):
+        """Copies of the shapes on the shape layer of frames: the visible
+        ones, except the selected shape that moves with the mouse."""
+        if self._frameShapes is None or self._frameShapes[0] != self._sceneVersion:
+            shapes = []
+            if not self._hideBackround:
+                for shape in self.shapes:
+                    if not shape.selected and self.isVisible(shape):
+                        copy = shape.copy()
+                        copy.fill = False
+                        shapes.append(copy)
+            self._frameShapes = (self._sceneVersion, shapes)
+        return self._frameShapes[1]
+
+    def requestFrame(self, view):
+        """Render a frame of the visible area for view unless one is pending."""
+        visible = self.visibleRegion().boundingRect()
+        request = self._frameRequest
+        if visible.isEmpty() or request is not None and request[1:3] == (view, self._sceneVersion) \
+           and request[3].contains(visible):
+            return
+        m = FRAME_MARGIN
+        rect = visible.adjusted(-m, -m, m, m).intersected(self.rect())
+        generation = self.renderer.request(self.tiles, self.backgroundShapes(), rect, self.scale,
+                                           self.devicePixelRatioF(), self.offsetToCenter())
+        self._frameRequest = (generation, view, self._sceneVersion, rect)
+
+    def frameRendered(self, generation, image, shapes):
+        request = self._frameRequest
+        if request is None or request[0] != generation:
+            return
+        self._frameRequest = None
+        self._frame = (request[1], request[2], request[3], image, shapes)
+        self.update(request[3])
+
+    def discardFrames(self):
+        """Drop the frames and wait for the one being rendered, which may
+        read the pixels of the image being unloaded."""
+        self.renderer.discard()
+        self._frame = self._frameRequest = self._frameShapes = None
+
+    def setHoverTip(self, text):
+        if self.toolTip() != text:
+            self.setToolTip(text)
+            self.setStatusTip(text)
+
     def mouseMoveEvent(self, ev):
         """Update line with last point and current coordinates."""
         pos = self.transformPos(ev.pos())
@@ -112,17 +303,17 @@ class Canvas(QWidget):
         # Update coordinates in status bar if image is opened
         window = self.parent().window()
         if window.imgFilePath is not None:
-            self.parent().window().labelCoordinates.setText(
-                'X: %d; Y: %d' % (pos.x(), pos.y()))
+            self.setCoordinates('X: %d; Y: %d' % (pos.x(), pos.y()))
 
         # Polygon drawing.
         if self.drawing():
             self.overrideCursor(CURSOR_DRAW)
+            dirty = self.drawingRegion()
             if self.current:
                 # Display annotation width and height while drawing
                 currentWidth = abs(self.current[0].x() - pos.x())
                 currentHeight = abs(self.current[0].y() - pos.y())
-                self.parent().window().labelCoordinates.setText(
+                self.setCoordinates(
                         'Width: %d, Height: %d / X: %d; Y: %d' % (currentWidth, currentHeight, pos.x(), pos.y()))
 
                 color = self.drawingLineColor
@@ -130,7 +321,7 @@ class Canvas(QWidget):
                     # Don't allow the user to draw outside the pixmap.
                     # Clip the coordinates to 0 or max,
                     # if they are outside the range [0, max]
-                    size = self.pixmap.size()
+                    size = self.imageSize
                     clipped_x = min(max(0, pos.x()), size.width())
                     clipped_y = min(max(0, pos.y()), size.height())
                     pos = QPointF(clipped_x, clipped_y)
@@ -158,46 +349,49 @@ class Canvas(QWidget):
                 self.current.highlightClear()
             else:
                 self.prevPoint = pos
-            self.repaint()
+            self.update(dirty.united(self.drawingRegion()))
             return
 
         # Polygon copy moving.
         if Qt.RightButton & ev.buttons():
             if self.selectedShapeCopy and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
+                dirty = self.shapeRect(self.selectedShapeCopy)
                 self.boundedMoveShape(self.selectedShapeCopy, pos)
-                self.repaint()
+                self.update(QRegion(dirty).united(QRegion(self.shapeRect(self.selectedShapeCopy))))
             elif self.selectedShape:
                 self.selectedShapeCopy = self.selectedShape.copy()
-                self.repaint()
+                self.updateShapes(self.selectedShapeCopy)
             return
 
         # Polygon/Vertex moving.
         if Qt.LeftButton & ev.buttons():
             if self.selectedVertex():
+                dirty = self.shapeRect(self.hShape)
                 self.boundedMoveVertex(pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(QRegion(dirty).united(QRegion(self.shapeRect(self.hShape))))
             elif self.selectedShape and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
+                dirty = self.shapeRect(self.selectedShape)
                 self.boundedMoveShape(self.selectedShape, pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.update(QRegion(dirty).united(QRegion(self.shapeRect(self.selectedShape))))
             else:
                 #pan
-                delta_x = pos.x() - self.pan_initial_pos.x()
-                delta_y = pos.y() - self.pan_initial_pos.y()
-                self.scrollRequest.emit(delta_x, Qt.Horizontal)
-                self.scrollRequest.emit(delta_y, Qt.Vertical)
-                self.update()
+                self.beginInteraction()
+                self.requestPan(pos.x() - self.pan_initial_pos.x(), pos.y() - self.pan_initial_pos.y())
             return
 
         # Just hovering over the canvas, 2 posibilities:
         # - Highlight shapes
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
-        self.setToolTip("Image")
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        # Only the shapes whose highlight changes are repainted.
+        previous = self.hShape, self.hVertex
+        for shape in self.shapeIndex.query(pos, self.epsilon):
+            if not self.isVisible(shape):
+                continue
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             index = shape.nearestVertex(pos, self.epsilon)
@@ -207,26 +401,24 @@ class Canvas(QWidget):
                 self.hVertex, self.hShape = index, shape
                 shape.highlightVertex(index, shape.MOVE_VERTEX)
                 self.overrideCursor(CURSOR_POINT)
-                self.setToolTip("Click & drag to move point")
-                self.setStatusTip(self.toolTip())
-                self.update()
+                self.setHoverTip("Click & drag to move point")
                 break
             elif shape.containsPoint(pos):
                 if self.selectedVertex():
                     self.hShape.highlightClear()
                 self.hVertex, self.hShape = None, shape
-                self.setToolTip(
+                self.setHoverTip(
                     "Click & drag to move shape '%s'" % shape.label)
-                self.setStatusTip(self.toolTip())
                 self.overrideCursor(CURSOR_GRAB)
-                self.update()
                 break
         else:  # Nothing found, clear highlights, reset state.
             if self.hShape:
                 self.hShape.highlightClear()
-                self.update()
             self.hVertex, self.hShape = None, None
+            self.setHoverTip("Image")
             self.overrideCursor(CURSOR_DEFAULT)
+        if (self.hShape, self.hVertex) != previous:
+            self.updateShapes(previous[0], self.hShape)
 
     def mousePressEvent(self, ev):
         pos = self.transformPos(ev.pos())
@@ -277,11 +469,14 @@ class Canvas(QWidget):
         #del shape.line_color
         if copy:
             self.shapes.append(shape)
+            self.shapeIndex.insert(shape)
             self.selectedShape.selected = False
             self.selectedShape = shape
+            self.invalidateFrame()
             self.repaint()
         else:
             self.selectedShape.points = [p for p in shape.points]
+            self.shapeIndex.update(self.selectedShape)
         self.selectedShapeCopy = None
 
     def hideBackroundShapes(self, value):
@@ -314,6 +509,7 @@ class Canvas(QWidget):
 
     def setHiding(self, enable=True):
         self._hideBackround = self.hideBackround if enable else False
+        self.invalidateFrame()
 
     def canCloseShape(self):
         return self.drawing() and self.current and len(self.current) > 2
@@ -341,7 +537,7 @@ class Canvas(QWidget):
             shape.highlightVertex(index, shape.MOVE_VERTEX)
             self.selectShape(shape)
             return self.hVertex
-        for shape in reversed(self.shapes):
+        for shape in self.shapeIndex.query(point):
             if self.isVisible(shape) and shape.containsPoint(point):
                 self.selectShape(shape)
                 self.calculateOffsets(shape, point)
@@ -361,11 +557,11 @@ class Canvas(QWidget):
         Moves a point x,y to within the boundaries of the canvas.
         :return: (x,y,snapped) where snapped is True if x or y were changed, False if not.
         """
-        if x < 0 or x > self.pixmap.width() or y < 0 or y > self.pixmap.height():
+        if x < 0 or x > self.imageSize.width() or y < 0 or y > self.imageSize.height():
             x = max(x, 0)
             y = max(y, 0)
-            x = min(x, self.pixmap.width())
-            y = min(y, self.pixmap.height())
+            x = min(x, self.imageSize.width())
+            y = min(y, self.imageSize.height())
             return x, y, True
 
         return x, y, False
@@ -374,7 +570,7 @@ class Canvas(QWidget):
         index, shape = self.hVertex, self.hShape
         point = shape[index]
         if self.outOfPixmap(pos):
-            size = self.pixmap.size()
+            size = self.imageSize
             clipped_x = min(max(0, pos.x()), size.width())
             clipped_y = min(max(0, pos.y()), size.height())
             pos = QPointF(clipped_x, clipped_y)
@@ -405,6 +601,7 @@ class Canvas(QWidget):
             rshift = QPointF(0, shiftPos.y())
         shape.moveVertexBy(rindex, rshift)
         shape.moveVertexBy(lindex, lshift)
+        self.shapeIndex.update(shape)
 
     def boundedMoveShape(self, shape, pos):
         if self.outOfPixmap(pos):
@@ -414,8 +611,8 @@ class Canvas(QWidget):
             pos -= QPointF(min(0, o1.x()), min(0, o1.y()))
         o2 = pos + self.offsets[1]
         if self.outOfPixmap(o2):
-            pos += QPointF(min(0, self.pixmap.width() - o2.x()),
-                           min(0, self.pixmap.height() - o2.y()))
+            pos += QPointF(min(0, self.imageSize.width() - o2.x()),
+                           min(0, self.imageSize.height() - o2.y()))
         # The next line tracks the new position of the cursor
         # relative to the shape, but also results in making it
         # a bit "shaky" when nearing the border and allows it to
@@ -424,6 +621,7 @@ class Canvas(QWidget):
         dp = pos - self.prevPoint
         if dp:
             shape.moveBy(dp)
+            self.shapeIndex.update(shape)
             self.prevPoint = pos
             return True
         return False
@@ -440,7 +638,9 @@ class Canvas(QWidget):
         if self.selectedShape:
             shape = self.selectedShape
             self.shapes.remove(self.selectedShape)
+            self.shapeIndex.remove(self.selectedShape)
             self.selectedShape = None
+            self.invalidateFrame()
             self.update()
             return shape
 
@@ -449,6 +649,7 @@ class Canvas(QWidget):
             shape = self.selectedShape.copy()
             self.deSelectShape()
             self.shapes.append(shape)
+            self.shapeIndex.insert(shape)
             shape.selected = True
             self.selectedShape = shape
             self.boundedShiftShape(shape)
@@ -464,26 +665,55 @@ class Canvas(QWidget):
         if not self.boundedMoveShape(shape, point - offset):
             self.boundedMoveShape(shape, point + offset)
 
+    def renderHints(self):
+        """Antialiased painting, except while zooming or panning."""
+        if self.interactive:
+            return QPainter.RenderHints()
+        return QPainter.Antialiasing | QPainter.HighQualityAntialiasing
+
     def paintEvent(self, event):
-        if not self.pixmap:
-            return super(Canvas, self).paintEvent(event)
+        if self.tiles is None:
+            return super(CanvasBase, self).paintEvent(event)
+        self.paintArea(event.rect())
 
+    def paintArea(self, area):
+        """Paint the image and the shapes over `area`, in widget pixels."""
+        start = time.perf_counter()
         p = self._painter
         p.begin(self)
-        p.setRenderHint(QPainter.Antialiasing)
-        p.setRenderHint(QPainter.HighQualityAntialiasing)
-        p.setRenderHint(QPainter.SmoothPixmapTransform)
+        p.setRenderHints(self.renderHints())
+
+        # Blit the rendered frame where it is still up to date. Until it is,
+        # the image is only scaled here in the fast way.
+        view, frame = self.frameView(), self._frame
+        if frame is not None and (frame[0] != view or not frame[2].contains(area)):
+            frame = None
+        frameShapes = frame is not None and frame[1] == self._sceneVersion
+        if frame is not None:
+            ratio = self.devicePixelRatioF()
+            target = QRectF(area)
+            area = target.translated(-QPointF(frame[2].topLeft()))
+            area = QRectF(area.x() * ratio, area.y() * ratio, area.width() * ratio, area.height() * ratio)
+            p.drawImage(target, frame[3], area)
+            if frameShapes:
+                p.drawImage(target, frame[4], area)
 
         p.scale(self.scale, self.scale)
         p.translate(self.offsetToCenter())
 
-        p.drawPixmap(0, 0, self.pixmap)
+        exposed = p.transform().inverted()[0].mapRect(QRectF(area))
+        if frame is None:
+            self.tiles.paint(p, exposed, self.scale)
         Shape.scale = self.scale
         Shape.labelFontSize = self.labelFontSize
+        painted = 0
         for shape in self.shapes:
             if (shape.selected or not self._hideBackround) and self.isVisible(shape):
                 shape.fill = shape.selected or shape == self.hShape
+                if frameShapes and not shape.fill:
+                    continue
                 shape.paint(p)
+                painted += 1
         if self.current:
             self.current.paint(p)
             self.line.paint(p)
@@ -499,12 +729,12 @@ class Canvas(QWidget):
             p.setPen(self.drawingRectColor)
             brush = QBrush(Qt.BDiagPattern)
             p.setBrush(brush)
-            p.drawRect(leftTop.x(), leftTop.y(), rectWidth, rectHeight)
+            p.drawRect(QRectF(leftTop.x(), leftTop.y(), rectWidth, rectHeight))
 
         if self.drawing() and not self.prevPoint.isNull() and not self.outOfPixmap(self.prevPoint):
             p.setPen(QColor(0, 0, 0))
-            p.drawLine(self.prevPoint.x(), 0, self.prevPoint.x(), self.pixmap.height())
-            p.drawLine(0, self.prevPoint.y(), self.pixmap.width(), self.prevPoint.y())
+            p.drawLine(QLineF(self.prevPoint.x(), 0, self.prevPoint.x(), self.imageSize.height()))
+            p.drawLine(QLineF(0, self.prevPoint.y(), self.imageSize.width(), self.prevPoint.y()))
 
         self.setAutoFillBackground(True)
         if self.verified:
@@ -517,6 +747,16 @@ class Canvas(QWidget):
             self.setPalette(pal)
 
         p.end()
+        if self.renderOffThread and not self.interactive and not frameShapes:
+            self.requestFrame(view)
+
+        ratio = self.devicePixelRatioF()
+        self.perf.record('paintEvent', (time.perf_counter() - start) * 1000.0)
+        self.perf.set('shapesPainted', painted)
+        source = self.tiles.sourceSize(self.scale * ratio)
+        self.perf.set('sourceSize', (source.width(), source.height()))
+        self.perf.set('scaledSize', (int(self.imageSize.width() * self.scale * ratio),
+                                     int(self.imageSize.height() * self.scale * ratio)))
 
     def transformPos(self, point):
         """Convert from widget-logical coordinates to painter-logical coordinates."""
@@ -524,15 +764,15 @@ class Canvas(QWidget):
 
     def offsetToCenter(self):
         s = self.scale
-        area = super(Canvas, self).size()
-        w, h = self.pixmap.width() * s, self.pixmap.height() * s
+        area = super(CanvasBase, self).size()
+        w, h = self.imageSize.width() * s, self.imageSize.height() * s
         aw, ah = area.width(), area.height()
         x = (aw - w) / (2 * s) if aw > w else 0
         y = (ah - h) / (2 * s) if ah > h else 0
         return QPointF(x, y)
 
     def outOfPixmap(self, p):
-        w, h = self.pixmap.width(), self.pixmap.height()
+        w, h = self.imageSize.width(), self.imageSize.height()
         return not (0 <= p.x() <= w and 0 <= p.y() <= h)
 
     def finalise(self):
@@ -545,6 +785,7 @@ class Canvas(QWidget):
 
         self.current.close()
         self.shapes.append(self.current)
+        self.shapeIndex.insert(self.current)
         self.current = None
         self.setHiding(False)
         self.newShape.emit()
@@ -562,9 +803,9 @@ class Canvas(QWidget):
         return self.minimumSizeHint()
 
     def minimumSizeHint(self):
-        if self.pixmap:
-            return self.scale * self.pixmap.size()
-        return super(Canvas, self).minimumSizeHint()
+        if self.tiles is not None:
+            return self.scale * self.imageSize
+        return super(CanvasBase, self).minimumSizeHint()
 
     def wheelEvent(self, ev):
         qt_version = 4 if hasattr(ev, "delta") else 5
@@ -581,8 +822,9 @@ class Canvas(QWidget):
             v_delta = delta.y()
 
         mods = ev.modifiers()
+        self.beginInteraction()
         if Qt.ControlModifier == int(mods) and v_delta:
-            self.zoomRequest.emit(v_delta)
+            self.requestZoom(v_delta)
         else:
             v_delta and self.scrollRequest.emit(v_delta, Qt.Vertical)
             h_delta and self.scrollRequest.emit(h_delta, Qt.Horizontal)
@@ -607,31 +849,11 @@ class Canvas(QWidget):
             self.moveOnePixel('Down')
 
     def moveOnePixel(self, direction):
-        # print(self.selectedShape.points)
-        if direction == 'Left' and not self.moveOutOfBound(QPointF(-1.0, 0)):
-            # print("move Left one pixel")
-            self.selectedShape.points[0] += QPointF(-1.0, 0)
-            self.selectedShape.points[1] += QPointF(-1.0, 0)
-            self.selectedShape.points[2] += QPointF(-1.0, 0)
-            self.selectedShape.points[3] += QPointF(-1.0, 0)
-        elif direction == 'Right' and not self.moveOutOfBound(QPointF(1.0, 0)):
-            # print("move Right one pixel")
-            self.selectedShape.points[0] += QPointF(1.0, 0)
-            self.selectedShape.points[1] += QPointF(1.0, 0)
-            self.selectedShape.points[2] += QPointF(1.0, 0)
-            self.selectedShape.points[3] += QPointF(1.0, 0)
-        elif direction == 'Up' and not self.moveOutOfBound(QPointF(0, -1.0)):
-            # print("move Up one pixel")
-            self.selectedShape.points[0] += QPointF(0, -1.0)
-            self.selectedShape.points[1] += QPointF(0, -1.0)
-            self.selectedShape.points[2] += QPointF(0, -1.0)
-            self.selectedShape.points[3] += QPointF(0, -1.0)
-        elif direction == 'Down' and not self.moveOutOfBound(QPointF(0, 1.0)):
-            # print("move Down one pixel")
-            self.selectedShape.points[0] += QPointF(0, 1.0)
-            self.selectedShape.points[1] += QPointF(0, 1.0)
-            self.selectedShape.points[2] += QPointF(0, 1.0)
-            self.selectedShape.points[3] += QPointF(0, 1.0)
+        step = {'Left': QPointF(-1.0, 0), 'Right': QPointF(1.0, 0),
+                'Up': QPointF(0, -1.0), 'Down': QPointF(0, 1.0)}[direction]
+        if not self.moveOutOfBound(step):
+            self.selectedShape.moveBy(step)
+            self.shapeIndex.update(self.selectedShape)
         self.shapeMoved.emit()
         self.repaint()
 
@@ -648,11 +870,14 @@ class Canvas(QWidget):
         if fill_color:
             self.shapes[-1].fill_color = fill_color
 
+        self.invalidateFrame()
         return self.shapes[-1]
 
     def undoLastLine(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
+        self.invalidateFrame()
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -660,6 +885,8 @@ class Canvas(QWidget):
     def resetAllLines(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
+        self.invalidateFrame()
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -667,18 +894,34 @@ class Canvas(QWidget):
         self.drawingPolygon.emit(False)
         self.update()
 
-    def loadPixmap(self, pixmap):
-        self.pixmap = pixmap
+    def loadImage(self, image, imageSize=None):
+        self.loadTiles(TileGrid(image, imageSize))
+
+    def loadTiles(self, tiles):
+        """Show a TileGrid or any other tile source painted the same way."""
+        self.tiles = tiles
+        self.imageSize = tiles.imageSize
         self.shapes = []
+        self.shapeIndex.clear()
+        self.invalidateFrame()
         self.repaint()
 
+    def replaceImage(self, image):
+        """Swap in a higher resolution decode of the image being shown."""
+        self.tiles = TileGrid(image, self.imageSize)
+        self.invalidateFrame()
+        self.update()
+
     def loadShapes(self, shapes):
         self.shapes = list(shapes)
+        self.shapeIndex.rebuild(self.shapes)
         self.current = None
+        self.invalidateFrame()
         self.repaint()
 
     def setShapeVisible(self, shape, value):
         self.visible[shape] = value
+        self.invalidateFrame()
         self.repaint()
 
     def currentCursor(self):
@@ -699,8 +942,15 @@ class Canvas(QWidget):
 
     def resetState(self):
         self.restoreCursor()
-        self.pixmap = None
+        self.discardFrames()
+        self.tiles = None
+        self.imageSize = QSize()
         self.update()
 
     def setDrawingShapeToSquare(self, status):
         self.drawSquare = status
+
+
+class Canvas(CanvasBase, QWidget):
+    """The canvas, painted by the CPU into a widget the size of the zoomed
+    image inside a QScrollArea."""
@@ -0,0 +1,112 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class CanvasRenderer(QObject):
+    """Renders frames of the canvas on a background thread.
+
+    A frame is a pair of QImages of part of the canvas: the image scaled in
+    full quality and, on a separate layer, the background shapes. The
+    canvas blits them and only paints what changes with the mouse on top;
+    as long as the view does not move, the image layer stays valid when the
+    shapes change. The last image layer is kept with the tiles, area,
+    scale and offset it shows: a request that only brings new shapes, e.g.
+    after a selection or a drag, reuses it and only renders the shape
+    layer. Like ImageLoader, every request() bumps a generation counter
+    that the worker checks between tiles and shapes, so frames overtaken
+    by a newer request stop early and are never delivered.
+
+    The worker only touches QImages and the shapes it was given, which must
+    be copies that the GUI thread no longer modifies."""
+    frameReady = pyqtSignal(int, QImage, QImage)
+
+    def __init__(self, perf=None, parent=None):
+        super(CanvasRenderer, self).__init__(parent)
+        self.perf = perf
+        self.generation = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._future = None
+        # (tiles, as a weak reference, view, image layer) of the last frame;
+        # only touched by the worker, or once it is waited for.
+        self._imageLayer = None
+
+    def request(self, tiles, shapes, rect, scale, ratio, offset):
+        """Render the widget area `rect` of a canvas showing `tiles` and
+        `shapes` at `scale`, with image coordinates shifted by `offset`."""
+        self.generation += 1
+        self._future = self._executor.submit(self._render, self.generation, tiles, shapes, QRect(rect),
+                                             scale, ratio, QPointF(offset))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def wait(self):
+        """Wait for the frame being rendered, e.g. before the tiles it is
+        painted from are unloaded."""
+        if self._future is not None:
+            wait([self._future])
+
+    def discard(self):
+        """Stop rendering and forget the kept image layer."""
+        self.cancel()
+        self.wait()
+        self._imageLayer = None
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def isCurrent(self, generation):
+        return generation == self.generation
+
+    def _render(self, generation, tiles, shapes, rect, scale, ratio, offset):
+        if not self.isCurrent(generation):
+            return
+        start = time.perf_counter()
+        stop = lambda: not self.isCurrent(generation)
+        view = (rect, scale, ratio, offset)
+        kept = self._imageLayer
+        if kept is not None and kept[0]() is tiles and kept[1] == view:
+            image = kept[2]
+        else:
+            image, p, exposed = self._layer(rect, scale, ratio, offset)
+            complete = tiles.render(p, exposed, scale, stop)
+            p.end()
+            if not complete:
+                return
+            self._imageLayer = (weakref.ref(tiles), view, image)
+        shapeLayer, p, exposed = self._layer(rect, scale, ratio, offset)
+        for shape in shapes:
+            if stop():
+                break
+            shape.paint(p, scale)
+        p.end()
+        if self.isCurrent(generation):
+            if self.perf is not None:
+                self.perf.record('renderFrame', (time.perf_counter() - start) * 1000.0)
+            self.frameReady.emit(generation, image, shapeLayer)
+
+    def _layer(self, rect, scale, ratio, offset):
+        """A transparent layer for the widget area `rect` and a painter on it
+        set up like the one of Canvas.paintEvent, with the image coordinates
+        it exposes."""
+        layer = QImage(int(rect.width() * ratio), int(rect.height() * ratio), QImage.Format_ARGB32_Premultiplied)
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(Qt.transparent)
+        p = QPainter(layer)
+        p.setRenderHint(QPainter.Antialiasing)
+        p.setRenderHint(QPainter.HighQualityAntialiasing)
+        p.setRenderHint(QPainter.SmoothPixmapTransform)
+        p.translate(-rect.x(), -rect.y())
+        p.scale(scale, scale)
+        p.translate(offset)
+        return layer, p, p.transform().inverted()[0].mapRect(QRectF(rect))
@@ -19,3 +19,13 @@ SETTING_DRAW_SQUARE = 'draw/square'
 SETTING_LABEL_FILE_FORMAT = 'labelFileFormat'
 SETTING_ATTRIBUTE_FILE_FORMAT = 'attributeFileFormat'
 DEFAULT_ENCODING = 'utf-8'
+SETTING_PREFETCH_AHEAD = 'prefetch/ahead'
+SETTING_PREFETCH_BEHIND = 'prefetch/behind'
+SETTING_IMAGE_CACHE_SIZE = 'imageCache/sizeMB'
+DEFAULT_IMAGE_CACHE_SIZE = 512
+# Per-collection caches (thumbnails, pyramids, ...) live in this folder
+CACHE_DIR_NAME = '.labelImgCache'
+SETTING_THUMBNAIL_GRID = 'fileList/thumbnailGrid'
+# Images with at least this many pixels get an on-disk tile pyramid
+SETTING_PYRAMID_MIN_PIXELS = 'pyramid/minPixels'
+DEFAULT_PYRAMID_MIN_PIXELS = 40000000
@@ -0,0 +1,170 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.constants import CACHE_DIR_NAME
+from libs.dirSnapshot import DirSnapshot, folderMtime
+from libs.fileCatalog import FileCatalog
+from libs.ustr import ustr
+
+# Paths found are handed to the GUI in batches of at most this many, or
+# whatever was found in this many seconds, whichever comes first.
+BATCH_SIZE = 500
+BATCH_INTERVAL = 0.1
+# When revalidating a snapshot adds more than 1/REBUILD_FRACTION of the
+# images, sorting them all again is quicker than inserting each.
+REBUILD_FRACTION = 8
+
+
+def imageExtensions():
+    return tuple('.%s' % fmt.data().decode("ascii").lower() for fmt in QImageReader.supportedImageFormats())
+
+
+class DirScanner(QObject):
+    """Lists the images of a folder tree on a background thread.
+
+    Paths are streamed to the GUI as they are found, in directory order,
+    with `found` (generation, paths, folders scanned). The first image is
+    sent on its own so it can be opened right away. When the whole tree has
+    been read, `finished` delivers all paths as a FileCatalog with the
+    DirSnapshot of the scan, which is then saved in the tree's cache
+    folder.
+
+    A tree with a snapshot is not read again: its catalog is delivered at
+    once with `restored`, then only the folders modified since are listed
+    and `finished` delivers the catalog with their changes.
+
+    Like the image loader, a newer scan() or cancel() makes the current
+    scan stop at its next entry and drops whatever it has not delivered
+    yet."""
+    found = pyqtSignal(int, list, int)
+    restored = pyqtSignal(int, object)
+    finished = pyqtSignal(int, object, object)
+
+    def __init__(self, parent=None):
+        super(DirScanner, self).__init__(parent)
+        self.generation = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def scan(self, folderPath):
+        self.generation += 1
+        self._executor.submit(self._scan, self.generation, folderPath, imageExtensions())
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def isCurrent(self, generation):
+        return generation == self.generation
+
+    def _scan(self, generation, folderPath, extensions):
+        root = ustr(os.path.abspath(folderPath))
+        snapshot = DirSnapshot.load(root)
+        if snapshot is not None:
+            self._revalidate(generation, snapshot, extensions)
+            return
+        folders, paths = {}, []
+        if self._walk(generation, [root], folders, paths, extensions, stream=True):
+            self._finish(generation, root, FileCatalog(paths), folders)
+
+    def _revalidate(self, generation, snapshot, extensions):
+        catalog = FileCatalog(snapshot.paths, ordered=True)
+        self.restored.emit(generation, catalog)
+        changed = snapshot.changedFolders(lambda: self.isCurrent(generation))
+        if changed is None:
+            return
+        if not changed:
+            # Nothing to change: the GUI keeps the catalog it was given.
+            if self.isCurrent(generation):
+                self.finished.emit(generation, catalog, snapshot)
+            return
+        # The GUI owns the restored catalog now; work on a copy.
+        catalog = FileCatalog(snapshot.paths, ordered=True)
+        folders = snapshot.folders
+        changed = set(changed)
+        for folder in changed:
+            del folders[folder]
+        removed = set(path for path in snapshot.paths if path.rpartition(os.sep)[0] in changed)
+        found = []
+        if not self._walk(generation, list(changed), folders, found, extensions):
+            return
+        added = [path for path in found if path not in removed]
+        if len(added) > len(catalog) // REBUILD_FRACTION:
+            catalog = FileCatalog([path for path in snapshot.paths if path not in removed] + found)
+        else:
+            for path in removed.difference(found):
+                catalog.remove(path)
+            for path in added:
+                catalog.insert(path)
+        self._finish(generation, snapshot.root, catalog, folders)
+
+    def _finish(self, generation, root, catalog, folders):
+        if not self.isCurrent(generation):
+            return
+        snapshot = DirSnapshot(root, folders, catalog.table())
+        self.finished.emit(generation, catalog, snapshot)
+        snapshot.save()
+
+    def _walk(self, generation, pending, folders, paths, extensions, stream=False):
+        """List the folders in pending, and their subfolders not in folders
+        yet, recording the mtime of each in folders and appending their
+        images to paths. Images are not stat()ed, which would cost a round
+        trip each on a network share. With stream, images are emitted as
+        they are found. Returns False if the scan was cancelled."""
+        batch = []
+        streamed = False
+        scanned = 0
+        sent = time.monotonic()
+        while pending:
+            folder = pending.pop()
+            if folder in folders:
+                continue
+            try:
+                folderStat = os.stat(folder)
+                entries = os.scandir(folder)
+            except OSError:
+                continue
+            folders[folder] = folderMtime(folderStat)
+            scanned += 1
+            subdirs = []
+            with entries:
+                for entry in entries:
+                    if not self.isCurrent(generation):
+                        return False
+                    try:
+                        # Like os.walk, symbolic links to folders are not followed.
+                        if entry.is_dir() and not entry.is_symlink():
+                            if entry.name != CACHE_DIR_NAME:
+                                subdirs.append(ustr(entry.path))
+                            continue
+                        if not entry.name.lower().endswith(extensions):
+                            continue
+                    except OSError:
+                        continue
+                    path = ustr(entry.path)
+                    paths.append(path)
+                    if not stream:
+                        continue
+                    batch.append(path)
+                    if not streamed or len(batch) >= BATCH_SIZE or time.monotonic() - sent >= BATCH_INTERVAL:
+                        self.found.emit(generation, batch, scanned)
+                        batch, sent, streamed = [], time.monotonic(), True
+            pending.extend(reversed(subdirs))
+            if stream and time.monotonic() - sent >= BATCH_INTERVAL:
+                # Progress, even where there are no images.
+                self.found.emit(generation, batch, scanned)
+                batch, sent = [], time.monotonic()
+        if batch:
+            self.found.emit(generation, batch, scanned)
+        return self.isCurrent(generation)
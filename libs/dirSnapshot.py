@@ -0,0 +1,83 @@
+import os
+import time
+
+from libs.cacheFile import bytesArray, readCacheFile, writeCacheFile
+from libs.constants import CACHE_DIR_NAME
+from libs.pathTable import PathTable
+
+SNAPSHOT_FILENAME = 'dirSnapshot.bin'
+SNAPSHOT_VERSION = 4
+# A folder modified this recently (in seconds) when it was listed may change
+# again within its mtime's resolution; it is looked at again next time.
+RACY_INTERVAL = 2
+
+
+def snapshotPath(folderPath):
+    return os.path.join(folderPath, CACHE_DIR_NAME, SNAPSHOT_FILENAME)
+
+
+class DirSnapshot(object):
+    """What a scan of a folder tree found, saved in its cache folder as
+    data only, never code, since the folder may be shared.
+
+    `paths` holds the images in natural order, as a PathTable. `folders`
+    maps every folder scanned to its mtime when it was listed, or None if
+    that was too recent to be trusted. Since a folder's mtime changes
+    whenever an entry is created, removed or renamed in it, only folders
+    whose mtime differs need to be listed again; images rewritten in place
+    are not noticed, and need not be: the file list only holds paths."""
+
+    def __init__(self, root, folders=None, paths=None):
+        self.root = root
+        self.folders = folders if folders is not None else {}
+        self.paths = paths if paths is not None else PathTable()
+
+    @classmethod
+    def load(cls, root):
+        """The snapshot saved for root, or None if there is none usable."""
+        try:
+            header, (folderIds, lengths, names) = readCacheFile(snapshotPath(root), SNAPSHOT_VERSION)
+            folders, count = header['folders'], header['count']
+            if (header['root'] != root or not isinstance(folders, dict)
+                    or not all(mtime is None or isinstance(mtime, int) for mtime in folders.values())):
+                return None
+            paths = PathTable.fromParts(header['prefixes'], bytesArray('I', folderIds, count),
+                                        bytesArray('H', lengths, count), names)
+            return cls(root, folders, paths)
+        except Exception:
+            return None
+
+    def save(self):
+        """Write the snapshot, if the folder can be written to. The folders
+        and their mtimes go in the JSON header, the paths in raw blobs."""
+        prefixes, folderIds, lengths, names = self.paths.parts()
+        header = {'root': self.root, 'folders': self.folders, 'prefixes': prefixes,
+                  'count': len(folderIds)}
+        path = snapshotPath(self.root)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            writeCacheFile(path, SNAPSHOT_VERSION, header, [folderIds, lengths, names])
+        except OSError:
+            pass
+
+    def changedFolders(self, isCurrent=lambda: True):
+        """Folders that were modified, removed or not trusted since the
+        snapshot. Returns None if isCurrent() turns false meanwhile."""
+        changed = []
+        for folder, mtime in self.folders.items():
+            if not isCurrent():
+                return None
+            try:
+                if mtime is None or os.stat(folder).st_mtime_ns != mtime:
+                    changed.append(folder)
+            except OSError:
+                changed.append(folder)
+        return changed
+
+
+def folderMtime(stat):
+    """The mtime to remember for a folder being listed now."""
+    if time.time() - stat.st_mtime_ns / 1e9 < RACY_INTERVAL:
+        return None
+    return stat.st_mtime_ns
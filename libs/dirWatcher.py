@@ -0,0 +1,168 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.constants import CACHE_DIR_NAME
+from libs.dirScanner import imageExtensions
+from libs.ustr import ustr
+
+# Changed folders are looked at this many ms after the first change, so
+# that a burst of files costs one listing per folder.
+SETTLE_DELAY = 250
+
+# What changed in the watched tree: the images that appeared, as a dict of
+# path to (size, mtime), the paths of those that disappeared, and the new
+# folders to watch. A renamed image is both removed and added.
+DirChange = namedtuple('DirChange', ['added', 'removed', 'folders'])
+
+
+class DirWatcher(QObject):
+    """Follows the folder tree of a finished scan, so that the file list
+    sees images being added, deleted and renamed without scanning again.
+
+    A QFileSystemWatcher (inotify on Linux) watches every folder of the
+    tree. It only tells which folder changed, so those folders are listed
+    again on a background thread and compared with the image names known
+    for them; what differs is delivered with `changed` (generation,
+    DirChange). Like the scanner, a newer watch() or stop() drops whatever
+    has not been delivered yet.
+
+    The watcher also follows one file, the current image's sidecar, and
+    reports its changes with `fileChanged`."""
+    changed = pyqtSignal(int, object)
+    fileChanged = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super(DirWatcher, self).__init__(parent)
+        self.generation = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._folderChanged)
+        self._watcher.fileChanged.connect(self._fileChanged)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SETTLE_DELAY)
+        self._timer.timeout.connect(self._listChanged)
+        self._pending = set()
+        self._file = None
+        self._extensions = ()
+        # Image names of each watched folder; only used on the worker
+        self._names = {}
+
+    def watch(self, snapshot):
+        """Follow the tree of a DirSnapshot. Returns how many of its
+        folders could not be watched, e.g. for lack of inotify watches."""
+        self.stop()
+        self._executor.submit(self._index, self.generation, snapshot, imageExtensions())
+        return self.addFolders(list(snapshot.folders))
+
+    def addFolders(self, folders):
+        return len(self._watcher.addPaths(folders)) if folders else 0
+
+    def stop(self):
+        self.generation += 1
+        self._timer.stop()
+        self._pending.clear()
+        folders = self._watcher.directories()
+        if folders:
+            self._watcher.removePaths(folders)
+
+    def shutdown(self):
+        self.stop()
+        self.setFile(None)
+        self._executor.shutdown(wait=False)
+
+    def isCurrent(self, generation):
+        return generation == self.generation
+
+    def setFile(self, filePath):
+        """Follow filePath, instead of the file followed so far."""
+        if self._file is not None and self._file in self._watcher.files():
+            self._watcher.removePath(self._file)
+        self._file = filePath
+        if filePath is not None and os.path.exists(filePath):
+            self._watcher.addPath(filePath)
+
+    def _fileChanged(self, filePath):
+        filePath = ustr(filePath)
+        if filePath != self._file:
+            return
+        if filePath not in self._watcher.files() and os.path.exists(filePath):
+            # Replaced by a new file, which is not watched yet.
+            self._watcher.addPath(filePath)
+        self.fileChanged.emit(filePath)
+
+    def _folderChanged(self, folder):
+        self._pending.add(ustr(folder))
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _listChanged(self):
+        folders, self._pending = self._pending, set()
+        self._executor.submit(self._apply, self.generation, folders)
+
+    def _index(self, generation, snapshot, extensions):
+        self._extensions = extensions
+        names = dict((folder, set()) for folder in snapshot.folders)
+        for path in snapshot.paths:
+            folder, _, name = path.rpartition(os.sep)
+            names.setdefault(folder, set()).add(name)
+        self._names = names
+        # What changed between the scan and now has not been watched.
+        changed = snapshot.changedFolders(lambda: self.isCurrent(generation))
+        if changed:
+            self._apply(generation, changed)
+
+    def _apply(self, generation, folders):
+        added, removed, newFolders = {}, [], []
+        pending = list(folders)
+        while pending:
+            if not self.isCurrent(generation):
+                return
+            folder = pending.pop()
+            known = self._names.get(folder)
+            names, subdirs = set(), set()
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir() and not entry.is_symlink():
+                                if entry.name != CACHE_DIR_NAME:
+                                    subdirs.add(ustr(entry.path))
+                            elif entry.name.lower().endswith(self._extensions):
+                                name = ustr(entry.name)
+                                if known is None or name not in known:
+                                    stat = entry.stat()
+                                    added[ustr(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+                                names.add(name)
+                        except OSError:
+                            continue
+            except OSError:
+                if known is not None:
+                    removed.extend(self._forget(folder))
+                continue
+            if known is None:
+                newFolders.append(folder)
+            else:
+                removed.extend(os.path.join(folder, name) for name in known - names)
+            self._names[folder] = names
+            for subdir in [f for f in self._names if f.rpartition(os.sep)[0] == folder and f not in subdirs]:
+                removed.extend(self._forget(subdir))
+            pending.extend(subdir for subdir in subdirs if subdir not in self._names)
+        if (added or removed or newFolders) and self.isCurrent(generation):
+            self.changed.emit(generation, DirChange(added, removed, newFolders))
+
+    def _forget(self, folder):
+        """Drop folder and its subfolders. Returns the images they had."""
+        prefix = folder + os.sep
+        paths = []
+        for f in [f for f in self._names if f == folder or f.startswith(prefix)]:
+            paths.extend(os.path.join(f, name) for name in self._names.pop(f))
+        return paths
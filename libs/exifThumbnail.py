@@ -0,0 +1,113 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import struct
+
+# The EXIF APP1 segment is limited to 64 KiB and must come right after the
+# JFIF APP0 one, so this is all that is ever read from the file.
+HEADER_READ_SIZE = 2 * 65536 + 64
+
+TAG_ORIENTATION = 0x0112
+TAG_THUMBNAIL_OFFSET = 0x0201
+TAG_THUMBNAIL_LENGTH = 0x0202
+
+
+def _readIfd(tiff, offset, endian):
+    """Return ({tag: value}, nextIfdOffset) for the IFD at offset."""
+    count, = struct.unpack_from(endian + 'H', tiff, offset)
+    entries = {}
+    for i in range(count):
+        tag, kind, n, value = struct.unpack_from(endian + 'HHII', tiff, offset + 2 + 12 * i)
+        if kind == 3 and n == 1:
+            # SHORT values are left aligned in the 4 byte value field.
+            value, = struct.unpack_from(endian + 'H', tiff, offset + 2 + 12 * i + 8)
+        entries[tag] = value
+    nextOffset, = struct.unpack_from(endian + 'I', tiff, offset + 2 + 12 * count)
+    return entries, nextOffset
+
+
+def _exifThumbnail(tiff):
+    endian = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if endian is None:
+        return None, 1
+    ifd0Offset, = struct.unpack_from(endian + 'I', tiff, 4)
+    ifd0, ifd1Offset = _readIfd(tiff, ifd0Offset, endian)
+    orientation = ifd0.get(TAG_ORIENTATION, 1)
+    if not ifd1Offset:
+        return None, orientation
+    ifd1, _ = _readIfd(tiff, ifd1Offset, endian)
+    start, length = ifd1.get(TAG_THUMBNAIL_OFFSET), ifd1.get(TAG_THUMBNAIL_LENGTH)
+    if not start or not length or start + length > len(tiff):
+        return None, orientation
+    return tiff[start:start + length], orientation
+
+
+def findThumbnail(data):
+    """Look for an embedded thumbnail in the leading bytes of a JPEG file.
+    Returns (kind, payload, orientation) where kind is 'jpeg' for EXIF and
+    JFXX thumbnails or 'rgb' for an uncompressed JFIF one (payload is then
+    (width, height, bytes)), or None if there is no thumbnail."""
+    if data[:2] != b'\xff\xd8':
+        return None
+    orientation = 1
+    pos = 2
+    try:
+        while pos + 4 <= len(data) and data[pos] == 0xff:
+            marker = data[pos + 1]
+            if marker in (0xda, 0xd9):
+                # Start of scan: no more metadata segments.
+                break
+            length, = struct.unpack_from('>H', data, pos + 2)
+            segment = data[pos + 4:pos + 2 + length]
+            if marker == 0xe1 and segment[:6] == b'Exif\x00\x00':
+                thumbnail, orientation = _exifThumbnail(segment[6:])
+                if thumbnail:
+                    return 'jpeg', thumbnail, orientation
+            elif marker == 0xe0 and segment[:5] == b'JFIF\x00' and len(segment) >= 14:
+                width, height = segment[12], segment[13]
+                if width and height and len(segment) >= 14 + 3 * width * height:
+                    return 'rgb', (width, height, segment[14:14 + 3 * width * height]), orientation
+            elif marker == 0xe0 and segment[:5] == b'JFXX\x00' and segment[5:6] == b'\x10':
+                return 'jpeg', segment[6:], orientation
+            pos += 2 + length
+    except struct.error:
+        pass
+    return None
+
+
+def orientImage(image, orientation):
+    """Apply an EXIF orientation value to a QImage."""
+    if orientation in (2, 4):
+        return image.mirrored(orientation == 2, orientation == 4)
+    if orientation in (5, 7):
+        image = image.mirrored(True, False)
+    rotation = {3: 180, 5: 270, 6: 90, 7: 90, 8: 270}.get(orientation)
+    if rotation:
+        image = image.transformed(QTransform().rotate(rotation))
+    return image
+
+
+def readThumbnail(filePath):
+    """Return the embedded EXIF/JFIF thumbnail of a JPEG as a QImage, reading
+    only the file header. A null QImage is returned if there is none."""
+    try:
+        with open(filePath, 'rb') as f:
+            data = f.read(HEADER_READ_SIZE)
+    except (IOError, OSError):
+        return QImage()
+    found = findThumbnail(data)
+    if found is None:
+        return QImage()
+    kind, payload, orientation = found
+    if kind == 'rgb':
+        width, height, pixels = payload
+        image = QImage(pixels, width, height, 3 * width, QImage.Format_RGB888).copy()
+    else:
+        image = QImage.fromData(payload, 'JPG')
+    if image.isNull():
+        return image
+    return orientImage(image, orientation)
@@ -0,0 +1,296 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+from libs.pathTable import PathTable
+from libs.utils import natural_key
+
+# Slots of a _PositionIndex that hold no path, or one since removed
+EMPTY = -1
+REMOVED = -2
+
+
+def pathKey(path):
+    """Natural sort key of a path, ignoring case like the file list."""
+    return natural_key(path.lower())
+
+
+def joinKeys(folderKey, nameKey):
+    """pathKey() of a folder prefix and a name put together, from theirs.
+    The prefix ends with a separator, i.e. with text, which runs on into
+    the start of the name."""
+    return folderKey[:-1] + (folderKey[-1] + nameKey[0],) + nameKey[1:]
+
+
+class _KeyView(object):
+    """The sort keys of a catalog, computed as bisection asks for them."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def __getitem__(self, i):
+        return self.catalog._key(i)
+
+
+class _PositionIndex(object):
+    """Positions of the paths of a PathTable, found in O(1).
+
+    A hash table in two arrays (about 12-24 bytes per path) maps each path
+    to its base position, the one it had when the index was built. Paths
+    inserted and removed later are not renumbered. Instead, the removed
+    base positions and the anchors of the new paths are kept in sorted
+    lists. A new path's anchor is the base position of the path it was
+    placed before. Two bisections of these lists then turn a base
+    position into the current one. New paths are kept in a dict, in order
+    behind their anchor.
+
+    Each change must be told to the index before it is made to the
+    table. Once worn(), i.e. after many changes, the index is to be built
+    again."""
+
+    def __init__(self, paths):
+        self._paths = paths
+        n = len(paths)
+        capacity = 8
+        while capacity < n * 3 // 2:
+            capacity *= 2
+        mask = self._mask = capacity - 1
+        slots = self._slots = array('i', [EMPTY]) * capacity
+        # Low 32 bits of the hash of the path in each slot, to skip most
+        # other paths without putting them together.
+        hashes = self._hashes = array('I', [0]) * capacity
+        for position, path in enumerate(paths):
+            h = hash(path)
+            i = h & mask
+            while slots[i] != EMPTY:
+                i = (i + 1) & mask
+            slots[i] = position
+            hashes[i] = h & 0xffffffff
+        self._base = n
+        self._removed = []
+        self._anchors = []
+        # New path to its anchor, and anchor to its new paths, in order
+        self._new = {}
+        self._before = {}
+
+    def worn(self):
+        edits = len(self._removed) + len(self._new)
+        return edits > 64 + self._base // 64
+
+    def _position(self, base):
+        return base - bisect_left(self._removed, base) + bisect_right(self._anchors, base)
+
+    def _slot(self, path):
+        """(slot, position) of a path of the table that is not new, or
+        (None, None)."""
+        h = hash(path)
+        slots, hashes, mask = self._slots, self._hashes, self._mask
+        i = h & mask
+        h &= 0xffffffff
+        while True:
+            base = slots[i]
+            if base == EMPTY:
+                return None, None
+            if base != REMOVED and hashes[i] == h:
+                position = self._position(base)
+                if self._paths[position] == path:
+                    return i, position
+            i = (i + 1) & mask
+
+    def position(self, path):
+        anchor = self._new.get(path)
+        if anchor is None:
+            return self._slot(path)[1]
+        first = anchor - bisect_left(self._removed, anchor) + bisect_left(self._anchors, anchor)
+        return first + self._before[anchor].index(path)
+
+    def insert(self, i, path):
+        """path is about to be inserted at position i."""
+        if i == len(self._paths):
+            anchor = self._base
+            self._before.setdefault(anchor, []).append(path)
+        else:
+            following = self._paths[i]
+            anchor = self._new.get(following)
+            if anchor is None:
+                anchor = self._slots[self._slot(following)[0]]
+                self._before.setdefault(anchor, []).append(path)
+            else:
+                before = self._before[anchor]
+                before.insert(before.index(following), path)
+        self._new[path] = anchor
+        insort(self._anchors, anchor)
+
+    def remove(self, i):
+        """The path at position i is about to be removed."""
+        path = self._paths[i]
+        anchor = self._new.pop(path, None)
+        if anchor is None:
+            slot = self._slot(path)[0]
+            insort(self._removed, self._slots[slot])
+            self._slots[slot] = REMOVED
+            return
+        before = self._before[anchor]
+        before.remove(path)
+        if not before:
+            del self._before[anchor]
+        del self._anchors[bisect_left(self._anchors, anchor)]
+
+
+class FileCatalog(object):
+    """The ordered image paths of the opened folder.
+
+    Paths are kept in natural order in a PathTable, which stores each
+    folder once. A _PositionIndex finds the position of a path. Sort keys
+    are not kept: a new path is placed by bisection, computing the keys of
+    the few paths it looks at from the key of their folder, computed once,
+    and that of their name. Building the index, like sorting, is left to
+    the thread that makes the catalog.
+
+    Paths known to be in order already, e.g. from a saved snapshot, are
+    taken as they are with `ordered`.
+
+    append() and extend() add paths at the end, out of order, for listing
+    a folder while it is being scanned. The catalog is no longer ordered
+    then; a map from path to position finds paths instead, and insert()
+    appends as well."""
+
+    def __init__(self, paths=(), ordered=False):
+        self._paths = paths.copy() if isinstance(paths, PathTable) else PathTable(paths)
+        # Keys of the folder prefixes, by folder id
+        self._folderKeys = {}
+        if not ordered:
+            folderKeys = [pathKey(folder) for folder in self._paths.folders]
+            keys = [joinKeys(folderKeys[folderId], pathKey(name)) for folderId, name in self._paths.items()]
+            self._paths = self._paths.reordered(sorted(range(len(keys)), key=keys.__getitem__))
+        self._ordered = True
+        self._index = _PositionIndex(self._paths)
+        # Path to position, for an unordered catalog only
+        self._positions = None
+        # Positions from here on may be out of date
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        return self._paths[index]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __contains__(self, path):
+        return self.position(path) is not None
+
+    def __eq__(self, other):
+        if isinstance(other, FileCatalog):
+            other = other._paths
+        return self._paths == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def table(self):
+        """A copy of the paths, as a PathTable."""
+        return self._paths.copy()
+
+    def _key(self, i):
+        folderId = self._paths.folderId(i)
+        folderKey = self._folderKeys.get(folderId)
+        if folderKey is None:
+            folderKey = self._folderKeys[folderId] = pathKey(self._paths.folders[folderId])
+        return joinKeys(folderKey, pathKey(self._paths.name(i)))
+
+    def position(self, path):
+        """Index of path, or None if it is not in the catalog."""
+        if self._ordered:
+            return self._index.position(path)
+        i = self._positions.get(path)
+        if i is not None and i >= self._stale:
+            for j in range(self._stale, len(self._paths)):
+                self._positions[self._paths[j]] = j
+            self._stale = len(self._paths)
+            i = self._positions[path]
+        return i
+
+    def index(self, path):
+        i = self.position(path)
+        if i is None:
+            raise ValueError('%r is not in the catalog' % path)
+        return i
+
+    def next(self, path):
+        """The path after path, or None at the end. A path that is not in
+        an ordered catalog, e.g. one just deleted, is taken from where it
+        would be; in an unordered one it has no neighbours."""
+        i = self.position(path)
+        if i is None:
+            i = self.bisect(path) - 1 if self._ordered else len(self._paths)
+        return self._paths[i + 1] if i + 1 < len(self._paths) else None
+
+    def previous(self, path):
+        i = self.position(path)
+        if i is None:
+            i = self.bisect(path) if self._ordered else 0
+        return self._paths[i - 1] if i > 0 else None
+
+    def bisect(self, path):
+        """Where insert() would put path, if it is not in the catalog."""
+        if not self._ordered:
+            return len(self._paths)
+        return bisect_left(_KeyView(self), pathKey(path))
+
+    def append(self, path):
+        self.extend((path,))
+
+    def extend(self, paths):
+        if self._ordered:
+            self._positions = dict(zip(self._paths, range(len(self._paths))))
+            self._stale = len(self._paths)
+            self._ordered = False
+            self._index = None
+        new = []
+        for path in paths:
+            if path not in self._positions:
+                self._positions[path] = len(self._paths) + len(new)
+                new.append(path)
+        self._paths.extend(new)
+
+    def insert(self, path, i=None):
+        """Add path at its place in natural order. Returns its position.
+        i is where bisect() puts path, if the caller knows already."""
+        if not self._ordered:
+            self.append(path)
+            return self.position(path)
+        position = self.position(path)
+        if position is not None:
+            return position
+        if i is None:
+            i = self.bisect(path)
+        self._index.insert(i, path)
+        self._paths.insert(i, path)
+        self._renewIndex()
+        return i
+
+    def remove(self, path):
+        """Drop path. Returns the position it had, or None if unknown."""
+        i = self.position(path)
+        if i is None:
+            return None
+        if self._ordered:
+            self._index.remove(i)
+            del self._paths[i]
+            self._renewIndex()
+            return i
+        del self._paths[i]
+        del self._positions[path]
+        self._stale = min(self._stale, i)
+        return i
+
+    def _renewIndex(self):
+        if self._index.worn():
+            self._index = _PositionIndex(self._paths)
@@ -0,0 +1,72 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+
+class FileListModel(QAbstractListModel):
+    """List model over the image paths of the opened folder, shown by the
+    file list and, through ThumbnailModel, by the thumbnail grid.
+
+    The list of paths is the only per-row storage; rows are produced by
+    data() for what the views paint. Paths are replaced and appended in
+    bulk, with one reset or insert notification each. Single files coming
+    and going are placed by the FileCatalog the paths are kept in."""
+
+    def __init__(self, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.filePaths = []
+
+    def setFilePaths(self, filePaths):
+        self.beginResetModel()
+        self.filePaths = filePaths
+        self.endResetModel()
+
+    def appendFilePaths(self, filePaths):
+        """Add rows for those of filePaths that are not listed yet,
+        appending them to the list of paths."""
+        new, seen = [], set()
+        for filePath in filePaths:
+            if filePath not in seen and filePath not in self.filePaths:
+                seen.add(filePath)
+                new.append(filePath)
+        if not new:
+            return
+        first = len(self.filePaths)
+        self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+        self.filePaths.extend(new)
+        self.endInsertRows()
+
+    def insertFilePath(self, filePath):
+        """Add a row for filePath where the catalog orders it. Returns it."""
+        row = self.filePaths.position(filePath)
+        if row is None:
+            row = self.filePaths.bisect(filePath)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.filePaths.insert(filePath, row)
+            self.endInsertRows()
+        return row
+
+    def removeFilePath(self, filePath):
+        """Drop the row of filePath. Returns the row it had, or None."""
+        row = self.filePaths.position(filePath)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            self.filePaths.remove(filePath)
+            self.endRemoveRows()
+        return row
+
+    def filePath(self, row):
+        return self.filePaths[row] if 0 <= row < len(self.filePaths) else None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.filePaths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.filePaths):
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.filePaths[index.row()]
+        return None
@@ -0,0 +1,107 @@
+from PyQt5.QtGui import *
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+
+from libs.canvas import CanvasBase
+
+
+def openGLAvailable():
+    """Whether an OpenGL 2 context can be created, e.g. on Mesa's llvmpipe
+    software renderer when there is no GPU. Needs the QApplication."""
+    context = QOpenGLContext()
+    if not context.create():
+        return False
+    return context.isOpenGLES() or context.format().majorVersion() >= 2
+
+
+class GLCanvas(CanvasBase, QOpenGLWidget):
+    """The canvas, painted with OpenGL.
+
+    Image tiles become textures the first time they are painted and stay
+    cached by Qt's OpenGL paint engine, so zooming and panning only change
+    the transform they are drawn with and the scaling is done by texture
+    filtering. Zoomed out views use the tile grid mipmaps, which keeps the
+    filtering within 2x. No frames are rendered off the GUI thread.
+
+    The widget is the viewport of a GLScrollArea rather than as large as
+    the zoomed image, which would need a framebuffer that large."""
+
+    renderOffThread = False
+
+    def __init__(self, *args, **kwargs):
+        super(GLCanvas, self).__init__(*args, **kwargs)
+        self.scrollArea = None
+
+    def renderHints(self):
+        return QPainter.Antialiasing | QPainter.SmoothPixmapTransform
+
+    def paintEvent(self, event):
+        QOpenGLWidget.paintEvent(self, event)
+
+    def paintGL(self):
+        # The framebuffer is not filled with the background like widgets are.
+        p = self._painter
+        p.begin(self)
+        p.fillRect(self.rect(), self.parentWidget().palette().color(QPalette.Window))
+        p.fillRect(self.rect(), self.palette().color(self.backgroundRole()))
+        p.end()
+        if self.tiles is not None:
+            self.paintArea(self.rect())
+
+    def offsetToCenter(self):
+        """Centred where the image is smaller than the widget, like the
+        raster canvas, and moved by the scroll bars elsewhere."""
+        offset = super(GLCanvas, self).offsetToCenter()
+        if self.scrollArea is not None:
+            s = self.scale
+            if not offset.x():
+                offset.setX(-self.scrollArea.horizontalScrollBar().value() / s)
+            if not offset.y():
+                offset.setY(-self.scrollArea.verticalScrollBar().value() / s)
+        return offset
+
+    def adjustSize(self):
+        """Only the scroll ranges follow the zoomed image size."""
+        if self.scrollArea is not None:
+            self.scrollArea.updateRanges()
+        self.update()
+
+
+class GLScrollArea(QAbstractScrollArea):
+    """Scrolls a GLCanvas, which is its viewport and paints the scrolled
+    part of the image itself. Offers the QScrollArea calls MainWindow uses."""
+
+    def __init__(self, parent=None):
+        super(GLScrollArea, self).__init__(parent)
+        self._widget = None
+        self.horizontalScrollBar().setSingleStep(20)
+        self.verticalScrollBar().setSingleStep(20)
+
+    def setWidget(self, canvas):
+        self._widget = canvas
+        canvas.scrollArea = self
+        self.setViewport(canvas)
+        self.updateRanges()
+
+    def widget(self):
+        return self._widget
+
+    def setWidgetResizable(self, resizable):
+        # The canvas always fills the viewport.
+        pass
+
+    def updateRanges(self):
+        size, area = self._widget.sizeHint(), self.viewport().size()
+        for bar, content, page in ((self.horizontalScrollBar(), size.width(), area.width()),
+                                   (self.verticalScrollBar(), size.height(), area.height())):
+            bar.setRange(0, max(0, content - page))
+            bar.setPageStep(page)
+
+    def scrollContentsBy(self, dx, dy):
+        self.viewport().update()
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.Resize:
+            self.updateRanges()
+        # The canvas handles its own paint, mouse and key events.
+        return False
@@ -0,0 +1,106 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+def imageKey(filePath):
+    """Cache key for an image file: absolute path, mtime and size, so that a
+    file edited on disk no longer matches its stale decode."""
+    filePath = os.path.abspath(filePath)
+    stat = os.stat(filePath)
+    return filePath, stat.st_mtime_ns, stat.st_size
+
+
+def mipmapKey(key, size):
+    """Cache key for the mipmaps of the decode of `size` cached under key.
+    Kept apart from the decode itself, which would otherwise supersede it."""
+    filePath, mtime, fileSize = key
+    return (filePath, 'mipmaps', size.width(), size.height()), mtime, fileSize
+
+
+def previewKey(key):
+    """Cache key for a decode at less than full size of the file cached
+    under key. Kept apart from the full decode; a new preview supersedes
+    the last."""
+    filePath, mtime, fileSize = key
+    return (filePath, 'preview'), mtime, fileSize
+
+
+def imageBytes(image):
+    if hasattr(image, 'sizeInBytes'):
+        return image.sizeInBytes()
+    return image.byteCount()
+
+
+class ImageCache(object):
+    """LRU cache of decoded QImages bounded by a byte budget rather than an
+    entry count. Shared with the prefetch workers, hence the lock."""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keysByPath = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, image, nbytes=None):
+        if nbytes is None:
+            nbytes = imageBytes(image)
+        if nbytes > self.budget:
+            return False
+        with self._lock:
+            # A new mtime/size for the same path supersedes the old decode.
+            stale = self._keysByPath.get(key[0])
+            if stale is not None and stale != key:
+                self._remove(stale)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (image, nbytes)
+            self._keysByPath[key[0]] = key
+            self.used += nbytes
+            self._evict()
+        return True
+
+    def setBudget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keysByPath.clear()
+            self.used = 0
+
+    def counters(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                'used': self.used, 'budget': self.budget}
+
+    def _evict(self):
+        while self.used > self.budget and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        image, nbytes = self._entries.pop(key)
+        self.used -= nbytes
+        if self._keysByPath.get(key[0]) == key:
+            del self._keysByPath[key[0]]
@@ -0,0 +1,113 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.attributeJSONIO import readSidecar
+from libs.exifThumbnail import readThumbnail
+from libs.imageReader import readImage, imageSize
+from libs.mappedImage import mapImage
+from libs.tilePyramid import openPyramid
+
+# What the loader found about a file before its pixels: its os.stat()
+# result, None if it is gone, and the attributes of its sidecar file.
+OpenedFile = namedtuple('OpenedFile', ['stat', 'attributes'])
+
+
+class ImageLoader(QObject):
+    """Loads the image to show off the GUI thread, with everything else
+    about the file that takes a trip to the disk, which may be a network
+    share.
+
+    Every request() bumps a generation counter and the worker checks it
+    between steps, so requests that were overtaken by a newer one (e.g. while
+    `d` is held down) stop early and are never delivered. A request first
+    reports the OpenedFile, then the embedded thumbnail, if any, and then
+    the decoded image. Files shown without decoding, from a tile pyramid
+    or a file mapping, are reported with their tiles instead; the QImage
+    goes along as a Python object, since a mapped one must not be copied
+    by Qt."""
+    opened = pyqtSignal(int, str, object)
+    thumbnailLoaded = pyqtSignal(int, str, QImage, QSize)
+    loaded = pyqtSignal(int, str, QImage, QSize)
+    tilesLoaded = pyqtSignal(int, str, object, object)
+
+    def __init__(self, prefetcher, parent=None, workers=2):
+        super(ImageLoader, self).__init__(parent)
+        self.prefetcher = prefetcher
+        self.generation = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def request(self, filePath, maxSize=None, jsonPath=None):
+        """Load filePath, decoded to fit into maxSize, and the attributes
+        of its sidecar file jsonPath, if given."""
+        self.generation += 1
+        self._executor.submit(self._load, self.generation, filePath, maxSize, jsonPath)
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def isCurrent(self, generation):
+        return generation == self.generation
+
+    def _load(self, generation, filePath, maxSize, jsonPath):
+        if not self.isCurrent(generation):
+            return
+        try:
+            stat = os.stat(filePath)
+        except OSError:
+            stat = None
+        attributes = {}
+        if stat is not None and jsonPath is not None:
+            try:
+                attributes = readSidecar(jsonPath)
+            except (IOError, OSError):
+                pass
+        if not self.isCurrent(generation):
+            return
+        self.opened.emit(generation, filePath, OpenedFile(stat, attributes))
+        if stat is None:
+            return
+        pyramid = openPyramid(filePath, stat)
+        overview = pyramid.overview() if pyramid is not None else QImage()
+        if not overview.isNull():
+            if self.isCurrent(generation):
+                self.tilesLoaded.emit(generation, filePath, pyramid, overview)
+            return
+        # Uncompressed TIFF/BMP files are shown straight from a file mapping.
+        mapped = mapImage(filePath)
+        if mapped is not None:
+            if self.isCurrent(generation):
+                self.tilesLoaded.emit(generation, filePath, mapped.tileGrid(), mapped.image)
+            return
+        # Waits for a prefetch of this file that is already running.
+        cached = self.prefetcher.take(filePath)
+        if cached is not None:
+            self.loaded.emit(generation, filePath, cached[0], cached[1])
+            return
+        fullSize = imageSize(filePath)
+        if fullSize.isValid():
+            thumbnail = readThumbnail(filePath)
+            if not thumbnail.isNull() and self.isCurrent(generation):
+                self.thumbnailLoaded.emit(generation, filePath, thumbnail, fullSize)
+        if not self.isCurrent(generation):
+            return
+        # Only decode about as many pixels as fit on screen. The full
+        # resolution is decoded once the user zooms past the preview.
+        image = readImage(filePath, maxSize)
+        if not fullSize.isValid():
+            fullSize = image.size()
+        self.prefetcher.store(filePath, image, fullSize)
+        if self.isCurrent(generation):
+            self.loaded.emit(generation, filePath, image, fullSize)
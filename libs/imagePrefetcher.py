@@ -0,0 +1,137 @@
+try:
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtCore import *
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.imageCache import imageBytes, imageKey, previewKey
+from libs.imageReader import imageSize, readImage
+from libs.mappedImage import isMappable
+
+
+class ImagePrefetcher(object):
+    """Decode the neighbours of the current image on a worker pool so that
+    openNextImg/openPrevImg can swap in an already decoded QImage.
+
+    Decoded images go into the shared ImageCache, so they count against its
+    byte budget. Neighbours are decoded at the preview size they are first
+    shown at, like the image loader does, so that large ones do not push
+    each other and the current image out of the cache; the full resolution
+    is decoded once the user zooms in. The window holds `ahead` entries in
+    the navigation direction and `behind` entries in the opposite one;
+    queued work that falls out of the window is cancelled."""
+
+    def __init__(self, cache, ahead=3, behind=1, workers=2):
+        self.cache = cache
+        self.ahead = ahead
+        self.behind = behind
+        self.hits = 0
+        self.misses = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def window(self, fileList, index, direction=1):
+        """Paths to prefetch around fileList[index], nearest first."""
+        step = 1 if direction >= 0 else -1
+        wanted = []
+        for distance in range(1, max(self.ahead, self.behind) + 1):
+            if distance <= self.ahead and 0 <= index + step * distance < len(fileList):
+                wanted.append(fileList[index + step * distance])
+            if distance <= self.behind and 0 <= index - step * distance < len(fileList):
+                wanted.append(fileList[index - step * distance])
+        return wanted
+
+    def prefetch(self, fileList, index, direction=1, maxSize=None):
+        """Decode the window around fileList[index], to fit into maxSize."""
+        wanted = self.window(fileList, index, direction)
+        with self._lock:
+            for path in list(self._futures):
+                if path not in wanted:
+                    self._futures.pop(path).cancel()
+            for path in wanted:
+                if path not in self._futures:
+                    self._futures[path] = self._executor.submit(self._prefetch, path, maxSize)
+
+    def take(self, filePath, wait=True):
+        """Return (QImage, full size) of filePath from the cache, the full
+        decode or else a preview, or None on a miss. If a prefetch of the
+        file is still running we wait for it, which is never slower than
+        starting a fresh decode. With wait=False None is returned instead,
+        without counting a miss."""
+        with self._lock:
+            future = self._futures.get(filePath)
+            if future is not None and not future.done() and not wait:
+                return None
+            self._futures.pop(filePath, None)
+        if future is not None and not future.cancelled():
+            future.result()
+        try:
+            key = imageKey(filePath)
+        except OSError:
+            key = None
+        cached = None
+        if key is not None and key in self.cache:
+            image = self.cache.get(key)
+            cached = (image, image.size()) if image is not None else None
+        elif key is not None:
+            cached = self.cache.get(previewKey(key))
+        if cached is None:
+            if wait:
+                self.misses += 1
+        else:
+            self.hits += 1
+        return cached
+
+    def decode(self, filePath):
+        """Decode filePath at full resolution on the pool, outside of the
+        prefetch window. The returned future yields the QImage."""
+        return self._executor.submit(self._decode, filePath)
+
+    def store(self, filePath, image, fullSize):
+        """Cache image, a decode of filePath, as its full decode if it is
+        fullSize and as its preview otherwise."""
+        if image.isNull():
+            return
+        try:
+            key = imageKey(filePath)
+        except OSError:
+            return
+        if image.size() == fullSize:
+            self.cache.put(key, image)
+        else:
+            self.cache.put(previewKey(key), (image, QSize(fullSize)), imageBytes(image))
+
+    def clear(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+
+    def shutdown(self):
+        self.clear()
+        self._executor.shutdown(wait=False)
+
+    def counters(self):
+        return {'hits': self.hits, 'misses': self.misses, 'pending': len(self._futures)}
+
+    def _prefetch(self, filePath, maxSize):
+        try:
+            key = imageKey(filePath)
+        except OSError:
+            return
+        if key in self.cache or maxSize is not None and previewKey(key) in self.cache:
+            return
+        # Mapped files are shown without decoding; don't copy them to the heap.
+        if isMappable(filePath):
+            return
+        fullSize = imageSize(filePath)
+        image = readImage(filePath, maxSize)
+        self.store(filePath, image, fullSize if fullSize.isValid() else image.size())
+
+    def _decode(self, filePath):
+        image = readImage(filePath)
+        self.store(filePath, image, image.size())
+        return image
@@ -0,0 +1,38 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+
+def displaySize(reader):
+    """Size of the image as it will be shown, i.e. after EXIF rotation."""
+    size = reader.size()
+    if size.isValid() and reader.transformation() & QImageIOHandler.TransformationRotate90:
+        size.transpose()
+    return size
+
+
+def imageSize(filePath):
+    """Full size of an image file, read from its header only."""
+    reader = QImageReader(filePath)
+    reader.setAutoTransform(True)
+    return displaySize(reader)
+
+
+def readImage(filePath, maxSize=None):
+    """Decode an image file into a QImage, honouring its EXIF orientation.
+    If maxSize is given, a larger image is decoded at the largest size that
+    fits into it, which lets codecs skip work (e.g. JPEG DCT scaling).
+    Safe to call from worker threads: only QImage/QImageReader are used."""
+    reader = QImageReader(filePath)
+    reader.setAutoTransform(True)
+    if maxSize is not None:
+        size = displaySize(reader)
+        if size.isValid() and (size.width() > maxSize.width() or size.height() > maxSize.height()):
+            factor = min(maxSize.width() / size.width(), maxSize.height() / size.height())
+            stored = reader.size()
+            reader.setScaledSize(QSize(max(1, int(round(stored.width() * factor))),
+                                       max(1, int(round(stored.height() * factor)))))
+    return reader.read()
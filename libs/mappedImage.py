@@ -0,0 +1,183 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import mmap
+import struct
+
+from libs.tileGrid import TileGrid
+
+BI_RGB = 0
+BI_BITFIELDS = 3
+
+TIFF_TYPE_SIZES = {3: 2, 4: 4}
+TAG_IMAGE_WIDTH = 256
+TAG_IMAGE_LENGTH = 257
+TAG_BITS_PER_SAMPLE = 258
+TAG_COMPRESSION = 259
+TAG_PHOTOMETRIC = 262
+TAG_STRIP_OFFSETS = 273
+TAG_ORIENTATION = 274
+TAG_SAMPLES_PER_PIXEL = 277
+TAG_STRIP_BYTE_COUNTS = 279
+TAG_PLANAR_CONFIGURATION = 284
+TAG_TILE_WIDTH = 322
+TAG_EXTRA_SAMPLES = 338
+ORIENTATION_TOP_LEFT = 1
+ORIENTATION_BOTTOM_LEFT = 4
+LAYOUT_TAGS = (TAG_IMAGE_WIDTH, TAG_IMAGE_LENGTH, TAG_BITS_PER_SAMPLE, TAG_COMPRESSION,
+               TAG_PHOTOMETRIC, TAG_STRIP_OFFSETS, TAG_ORIENTATION, TAG_SAMPLES_PER_PIXEL,
+               TAG_STRIP_BYTE_COUNTS, TAG_PLANAR_CONFIGURATION, TAG_TILE_WIDTH, TAG_EXTRA_SAMPLES)
+
+
+def _bmpLayout(data):
+    """(offset, width, height, bytesPerLine, format, flipped) of the pixels
+    of an uncompressed 24/32 bit BMP, or None. Most BMPs store their rows
+    bottom-up (positive height): those are flipped."""
+    if data[:2] != b'BM' or len(data) < 54:
+        return None
+    offset, = struct.unpack_from('<I', data, 10)
+    headerSize, width, height, planes, bpp, compression = struct.unpack_from('<IiiHHI', data, 14)
+    if headerSize < 40 or planes != 1 or width <= 0 or height == 0:
+        return None
+    if compression == BI_RGB and bpp == 24:
+        fmt = QImage.Format_BGR888
+    elif compression == BI_RGB and bpp == 32:
+        fmt = QImage.Format_RGB32
+    elif compression == BI_BITFIELDS and bpp == 32 and len(data) >= 14 + 40 + 12:
+        masks = struct.unpack_from('<III', data, 14 + 40)
+        if masks != (0xff0000, 0xff00, 0xff):
+            return None
+        alpha = struct.unpack_from('<I', data, 14 + 52)[0] if headerSize >= 56 else 0
+        fmt = QImage.Format_ARGB32 if alpha == 0xff000000 else QImage.Format_RGB32
+    else:
+        return None
+    return offset, width, abs(height), (width * bpp // 8 + 3) & ~3, fmt, height > 0
+
+
+def _tiffValues(data, endian, entry):
+    kind, count = struct.unpack_from(endian + 'HI', data, entry + 2)
+    size = TIFF_TYPE_SIZES.get(kind)
+    if size is None:
+        return None
+    code = endian + ('H' if size == 2 else 'I') * count
+    if count * size <= 4:
+        return struct.unpack_from(code, data, entry + 8)
+    offset, = struct.unpack_from(endian + 'I', data, entry + 8)
+    return struct.unpack_from(code, data, offset)
+
+
+def _tiffLayout(data):
+    """(offset, width, height, bytesPerLine, format, flipped) of the first
+    page of an uncompressed, 8 bit, chunky TIFF whose strips follow each
+    other, or None."""
+    endian = {b'II': '<', b'MM': '>'}.get(data[:2])
+    if endian is None or struct.unpack_from(endian + 'H', data, 2)[0] != 42:
+        return None
+    ifd, = struct.unpack_from(endian + 'I', data, 4)
+    count, = struct.unpack_from(endian + 'H', data, ifd)
+    tags = {}
+    for i in range(count):
+        entry = ifd + 2 + 12 * i
+        tag, = struct.unpack_from(endian + 'H', data, entry)
+        if tag in LAYOUT_TAGS:
+            tags[tag] = _tiffValues(data, endian, entry)
+    if TAG_TILE_WIDTH in tags or None in tags.values():
+        return None
+    first = lambda tag, default: tags.get(tag, (default,))[0]
+    width, height = first(TAG_IMAGE_WIDTH, 0), first(TAG_IMAGE_LENGTH, 0)
+    samples = first(TAG_SAMPLES_PER_PIXEL, 1)
+    if (not width or not height or first(TAG_COMPRESSION, 1) != 1
+            or first(TAG_PLANAR_CONFIGURATION, 1) != 1
+            or first(TAG_ORIENTATION, 1) not in (ORIENTATION_TOP_LEFT, ORIENTATION_BOTTOM_LEFT)
+            or any(bits != 8 for bits in tags.get(TAG_BITS_PER_SAMPLE, (1,)))):
+        return None
+    photometric = first(TAG_PHOTOMETRIC, None)
+    if photometric == 1 and samples == 1:
+        fmt = QImage.Format_Grayscale8
+    elif photometric == 2 and samples == 3:
+        fmt = QImage.Format_RGB888
+    elif photometric == 2 and samples == 4 and first(TAG_EXTRA_SAMPLES, 0) in (1, 2):
+        fmt = QImage.Format_RGBA8888 if first(TAG_EXTRA_SAMPLES, 0) == 2 else QImage.Format_RGBA8888_Premultiplied
+    else:
+        return None
+    offsets, counts = tags.get(TAG_STRIP_OFFSETS), tags.get(TAG_STRIP_BYTE_COUNTS)
+    if not offsets or not counts or len(offsets) != len(counts):
+        return None
+    position = offsets[0]
+    for offset, length in zip(offsets, counts):
+        if offset != position:
+            return None
+        position += length
+    bytesPerLine = width * samples
+    if position - offsets[0] < bytesPerLine * height:
+        return None
+    return offsets[0], width, height, bytesPerLine, fmt, first(TAG_ORIENTATION, 1) == ORIENTATION_BOTTOM_LEFT
+
+
+def mappedLayout(data):
+    """Pixel layout of a file that can be shown straight from its bytes, or
+    None if it is compressed or stored in a way QImage cannot describe."""
+    try:
+        return _bmpLayout(data) or _tiffLayout(data)
+    except struct.error:
+        return None
+
+
+def isMappable(filePath):
+    try:
+        with open(filePath, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (IOError, OSError, ValueError):
+        return False
+    try:
+        return mappedLayout(data) is not None
+    finally:
+        data.close()
+
+
+class MappedImage(object):
+    """A QImage over the pixels of a memory-mapped, uncompressed image file.
+
+    Nothing is read or copied up front: the pages of the file are faulted
+    in by the OS when the canvas copies out the tiles it paints.
+
+    The image is made over a memoryview of the mapping, which PyQt keeps
+    referenced by the QImage object: the file stays mapped for as long as
+    the image is, whatever becomes of this object. Copies shared by Qt
+    itself (QImage(image), queued signals) do not hold that reference;
+    only pass on deep copies, like those TileGrid makes of its tiles.
+
+    With `flipped`, the rows of the file go from the bottom of the picture
+    up, and `image` is upside down; tileGrid() shows it the right way up."""
+
+    def __init__(self, filePath):
+        with open(filePath, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        layout = mappedLayout(self._map)
+        if layout is None:
+            self._map.close()
+            raise ValueError('%s cannot be memory-mapped' % filePath)
+        offset, width, height, bytesPerLine, fmt, self.flipped = layout
+        if offset + bytesPerLine * height > len(self._map):
+            self._map.close()
+            raise ValueError('%s is truncated' % filePath)
+        self.filePath = filePath
+        self.image = QImage(memoryview(self._map)[offset:offset + bytesPerLine * height],
+                            width, height, bytesPerLine, fmt)
+
+    def tileGrid(self):
+        """A TileGrid showing the image, the right way up, painted from the
+        mapping without pixmaps of its tiles."""
+        return TileGrid(self.image, flipped=self.flipped, cacheTiles=False)
+
+
+def mapImage(filePath):
+    """A MappedImage of filePath, or None if the file cannot be mapped."""
+    try:
+        return MappedImage(filePath)
+    except (IOError, OSError, ValueError):
+        return None
@@ -0,0 +1,180 @@
+import os
+from array import array
+from itertools import accumulate, chain
+
+
+def splitPath(path):
+    """Split path after its last separator: (folder prefix, name)."""
+    i = path.rfind(os.sep)
+    if os.altsep:
+        i = max(i, path.rfind(os.altsep))
+    return path[:i + 1], path[i + 1:]
+
+
+class PathTable(object):
+    """A sequence of file paths, stored compactly.
+
+    Each folder prefix (up to and including the last separator) is stored
+    once; file names are kept back to back, UTF-8 encoded, in one pool.
+    Entries only hold the folder's number and the name's offset and
+    length, about 14 bytes plus the name instead of a string object per
+    path. Paths are put together again when asked for.
+
+    Names of removed entries stay in the pool until they make up half of
+    it, then the pool is compacted. Built, reordered or compacted, the
+    pool holds the names in the order of the entries, and two tables can
+    be compared without putting their paths together."""
+
+    def __init__(self, paths=()):
+        self._folders = []
+        self._folderIds = {}
+        self._pool = bytearray()
+        self._garbage = 0
+        # Whether the pool holds exactly the names of the entries, in order
+        self._packed = True
+        self._folder = array('I')
+        self._start = array('Q')
+        self._length = array('H')
+        self.extend(paths)
+
+    def copy(self):
+        table = PathTable()
+        table._folders = list(self._folders)
+        table._folderIds = dict(self._folderIds)
+        table._pool = bytearray(self._pool)
+        table._garbage = self._garbage
+        table._packed = self._packed
+        table._folder = array('I', self._folder)
+        table._start = array('Q', self._start)
+        table._length = array('H', self._length)
+        return table
+
+    @classmethod
+    def fromParts(cls, folders, folder, length, pool):
+        """The table stored as parts(). Raises ValueError if they do not
+        fit together."""
+        if (len(folder) != len(length) or sum(length) != len(pool)
+                or not all(isinstance(prefix, str) for prefix in folders)
+                or len(set(folders)) != len(folders) or (folder and max(folder) >= len(folders))):
+            raise ValueError('inconsistent path table')
+        table = cls()
+        table._folders = list(folders)
+        table._folderIds = dict((prefix, i) for i, prefix in enumerate(folders))
+        table._folder, table._length, table._pool = folder, length, bytearray(pool)
+        table._start = array('Q', accumulate(chain((0,), length)))
+        del table._start[-1]
+        return table
+
+    def parts(self):
+        """(folder prefixes, folder id array, name length array, name bytes),
+        the entries' names back to back in the bytes, for storing."""
+        table = self if self._packed else self.reordered(range(len(self)))
+        return table._folders, table._folder, table._length, bytes(table._pool)
+
+    def reordered(self, order):
+        """A copy with the entries at the positions in order, in that order."""
+        table = PathTable()
+        table._folders = list(self._folders)
+        table._folderIds = dict(self._folderIds)
+        folder, start, length, pool = self._folder, self._start, self._length, self._pool
+        table._folder = array('I', [folder[i] for i in order])
+        table._length = array('H', [length[i] for i in order])
+        table._pool = bytearray().join([pool[start[i]:start[i] + length[i]] for i in order])
+        table._start = array('Q', [0]) * len(order)
+        offset = 0
+        for i, length in enumerate(table._length):
+            table._start[i] = offset
+            offset += length
+        return table
+
+    def __len__(self):
+        return len(self._folder)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._folders[self._folder[i]] + self.name(i)
+
+    def __iter__(self):
+        folders = self._folders
+        for folderId, name in self.items():
+            yield folders[folderId] + name
+
+    def items(self):
+        """(folder id, name) of every entry, in order."""
+        try:
+            # Offsets in bytes are offsets in characters: decode only once.
+            pool = self._pool.decode('ascii')
+        except UnicodeDecodeError:
+            pool = self._pool
+            for folderId, start, length in zip(self._folder, self._start, self._length):
+                yield folderId, pool[start:start + length].decode('utf-8', 'surrogateescape')
+            return
+        for folderId, start, length in zip(self._folder, self._start, self._length):
+            yield folderId, pool[start:start + length]
+
+    def __eq__(self, other):
+        if len(self) != len(other):
+            return False
+        if (isinstance(other, PathTable) and self._packed and other._packed
+                and self._folders == other._folders):
+            return (self._folder == other._folder and self._length == other._length
+                    and self._pool == other._pool)
+        return all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    @property
+    def folders(self):
+        """The folder prefixes, indexed by folderId()."""
+        return self._folders
+
+    def folderId(self, i):
+        return self._folder[i]
+
+    def name(self, i):
+        start = self._start[i]
+        return self._pool[start:start + self._length[i]].decode('utf-8', 'surrogateescape')
+
+    def append(self, path):
+        self.extend((path,))
+
+    def extend(self, paths):
+        folders, folderIds, pool = self._folders, self._folderIds, self._pool
+        addFolder, addStart, addLength = self._folder.append, self._start.append, self._length.append
+        for path in paths:
+            folder, name = splitPath(path)
+            folderId = folderIds.get(folder)
+            if folderId is None:
+                folderId = folderIds[folder] = len(folders)
+                folders.append(folder)
+            name = name.encode('utf-8', 'surrogateescape')
+            addFolder(folderId)
+            addStart(len(pool))
+            addLength(len(name))
+            pool += name
+
+    def insert(self, i, path):
+        self.append(path)
+        if i < len(self._folder) - 1:
+            for entries in (self._folder, self._start, self._length):
+                entries.insert(i, entries.pop())
+            self._packed = False
+
+    def __delitem__(self, i):
+        self._garbage += self._length[i]
+        del self._folder[i], self._start[i], self._length[i]
+        self._packed = False
+        if self._garbage > len(self._pool) // 2:
+            self._compact()
+
+    def _compact(self):
+        pool, start = bytearray(), array('Q')
+        for offset, length in zip(self._start, self._length):
+            start.append(len(pool))
+            pool += self._pool[offset:offset + length]
+        self._pool, self._start, self._garbage = pool, start, 0
+        self._packed = True
@@ -0,0 +1,66 @@
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Durations kept per timer for the rolling percentiles.
+ROLLING_WINDOW = 240
+
+
+def percentile(sortedValues, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sortedValues:
+        return 0.0
+    rank = int(math.ceil(fraction * len(sortedValues))) - 1
+    return sortedValues[min(max(rank, 0), len(sortedValues) - 1)]
+
+
+class PerfCounters(object):
+    """Rolling durations (in ms) of named operations plus a few gauges.
+
+    Cheap enough to stay on all the time: a timing is two perf_counter()
+    calls and a deque append. counters() returns a plain dict snapshot, like
+    the image cache and prefetcher counters, for diagnosing user machines."""
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self._timings = {}
+        self._gauges = {}
+
+    def record(self, name, ms):
+        timings = self._timings.get(name)
+        if timings is None:
+            timings = self._timings[name] = deque(maxlen=self.window)
+        timings.append(ms)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000.0)
+
+    def set(self, name, value):
+        self._gauges[name] = value
+
+    def gauge(self, name, default=None):
+        return self._gauges.get(name, default)
+
+    def stats(self, name):
+        """{'last', 'p50', 'p95', 'p99', 'count'} of a timer, in ms."""
+        timings = self._timings.get(name)
+        if not timings:
+            return {'last': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'count': 0}
+        ordered = sorted(timings)
+        return {'last': timings[-1], 'p50': percentile(ordered, 0.50), 'p95': percentile(ordered, 0.95),
+                'p99': percentile(ordered, 0.99), 'count': len(timings)}
+
+    def counters(self):
+        result = dict((name, self.stats(name)) for name in self._timings)
+        result.update(self._gauges)
+        return result
+
+    def clear(self):
+        self._timings.clear()
+        self._gauges.clear()
@@ -0,0 +1,52 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+# How often the overlay text is refreshed, in ms.
+REFRESH_INTERVAL = 250
+
+
+class PerfOverlay(QLabel):
+    """Developer overlay with the canvas paint timings, drawn over the
+    top-left corner of the scroll area.
+
+    It is a widget of its own, refreshed from a timer, so that it neither
+    forces full canvas repaints nor shows up in the timings it reports."""
+
+    def __init__(self, perf, parent=None):
+        super(PerfOverlay, self).__init__(parent)
+        self.perf = perf
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setStyleSheet('background-color: rgba(0, 0, 0, 170); color: white; padding: 4px;')
+        self.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self._timer = QTimer(self)
+        self._timer.setInterval(REFRESH_INTERVAL)
+        self._timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def setActive(self, value):
+        self.setVisible(value)
+        if value:
+            self.refresh()
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def refresh(self):
+        lines = []
+        for name in ('paintEvent', 'renderFrame', 'paintCanvas', 'adjustScale'):
+            s = self.perf.stats(name)
+            lines.append('%-11s last %6.2f  p50 %6.2f  p95 %6.2f  p99 %6.2f ms'
+                         % (name, s['last'], s['p50'], s['p95'], s['p99']))
+        source, scaled = self.perf.gauge('sourceSize'), self.perf.gauge('scaledSize')
+        lines.append('shapes painted %d' % self.perf.gauge('shapesPainted', 0))
+        if source and scaled:
+            lines.append('pixmap %dx%d -> scaled %dx%d' % (source + scaled))
+        self.setText('\n'.join(lines))
+        self.adjustSize()
+        self.move(8, 8)
+        self.raise_()
@@ -9,8 +9,8 @@ except ImportError:
     from PyQt4.QtGui import *
     from PyQt4.QtCore import *
 
-from libs.utils import distance
-import sys
+from array import array
+import math
 
 DEFAULT_LINE_COLOR = QColor(0, 255, 0, 128)
 DEFAULT_FILL_COLOR = QColor(255, 0, 0, 128)
@@ -20,15 +20,46 @@ DEFAULT_VERTEX_FILL_COLOR = QColor(0, 255, 0, 255)
 DEFAULT_HVERTEX_FILL_COLOR = QColor(255, 0, 0)
 
 
+class ShapeColor(object):
+    """A color of a shape that falls back to a default shared by all shapes.
+
+    Read on the class it is the default; set on a shape it overrides the
+    default for that shape only. Shape uses __slots__, so the override lives
+    in the slot of the same name with a leading underscore."""
+
+    def __init__(self, name, default):
+        self.slot = '_' + name
+        self.default = default
+
+    def __get__(self, shape, cls):
+        if shape is None:
+            return self.default
+        color = getattr(shape, self.slot)
+        return self.default if color is None else color
+
+    def __set__(self, shape, color):
+        setattr(shape, self.slot, color)
+
+
 class Shape(object):
+    """A polygon on the canvas.
+
+    Points are kept as a flat array of x, y coordinates, and the outline
+    path and bounding rect are built once per change of the points rather
+    than on every paint; the vertex markers are rebuilt only when the zoom
+    or the highlighted vertex changes."""
+    __slots__ = ('label', '_coords', 'fill', 'selected', 'difficult', 'paintLabel',
+                 '_highlightIndex', '_highlightMode', '_closed', '_line_color', '_fill_color',
+                 '_path', '_rect', '_vertexPath', '_vertexKey')
+
     P_SQUARE, P_ROUND = range(2)
 
     MOVE_VERTEX, NEAR_VERTEX = range(2)
 
     # The following class variables influence the drawing
     # of _all_ shape objects.
-    line_color = DEFAULT_LINE_COLOR
-    fill_color = DEFAULT_FILL_COLOR
+    line_color = ShapeColor('line_color', DEFAULT_LINE_COLOR)
+    fill_color = ShapeColor('fill_color', DEFAULT_FILL_COLOR)
     select_line_color = DEFAULT_SELECT_LINE_COLOR
     select_fill_color = DEFAULT_SELECT_FILL_COLOR
     vertex_fill_color = DEFAULT_VERTEX_FILL_COLOR
@@ -38,9 +69,15 @@ class Shape(object):
     scale = 1.0
     labelFontSize = 8
 
+    # Size factor and marker of the highlighted vertex, per highlight mode
+    HIGHLIGHT_SETTINGS = {
+        NEAR_VERTEX: (4, P_ROUND),
+        MOVE_VERTEX: (1.5, P_SQUARE),
+    }
+
     def __init__(self, label=None, line_color=None, difficult=False, paintLabel=False):
         self.label = label
-        self.points = []
+        self._coords = array('d')
         self.fill = False
         self.selected = False
         self.difficult = difficult
@@ -48,34 +85,53 @@ class Shape(object):
 
         self._highlightIndex = None
         self._highlightMode = self.NEAR_VERTEX
-        self._highlightSettings = {
-            self.NEAR_VERTEX: (4, self.P_ROUND),
-            self.MOVE_VERTEX: (1.5, self.P_SQUARE),
-        }
 
         self._closed = False
-
-        if line_color is not None:
-            # Override the class line_color attribute
-            # with an object attribute. Currently this
-            # is used for drawing the pending line a different color.
-            self.line_color = line_color
+        self._fill_color = None
+        # Override the class line_color with a shape color. Currently this
+        # is used for drawing the pending line a different color.
+        self._line_color = line_color
+        self._changed()
+
+    def _changed(self):
+        """Drop the geometry cached for the previous points."""
+        self._path = None
+        self._rect = None
+        self._vertexPath = None
+        self._vertexKey = None
+
+    @property
+    def points(self):
+        c = self._coords
+        return [QPointF(c[i], c[i + 1]) for i in range(0, len(c), 2)]
+
+    @points.setter
+    def points(self, points):
+        self._coords = array('d')
+        for p in points:
+            self._coords.extend((p.x(), p.y()))
+        self._changed()
 
     def close(self):
         self._closed = True
+        self._path = None
 
     def reachMaxPoints(self):
-        if len(self.points) >= 4:
+        if len(self) >= 4:
             return True
         return False
 
     def addPoint(self, point):
         if not self.reachMaxPoints():
-            self.points.append(point)
+            self._coords.extend((point.x(), point.y()))
+            self._changed()
 
     def popPoint(self):
-        if self.points:
-            return self.points.pop()
+        if self._coords:
+            point = self[-1]
+            del self._coords[-2:]
+            self._changed()
+            return point
         return None
 
     def isClosed(self):
@@ -83,98 +139,117 @@ class Shape(object):
 
     def setOpen(self):
         self._closed = False
-
-    def paint(self, painter):
-        if self.points:
+        self._path = None
+
+    def paint(self, painter, scale=None):
+        """Paint at `scale`, by default the class-wide Shape.scale. A render
+        thread passes its own so as not to depend on what the GUI set."""
+        if scale is None:
+            scale = self.scale
+        if self._coords:
             color = self.select_line_color if self.selected else self.line_color
             pen = QPen(color)
             # Try using integer sizes for smoother drawing(?)
-            pen.setWidth(max(1, int(round(2.0 / self.scale))))
+            pen.setWidth(max(1, int(round(2.0 / scale))))
             painter.setPen(pen)
 
-            line_path = QPainterPath()
-            vrtx_path = QPainterPath()
-
-            line_path.moveTo(self.points[0])
-            # Uncommenting the following line will draw 2 paths
-            # for the 1st vertex, and make it non-filled, which
-            # may be desirable.
-            #self.drawVertex(vrtx_path, 0)
-
-            for i, p in enumerate(self.points):
-                line_path.lineTo(p)
-                self.drawVertex(vrtx_path, i)
-            if self.isClosed():
-                line_path.lineTo(self.points[0])
+            line_path = self.makePath()
+            vrtx_path = self.vertexPath(scale)
 
             painter.drawPath(line_path)
             painter.drawPath(vrtx_path)
-            painter.fillPath(vrtx_path, self.vertex_fill_color)
+            vertexColor = self.hvertex_fill_color if self._highlightIndex is not None else self.vertex_fill_color
+            painter.fillPath(vrtx_path, vertexColor)
 
             # Draw text at the top-left
             if self.paintLabel:
-                min_x = sys.maxsize
-                min_y = sys.maxsize
                 min_y_label = int(1.25 * self.labelFontSize)
-                for point in self.points:
-                    min_x = min(min_x, point.x())
-                    min_y = min(min_y, point.y())
-                if min_x != sys.maxsize and min_y != sys.maxsize:
-                    font = QFont()
-                    font.setPointSize(self.labelFontSize)
-                    font.setBold(True)
-                    painter.setFont(font)
-                    if(self.label == None):
-                        self.label = ""
-                    if(min_y < min_y_label):
-                        min_y += min_y_label
-                    painter.drawText(min_x, min_y, self.label)
+                rect = self.boundingRect()
+                min_x, min_y = rect.left(), rect.top()
+                font = QFont()
+                font.setPointSize(self.labelFontSize)
+                font.setBold(True)
+                painter.setFont(font)
+                if(self.label == None):
+                    self.label = ""
+                if(min_y < min_y_label):
+                    min_y += min_y_label
+                painter.drawText(QPointF(min_x, min_y), self.label)
 
             if self.fill:
                 color = self.select_fill_color if self.selected else self.fill_color
                 painter.fillPath(line_path, color)
 
-    def drawVertex(self, path, i):
-        d = self.point_size / self.scale
+    def vertexPath(self, scale=None):
+        """Markers of all vertices at the current scale, cached until the
+        scale, the highlight or the points change."""
+        if scale is None:
+            scale = self.scale
+        key = (scale, self.point_size, self._highlightIndex, self._highlightMode)
+        if self._vertexPath is None or self._vertexKey != key:
+            path = QPainterPath()
+            for i in range(len(self)):
+                self.drawVertex(path, i, scale)
+            self._vertexPath, self._vertexKey = path, key
+        return self._vertexPath
+
+    def drawVertex(self, path, i, scale=None):
+        d = self.point_size / (self.scale if scale is None else scale)
         shape = self.point_type
-        point = self.points[i]
+        x, y = self._coords[2 * i], self._coords[2 * i + 1]
         if i == self._highlightIndex:
-            size, shape = self._highlightSettings[self._highlightMode]
+            size, shape = self.HIGHLIGHT_SETTINGS[self._highlightMode]
             d *= size
-        if self._highlightIndex is not None:
-            self.vertex_fill_color = self.hvertex_fill_color
-        else:
-            self.vertex_fill_color = Shape.vertex_fill_color
         if shape == self.P_SQUARE:
-            path.addRect(point.x() - d / 2, point.y() - d / 2, d, d)
+            path.addRect(x - d / 2, y - d / 2, d, d)
         elif shape == self.P_ROUND:
-            path.addEllipse(point, d / 2.0, d / 2.0)
+            path.addEllipse(QPointF(x, y), d / 2.0, d / 2.0)
         else:
             assert False, "unsupported vertex shape"
 
     def nearestVertex(self, point, epsilon):
-        for i, p in enumerate(self.points):
-            if distance(p - point) <= epsilon:
-                return i
+        px, py = point.x(), point.y()
+        c = self._coords
+        for i in range(0, len(c), 2):
+            if math.hypot(c[i] - px, c[i + 1] - py) <= epsilon:
+                return i // 2
         return None
 
     def containsPoint(self, point):
         return self.makePath().contains(point)
 
     def makePath(self):
-        path = QPainterPath(self.points[0])
-        for p in self.points[1:]:
-            path.lineTo(p)
-        return path
+        """The outline through all points, closed if the shape is. Cached:
+        do not modify the returned path."""
+        if self._path is None:
+            c = self._coords
+            path = QPainterPath(QPointF(c[0], c[1]))
+            for i in range(2, len(c), 2):
+                path.lineTo(c[i], c[i + 1])
+            if self._closed:
+                path.closeSubpath()
+            self._path = path
+        return self._path
 
     def boundingRect(self):
-        return self.makePath().boundingRect()
+        if self._rect is None:
+            c = self._coords
+            xs, ys = c[0::2], c[1::2]
+            self._rect = QRectF(QPointF(min(xs), min(ys)), QPointF(max(xs), max(ys)))
+        return QRectF(self._rect)
 
     def moveBy(self, offset):
-        self.points = [p + offset for p in self.points]
+        dx, dy = offset.x(), offset.y()
+        c = self._coords
+        for i in range(0, len(c), 2):
+            c[i] += dx
+            c[i + 1] += dy
+        self._changed()
 
     def moveVertexBy(self, i, offset):
-        self.points[i] = self.points[i] + offset
+        self._coords[2 * i] += offset.x()
+        self._coords[2 * i + 1] += offset.y()
+        self._changed()
 
     def highlightVertex(self, i, action):
         self._highlightIndex = i
@@ -185,22 +260,33 @@ class Shape(object):
 
     def copy(self):
         shape = Shape("%s" % self.label)
-        shape.points = [p for p in self.points]
+        shape._coords = array('d', self._coords)
         shape.fill = self.fill
         shape.selected = self.selected
         shape._closed = self._closed
-        if self.line_color != Shape.line_color:
-            shape.line_color = self.line_color
-        if self.fill_color != Shape.fill_color:
-            shape.fill_color = self.fill_color
+        shape._line_color = self._line_color
+        shape._fill_color = self._fill_color
         shape.difficult = self.difficult
+        shape.paintLabel = self.paintLabel
         return shape
 
     def __len__(self):
-        return len(self.points)
+        return len(self._coords) // 2
+
+    def _index(self, key):
+        n = len(self)
+        if key < 0:
+            key += n
+        if not 0 <= key < n:
+            raise IndexError('shape point index out of range')
+        return 2 * key
 
     def __getitem__(self, key):
-        return self.points[key]
+        i = self._index(key)
+        return QPointF(self._coords[i], self._coords[i + 1])
 
     def __setitem__(self, key, value):
-        self.points[key] = value
+        i = self._index(key)
+        self._coords[i] = value.x()
+        self._coords[i + 1] = value.y()
+        self._changed()
@@ -0,0 +1,93 @@
+import math
+
+# Edge of a grid cell in image pixels.
+CELL_SIZE = 128
+
+
+class ShapeIndex(object):
+    """Uniform grid over the bounding boxes of the canvas shapes.
+
+    Each shape is registered in every cell its bounding box overlaps, so a
+    hit test only looks at the few shapes near the cursor instead of all of
+    them. Shapes keep the order they were inserted in, which is the paint
+    order of the canvas; query() returns the topmost first."""
+
+    def __init__(self, cellSize=CELL_SIZE):
+        self.cellSize = cellSize
+        self.clear()
+
+    def clear(self):
+        self._cells = {}
+        self._boxes = {}
+        self._order = {}
+        self._next = 0
+
+    def rebuild(self, shapes):
+        self.clear()
+        for shape in shapes:
+            self.insert(shape)
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, shape):
+        return shape in self._boxes
+
+    def _cellRange(self, left, top, right, bottom):
+        c = float(self.cellSize)
+        return (int(math.floor(left / c)), int(math.floor(top / c)),
+                int(math.floor(right / c)), int(math.floor(bottom / c)))
+
+    def _add(self, shape):
+        rect = shape.boundingRect()
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self._boxes[shape] = box
+        x0, y0, x1, y1 = self._cellRange(*box)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                self._cells.setdefault((cx, cy), []).append(shape)
+
+    def _discard(self, shape):
+        box = self._boxes.pop(shape)
+        x0, y0, x1, y1 = self._cellRange(*box)
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                cell = self._cells[(cx, cy)]
+                cell.remove(shape)
+                if not cell:
+                    del self._cells[(cx, cy)]
+
+    def insert(self, shape):
+        """Add shape on top of the others."""
+        if not len(shape):
+            return
+        if shape in self._boxes:
+            self._discard(shape)
+        self._order[shape] = self._next
+        self._next += 1
+        self._add(shape)
+
+    def update(self, shape):
+        """Re-register shape after its points changed, keeping its order."""
+        if shape in self._boxes:
+            self._discard(shape)
+            self._add(shape)
+
+    def remove(self, shape):
+        if shape in self._boxes:
+            self._discard(shape)
+            del self._order[shape]
+
+    def query(self, point, margin=0.0):
+        """Shapes whose bounding box grown by margin contains point, topmost
+        first."""
+        x, y = point.x(), point.y()
+        x0, y0, x1, y1 = self._cellRange(x - margin, y - margin, x + margin, y + margin)
+        found = set()
+        for cy in range(y0, y1 + 1):
+            for cx in range(x0, x1 + 1):
+                for shape in self._cells.get((cx, cy), ()):
+                    left, top, right, bottom = self._boxes[shape]
+                    if left - margin <= x <= right + margin and top - margin <= y <= bottom + margin:
+                        found.add(shape)
+        return sorted(found, key=self._order.__getitem__, reverse=True)
@@ -0,0 +1,220 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import mmap
+import os
+import threading
+from array import array
+
+from libs.cacheFile import bytesArray, joinNames, readCacheFile, splitNames, writeCacheFile
+from libs.exifThumbnail import readThumbnail
+from libs.imageReader import readImage
+
+THUMBNAIL_SIZE = 96
+ATLAS_FILENAME = 'thumbnails.atlas'
+INDEX_FILENAME = 'thumbnails.index'
+INDEX_VERSION = 2
+# The atlas file starts with this many slots and doubles when full.
+ATLAS_MIN_SLOTS = 64
+# Save the index after this many new thumbnails while filling.
+SAVE_INTERVAL = 256
+
+
+def makeThumbnail(filePath, size=THUMBNAIL_SIZE):
+    """Decode a thumbnail of at most size x size pixels, preferring the
+    embedded EXIF one when it is large enough."""
+    image = readThumbnail(filePath)
+    if image.isNull() or (image.width() < size and image.height() < size):
+        image = readImage(filePath, QSize(size, size))
+    if image.isNull():
+        return image
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    return image.convertToFormat(QImage.Format_RGB888)
+
+
+class ThumbnailAtlas(object):
+    """Persistent thumbnails of a photo collection.
+
+    All thumbnails live in one memory-mapped file of fixed size RGB888 slots,
+    so fetching one is a slice at slot * slotBytes with no per-file open.
+    The index maps each path to its slot and remembers the mtime and size it
+    was made from; it is stored as a handful of flat arrays so that opening
+    the atlas of a large archive is a single read. It is only data, never
+    code, since the folder may be shared: a damaged index is a cache miss."""
+
+    def __init__(self, cacheDir, size=THUMBNAIL_SIZE):
+        self.cacheDir = cacheDir
+        self.size = size
+        self.slotBytes = size * size * 3
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._file = None
+        self._map = None
+        self._capacity = 0
+        self._reset()
+        self._open()
+
+    def _reset(self):
+        self._paths = []
+        self._mtimes = array('q')
+        self._sizes = array('q')
+        self._dims = array('H')
+        self._slots = {}
+
+    def _open(self):
+        if not os.path.isdir(self.cacheDir):
+            os.makedirs(self.cacheDir)
+        try:
+            header, (paths, mtimes, sizes, dims) = readCacheFile(
+                os.path.join(self.cacheDir, INDEX_FILENAME), INDEX_VERSION)
+            if header['size'] == self.size:
+                count = header['count']
+                self._paths = splitNames(paths, count)
+                self._mtimes, self._sizes = bytesArray('q', mtimes, count), bytesArray('q', sizes, count)
+                self._dims = bytesArray('H', dims, 2 * count)
+        except Exception:
+            # Missing, outdated or damaged: start over.
+            self._reset()
+        atlasPath = os.path.join(self.cacheDir, ATLAS_FILENAME)
+        self._file = open(atlasPath, 'r+b' if os.path.exists(atlasPath) else 'w+b')
+        self._file.seek(0, os.SEEK_END)
+        self._capacity = self._file.tell() // self.slotBytes
+        if self._capacity < len(self._paths):
+            # The atlas was truncated behind our back: forget what is missing.
+            del self._paths[self._capacity:]
+            del self._mtimes[self._capacity:], self._sizes[self._capacity:], self._dims[2 * self._capacity:]
+        self._slots = dict((path, slot) for slot, path in enumerate(self._paths))
+        if self._capacity:
+            self._map = mmap.mmap(self._file.fileno(), self._capacity * self.slotBytes)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __contains__(self, filePath):
+        return filePath in self._slots
+
+    def slot(self, filePath):
+        return self._slots.get(filePath)
+
+    def isCurrent(self, filePath, stat):
+        slot = self._slots.get(filePath)
+        return slot is not None and self._mtimes[slot] == stat.st_mtime_ns and self._sizes[slot] == stat.st_size
+
+    def thumbnailAt(self, slot):
+        with self._lock:
+            width, height = self._dims[2 * slot], self._dims[2 * slot + 1]
+            offset = slot * self.slotBytes
+            data = self._map[offset:offset + height * self.size * 3]
+        return QImage(data, width, height, self.size * 3, QImage.Format_RGB888).copy()
+
+    def thumbnail(self, filePath):
+        """The thumbnail of filePath, or a null QImage if it is not in the atlas."""
+        slot = self._slots.get(filePath)
+        if slot is None:
+            return QImage()
+        return self.thumbnailAt(slot)
+
+    def add(self, filePath, image, stat):
+        image = image.convertToFormat(QImage.Format_RGB888)
+        width, height = min(image.width(), self.size), min(image.height(), self.size)
+        bits = image.constBits()
+        bits.setsize(image.bytesPerLine() * image.height())
+        pixels = bytes(bits)
+        with self._lock:
+            if self._file.closed:
+                return None
+            slot = self._slots.get(filePath)
+            if slot is None:
+                slot = len(self._paths)
+                self._reserve(slot + 1)
+                self._paths.append(filePath)
+                self._mtimes.append(stat.st_mtime_ns)
+                self._sizes.append(stat.st_size)
+                self._dims.extend((width, height))
+                self._slots[filePath] = slot
+            else:
+                self._mtimes[slot], self._sizes[slot] = stat.st_mtime_ns, stat.st_size
+                self._dims[2 * slot], self._dims[2 * slot + 1] = width, height
+            offset = slot * self.slotBytes
+            stride, row = self.size * 3, width * 3
+            for y in range(height):
+                start = y * image.bytesPerLine()
+                self._map[offset + y * stride:offset + y * stride + row] = pixels[start:start + row]
+        return slot
+
+    def _reserve(self, slots):
+        if slots <= self._capacity:
+            return
+        self._capacity = max(slots, 2 * self._capacity, ATLAS_MIN_SLOTS)
+        if self._map is not None:
+            self._map.close()
+        self._file.truncate(self._capacity * self.slotBytes)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity * self.slotBytes)
+
+    def save(self):
+        with self._lock:
+            header = {'size': self.size, 'count': len(self._paths)}
+            blobs = [joinNames(self._paths), array('q', self._mtimes), array('q', self._sizes),
+                     array('H', self._dims)]
+            if self._map is not None:
+                self._map.flush()
+        writeCacheFile(os.path.join(self.cacheDir, INDEX_FILENAME), INDEX_VERSION, header, blobs)
+
+    def fill(self, filePaths, listener=None):
+        """Make the missing or outdated thumbnails of filePaths, a list or a
+        PathTable, on a background thread. listener(path, slot) is called
+        from that thread for every thumbnail added."""
+        self.stop()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._fill, args=(filePaths.copy(), listener))
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _fill(self, filePaths, listener):
+        added = 0
+        for filePath in filePaths:
+            if self._stop.is_set():
+                break
+            try:
+                stat = os.stat(filePath)
+            except OSError:
+                continue
+            if self.isCurrent(filePath, stat):
+                continue
+            image = makeThumbnail(filePath, self.size)
+            if image.isNull():
+                continue
+            slot = self.add(filePath, image, stat)
+            if slot is None:
+                break
+            added += 1
+            if listener is not None:
+                listener(filePath, slot)
+            if added % SAVE_INTERVAL == 0:
+                self.save()
+        if added:
+            self.save()
+
+    def wait(self):
+        """Block until the current fill has finished."""
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def stop(self):
+        self._stop.set()
+        self.wait()
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
@@ -0,0 +1,211 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+    from PyQt5.QtWidgets import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import os
+import threading
+from collections import OrderedDict, deque
+
+from libs.thumbnailAtlas import THUMBNAIL_SIZE, makeThumbnail
+
+# Most thumbnail requests kept queued; older ones have scrolled away anyway.
+MAX_PENDING_REQUESTS = 128
+# Most thumbnail pixmaps kept in memory by the model.
+MAX_CACHED_THUMBNAILS = 2048
+CELL_MARGIN = 6
+LABEL_HEIGHT = 18
+
+
+class ThumbnailLoader(QObject):
+    """Decodes thumbnails for the grid on a background thread.
+
+    Requests go into a bounded queue that is served newest first, and the
+    view drops requests for rows that scrolled out of sight with retain(),
+    so fast scrolling never builds up a backlog."""
+    loaded = pyqtSignal(int, str, QImage)
+
+    def __init__(self, parent=None):
+        super(ThumbnailLoader, self).__init__(parent)
+        self.atlas = None
+        self._queue = deque()
+        self._pending = set()
+        self._wakeup = threading.Condition()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def request(self, row, filePath):
+        with self._wakeup:
+            if (row, filePath) in self._pending:
+                return
+            if len(self._queue) >= MAX_PENDING_REQUESTS:
+                self._pending.discard(self._queue.popleft())
+            self._queue.append((row, filePath))
+            self._pending.add((row, filePath))
+            self._wakeup.notify()
+
+    def retain(self, first, last):
+        """Cancel the queued requests for rows outside [first, last]."""
+        with self._wakeup:
+            kept = deque(r for r in self._queue if first <= r[0] <= last)
+            self._pending = set(kept)
+            self._queue = kept
+
+    def clear(self):
+        with self._wakeup:
+            self._queue.clear()
+            self._pending.clear()
+
+    def stop(self):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                while not self._queue and not self._stopped:
+                    self._wakeup.wait()
+                if self._stopped:
+                    return
+                row, filePath = self._queue.pop()
+                self._pending.discard((row, filePath))
+            image = makeThumbnail(filePath)
+            atlas = self.atlas
+            if not image.isNull() and atlas is not None:
+                try:
+                    atlas.add(filePath, image, os.stat(filePath))
+                except OSError:
+                    pass
+            self.loaded.emit(row, filePath, image)
+
+
+class ThumbnailModel(QIdentityProxyModel):
+    """The rows of a FileListModel with their thumbnails and file names.
+
+    Thumbnails are only looked up when the view asks for the decoration of a
+    row, i.e. when it is painted. Atlas hits are served straight away,
+    anything else is requested from the loader and filled in later."""
+
+    def __init__(self, parent=None):
+        super(ThumbnailModel, self).__init__(parent)
+        self.atlas = None
+        self.loader = ThumbnailLoader(self)
+        self.loader.loaded.connect(self.thumbnailLoaded)
+        self._pixmaps = OrderedDict()
+        self._placeholder = QPixmap(THUMBNAIL_SIZE, THUMBNAIL_SIZE)
+        self._placeholder.fill(QColor(232, 232, 232))
+        self.modelReset.connect(self.clearThumbnails)
+
+    def clearThumbnails(self):
+        self._pixmaps.clear()
+        self.loader.clear()
+
+    def setAtlas(self, atlas):
+        self.atlas = self.loader.atlas = atlas
+
+    def filePath(self, row):
+        return self.sourceModel().filePath(row) if self.sourceModel() is not None else None
+
+    def data(self, index, role=Qt.DisplayRole):
+        filePath = self.filePath(index.row()) if index.isValid() else None
+        if filePath is None:
+            return None
+        if role == Qt.DisplayRole:
+            return os.path.basename(filePath)
+        if role == Qt.DecorationRole:
+            return self.thumbnail(index.row(), filePath)
+        return super(ThumbnailModel, self).data(index, role)
+
+    def thumbnail(self, row, filePath):
+        pixmap = self._pixmaps.get(filePath)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(filePath)
+            return pixmap
+        if self.atlas is not None and filePath in self.atlas:
+            return self._remember(filePath, QPixmap.fromImage(self.atlas.thumbnail(filePath)))
+        self.loader.request(row, filePath)
+        return self._placeholder
+
+    def thumbnailLoaded(self, row, filePath, image):
+        if image.isNull() or self.filePath(row) != filePath:
+            return
+        self._remember(filePath, QPixmap.fromImage(image))
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def _remember(self, filePath, pixmap):
+        self._pixmaps[filePath] = pixmap
+        if len(self._pixmaps) > MAX_CACHED_THUMBNAILS:
+            self._pixmaps.popitem(last=False)
+        return pixmap
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Paints a cell of the thumbnail grid: the centred thumbnail above the
+    elided file name."""
+
+    def sizeHint(self, option, index):
+        return QSize(THUMBNAIL_SIZE + 2 * CELL_MARGIN, THUMBNAIL_SIZE + LABEL_HEIGHT + 2 * CELL_MARGIN)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None:
+            x = rect.x() + (rect.width() - pixmap.width()) // 2
+            y = rect.y() + CELL_MARGIN + (THUMBNAIL_SIZE - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        textRect = QRect(rect.x() + 2, rect.bottom() - LABEL_HEIGHT - CELL_MARGIN // 2,
+                         rect.width() - 4, LABEL_HEIGHT)
+        text = option.fontMetrics.elidedText(index.data(Qt.DisplayRole), Qt.ElideMiddle, textRect.width())
+        if option.state & QStyle.State_Selected:
+            painter.setPen(option.palette.highlightedText().color())
+        painter.drawText(textRect, Qt.AlignCenter, text)
+        painter.restore()
+
+
+class ThumbnailView(QListView):
+    """Grid of thumbnails for the file dock. Rows have a uniform size so that
+    the view only ever lays out and paints what is visible, and thumbnail
+    requests for rows that scroll away are cancelled."""
+
+    def __init__(self, parent=None):
+        super(ThumbnailView, self).__init__(parent)
+        self.setViewMode(QListView.IconMode)
+        self.setMovement(QListView.Static)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setItemDelegate(ThumbnailDelegate(self))
+        self.verticalScrollBar().valueChanged.connect(self.cancelHiddenRequests)
+
+    def visibleRows(self):
+        """First and last row that can currently be seen."""
+        count = self.model().rowCount() if self.model() is not None else 0
+        viewport = self.viewport().rect()
+        first = self.indexAt(viewport.topLeft() + QPoint(CELL_MARGIN, CELL_MARGIN))
+        first = first.row() if first.isValid() else 0
+        cell = self.itemDelegate().sizeHint(None, None)
+        columns = max(1, viewport.width() // max(1, cell.width()))
+        rows = viewport.height() // max(1, cell.height()) + 2
+        return first, min(count - 1, first + columns * rows)
+
+    def cancelHiddenRequests(self, _value=None):
+        if self.model() is None:
+            return
+        first, last = self.visibleRows()
+        self.model().loader.retain(first, last)
+
+    def resizeEvent(self, event):
+        super(ThumbnailView, self).resizeEvent(event)
+        self.cancelHiddenRequests()
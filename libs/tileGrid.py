@@ -0,0 +1,259 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.imageCache import ImageCache, imageBytes
+
+TILE_SIZE = 512
+# Bytes of tile pixmaps kept per image, its mipmaps included, about three
+# 4K screens: the least recently painted, i.e. scrolled away, go first.
+TILE_BUDGET = 96 << 20
+# Largest edge, in device pixels, of a tile the render thread resamples;
+# larger, i.e. strongly magnified, tiles are scaled by the painter.
+MAX_SCALED_TILE = 2048
+# Images are halved for mipmaps down to about this many pixels on their
+# longest edge.
+MIPMAP_MIN_SIZE = 256
+
+
+def pixmapBytes(pixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def buildMipmaps(image, minSize=MIPMAP_MIN_SIZE, flipped=False):
+    """Successively halved copies of image, each scaled from the previous.
+    An upside down (flipped) image gives mipmaps the right way up."""
+    mipmaps = []
+    while max(image.width(), image.height()) > 2 * minSize:
+        image = image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                             Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if flipped:
+            image, flipped = image.mirrored(False, True), False
+        mipmaps.append(image)
+    return mipmaps
+
+
+class TileGrid(object):
+    """An image held as a grid of fixed size tiles for the canvas.
+
+    Tiles are converted to pixmaps lazily, the first time they intersect the
+    painted region, so painting costs the viewport rather than the image.
+    Up to TILE_BUDGET bytes of them are kept, shared with the mipmaps, so
+    the pixmaps never add up to a second copy of a large image. The GUI
+    thread scales them with the painter; render() resamples tiles to
+    device pixels for the full quality frames of the render thread.
+
+    `image` may be a lower resolution preview of an image of `imageSize`;
+    painting is always done in imageSize coordinates. Once setMipmaps() has
+    been given halved copies of the image, zoomed out views are painted
+    from the smallest one that still has enough pixels.
+
+    With `flipped`, `image` is upside down, e.g. the rows of a bottom-up
+    BMP mapped as they are in the file; tiles are turned over as they are
+    copied out.
+
+    Without `cacheTiles`, e.g. for a memory-mapped image, tiles are drawn
+    straight from the image and no pixmaps are made of them, so the pages
+    painted stay those of the file, which the OS can drop again."""
+
+    def __init__(self, image, imageSize=None, tileSize=TILE_SIZE, flipped=False, cacheTiles=True):
+        self.image = image
+        self.imageSize = QSize(imageSize) if imageSize is not None else image.size()
+        self.tileSize = tileSize
+        self.flipped = flipped
+        self.cacheTiles = cacheTiles
+        self._tiles = ImageCache(TILE_BUDGET)
+        self._mipmaps = []
+
+    def width(self):
+        return self.image.width()
+
+    def height(self):
+        return self.image.height()
+
+    def sourceFactor(self):
+        """Source pixels per image coordinate unit."""
+        return self.image.width() / float(self.imageSize.width())
+
+    def setMipmaps(self, images):
+        """Paint from `images`, halved copies of the image as returned by
+        buildMipmaps(), when they have enough pixels. May be called from any
+        thread: painting picks up the new list on its next call."""
+        mipmaps = [TileGrid(image, self.imageSize, self.tileSize) for image in images]
+        for mipmap in mipmaps:
+            mipmap._tiles = self._tiles
+        self._mipmaps = mipmaps
+
+    def hasMipmaps(self):
+        return bool(self._mipmaps)
+
+    def levelFor(self, scale):
+        """The smallest of this grid and its mipmaps that still has at least
+        `scale` pixels per image pixel."""
+        grid = self
+        for mipmap in self._mipmaps:
+            if mipmap.sourceFactor() < scale:
+                break
+            grid = mipmap
+        return grid
+
+    def sourceSize(self, scale):
+        """Size of the image, or mipmap, painted at `scale` device pixels
+        per image pixel."""
+        return self.levelFor(scale).image.size()
+
+    def tilesIn(self, rect):
+        """(col, row) of the tiles intersecting rect, given in image coordinates."""
+        f = self.sourceFactor()
+        t = self.tileSize
+        left = max(0, int(math.floor(rect.left() * f / t)))
+        top = max(0, int(math.floor(rect.top() * f / t)))
+        right = min(int(math.ceil(self.image.width() / float(t))), int(math.ceil(rect.right() * f / t)))
+        bottom = min(int(math.ceil(self.image.height() / float(t))), int(math.ceil(rect.bottom() * f / t)))
+        return [(col, row) for row in range(top, bottom) for col in range(left, right)]
+
+    def sourceRect(self, col, row):
+        t = self.tileSize
+        return QRect(col * t, row * t, t, t).intersected(self.image.rect())
+
+    def copy(self, rect):
+        """A copy of the pixels of rect, the right way up."""
+        if not self.flipped:
+            return self.image.copy(rect)
+        rect = QRect(rect.x(), self.image.height() - rect.y() - rect.height(), rect.width(), rect.height())
+        return self.image.copy(rect).mirrored(False, True)
+
+    def tile(self, col, row):
+        # The levels sharing the cache are told apart by their width.
+        key = ((self.image.width(), col, row), self.tileSize)
+        pixmap = self._tiles.get(key)
+        if pixmap is None:
+            pixmap = QPixmap.fromImage(self.copy(self.sourceRect(col, row)))
+            self._tiles.put(key, pixmap, pixmapBytes(pixmap))
+        return pixmap
+
+    def drawTile(self, painter, target, rect):
+        """Draw the pixels of rect straight from the image into target."""
+        if painter.paintEngine().type() != QPaintEngine.Raster:
+            # Others, like OpenGL, would upload the whole image as a texture.
+            painter.drawImage(target, self.copy(rect))
+            return
+        if not self.flipped:
+            painter.drawImage(target, self.image, QRectF(rect))
+            return
+        painter.save()
+        # Turn target upside down and draw the rows of rect as stored.
+        painter.translate(0, target.top() + target.bottom())
+        painter.scale(1, -1)
+        painter.drawImage(target, self.image, QRectF(rect.x(), self.image.height() - rect.y() - rect.height(),
+                                                     rect.width(), rect.height()))
+        painter.restore()
+
+    def scaledRect(self, col, row, factor):
+        """Device pixels covered by the tile scaled by factor, relative to
+        the device position of the image origin. Neighbouring tiles meet
+        exactly."""
+        rect = self.sourceRect(col, row)
+        x0, y0 = int(round(rect.left() * factor)), int(round(rect.top() * factor))
+        x1 = int(round((rect.right() + 1) * factor))
+        y1 = int(round((rect.bottom() + 1) * factor))
+        return QRect(x0, y0, max(1, x1 - x0), max(1, y1 - y0))
+
+    def paint(self, painter, exposed, scale):
+        """Paint the tiles intersecting `exposed` (image coordinates) with
+        `painter`, whose transform maps image coordinates to the widget,
+        from the smallest level with enough pixels. The painter scales the
+        tiles, in the quality its render hints ask for."""
+        ratio = painter.device().devicePixelRatioF()
+        grid = self.levelFor(scale * ratio)
+        if grid is not self:
+            return grid.paint(painter, exposed, scale)
+        f = self.sourceFactor()
+        for col, row in self.tilesIn(exposed):
+            rect = self.sourceRect(col, row)
+            target = QRectF(rect.left() / f, rect.top() / f, rect.width() / f, rect.height() / f)
+            if not self.cacheTiles:
+                self.drawTile(painter, target, rect)
+                continue
+            pixmap = self.tile(col, row)
+            painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
+    def render(self, painter, exposed, scale, stop=None):
+        """Paint like paint(), but from QImages only so that it can run on a
+        render thread. Tiles are resampled to device pixels and blitted at
+        device pixel positions, so that neighbouring tiles meet exactly, and
+        are not kept. Returns False if `stop()` turned true before all tiles
+        were painted."""
+        ratio = painter.device().devicePixelRatioF()
+        grid = self.levelFor(scale * ratio)
+        if grid is not self:
+            return grid.render(painter, exposed, scale, stop)
+        factor = scale * ratio / self.sourceFactor()
+        if self.tileSize * factor > MAX_SCALED_TILE:
+            f = self.sourceFactor()
+            for col, row in self.tilesIn(exposed):
+                if stop is not None and stop():
+                    return False
+                rect = self.sourceRect(col, row)
+                target = QRectF(rect.left() / f, rect.top() / f, rect.width() / f, rect.height() / f)
+                if self.flipped:
+                    painter.drawImage(target, self.copy(rect))
+                else:
+                    painter.drawImage(target, self.image, QRectF(rect))
+            return True
+        origin = painter.transform().map(QPointF(0, 0))
+        ox, oy = int(round(origin.x() * ratio)), int(round(origin.y() * ratio))
+        painter.save()
+        painter.resetTransform()
+        try:
+            for col, row in self.tilesIn(exposed):
+                if stop is not None and stop():
+                    return False
+                rect, target = self.sourceRect(col, row), self.scaledRect(col, row, factor)
+                image = self.copy(rect)
+                if target.size() != rect.size():
+                    image = image.scaled(target.size(), Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                image.setDevicePixelRatio(ratio)
+                painter.drawImage(QPointF((ox + target.x()) / ratio, (oy + target.y()) / ratio), image)
+        finally:
+            painter.restore()
+        return True
+
+
+class MipmapBuilder(object):
+    """Builds the mipmaps of TileGrids, one at a time on a background thread.
+
+    They are kept in the image cache, so they count against the same byte
+    budget as the decoded images and are reused when an image is shown
+    again."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = {}
+
+    def request(self, grid, key):
+        """Give grid its mipmaps, cached under key (see mipmapKey)."""
+        mipmaps = self.cache.get(key)
+        if mipmaps is not None:
+            grid.setMipmaps(mipmaps)
+            return
+        self._futures = dict((k, f) for k, f in self._futures.items() if not f.done())
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(self._build, grid, key)
+
+    def shutdown(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _build(self, grid, key):
+        mipmaps = buildMipmaps(grid.image, flipped=grid.flipped)
+        self.cache.put(key, mipmaps, sum(imageBytes(image) for image in mipmaps))
+        grid.setMipmaps(mipmaps)
@@ -0,0 +1,293 @@
+try:
+    from PyQt5.QtGui import *
+    from PyQt5.QtCore import *
+except ImportError:
+    from PyQt4.QtGui import *
+    from PyQt4.QtCore import *
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from libs.constants import CACHE_DIR_NAME
+from libs.imageReader import readImage, imageSize
+from libs.tileGrid import MAX_SCALED_TILE, TILE_SIZE
+
+PYRAMID_DIR_NAME = 'pyramids'
+INFO_FILENAME = 'pyramid.info'
+INFO_VERSION = 3
+# Tiles of opaque images are JPEG; those with an alpha channel are PNG,
+# which keeps it.
+TILE_FORMAT = 'jpg'
+TILE_QUALITY = 95
+ALPHA_TILE_FORMAT = 'png'
+# Most tile pixmaps, and as many tile images for rendering, kept in memory
+# per pyramid.
+MAX_CACHED_TILES = 256
+
+
+def pyramidRoot(filePath):
+    return os.path.join(os.path.dirname(filePath), CACHE_DIR_NAME, PYRAMID_DIR_NAME)
+
+
+def pyramidDirectory(filePath):
+    """Where the pyramid of filePath is kept: one per file name. Its info
+    says which mtime and size of the file it was built from."""
+    name = os.path.basename(filePath).encode('utf-8', 'surrogateescape')
+    return os.path.join(pyramidRoot(filePath), hashlib.sha1(name).hexdigest())
+
+
+def readInfo(directory):
+    """The info of the pyramid in directory. Raises ValueError unless it is
+    one written by this version."""
+    with open(os.path.join(directory, INFO_FILENAME), 'rb') as f:
+        info = json.loads(f.read().decode('utf-8'))
+    if not isinstance(info, dict) or info.get('version') != INFO_VERSION:
+        raise ValueError('unsupported pyramid info in %s' % directory)
+    levels, numbers = info.get('levels'), [info.get('tileSize'), info.get('mtime'), info.get('size')]
+    if (not isinstance(levels, list) or not levels
+            or not all(isinstance(level, list) and len(level) == 2 for level in levels)
+            or not all(isinstance(n, int) and n >= 0 for n in numbers + sum(levels, []))
+            or info.get('format') not in (TILE_FORMAT, ALPHA_TILE_FORMAT)):
+        raise ValueError('damaged pyramid info in %s' % directory)
+    info['levels'] = [tuple(level) for level in levels]
+    return info
+
+
+def isCurrent(info, stat):
+    """Whether the pyramid of info was built from the file as stat finds it."""
+    return info['mtime'] == stat.st_mtime_ns and info['size'] == stat.st_size
+
+
+def tilePath(directory, level, col, row, tileFormat=TILE_FORMAT):
+    return os.path.join(directory, str(level), '%d_%d.%s' % (col, row, tileFormat))
+
+
+def buildPyramid(filePath, directory, tileSize=TILE_SIZE, stop=None):
+    """Decode filePath once and write its tiles at full, 1/2, 1/4 ...
+    resolution into directory, down to the level that fits in one tile.
+    The pyramid only appears under directory once it is complete."""
+    # Taken first: a file changed while it is decoded looks outdated later.
+    stat = os.stat(filePath)
+    image = readImage(filePath)
+    if image.isNull():
+        return False
+    if image.hasAlphaChannel():
+        tileFormat, quality = ALPHA_TILE_FORMAT, -1
+    else:
+        tileFormat, quality = TILE_FORMAT, TILE_QUALITY
+    work = directory + '.tmp'
+    shutil.rmtree(work, ignore_errors=True)
+    levels = []
+    while True:
+        level = len(levels)
+        os.makedirs(os.path.join(work, str(level)))
+        for row in range(int(math.ceil(image.height() / float(tileSize)))):
+            for col in range(int(math.ceil(image.width() / float(tileSize)))):
+                if stop is not None and stop.is_set():
+                    shutil.rmtree(work, ignore_errors=True)
+                    return False
+                tile = image.copy(QRect(col * tileSize, row * tileSize, tileSize, tileSize).intersected(image.rect()))
+                tile.save(tilePath(work, level, col, row, tileFormat), tileFormat, quality)
+        levels.append((image.width(), image.height()))
+        if max(image.width(), image.height()) <= tileSize:
+            break
+        image = image.scaled(max(1, image.width() // 2), max(1, image.height() // 2),
+                             Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+    info = {'version': INFO_VERSION, 'tileSize': tileSize, 'levels': levels, 'format': tileFormat,
+            'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+    with open(os.path.join(work, INFO_FILENAME), 'w') as f:
+        json.dump(info, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(work, directory)
+    return True
+
+
+class TilePyramid(object):
+    """A pyramid of tiles written by buildPyramid, painted like a TileGrid.
+
+    Each paint reads the level whose resolution is just above the zoom, so
+    only the tiles on screen are ever loaded and the master is never
+    decoded. Like TileGrid, the GUI thread scales tiles with the painter,
+    and render() resamples them to device pixels. Level 0 is the full
+    resolution image.
+
+    With the stat of the image, a pyramid built from another version of
+    the file is refused with a ValueError."""
+
+    def __init__(self, directory, stat=None):
+        info = readInfo(directory)
+        if stat is not None and not isCurrent(info, stat):
+            raise ValueError('outdated pyramid in %s' % directory)
+        self.directory = directory
+        self.tileSize = info['tileSize']
+        self.tileFormat = info['format']
+        self.levels = info['levels']
+        self.imageSize = QSize(*self.levels[0])
+        self._tiles = OrderedDict()
+        self._images = OrderedDict()
+
+    def sourceFactor(self):
+        # The full resolution is always at hand.
+        return 1.0
+
+    def levelFor(self, scale):
+        """The smallest level that still has at least `scale` pixels per
+        image pixel."""
+        width = float(self.levels[0][0])
+        level = 0
+        while level + 1 < len(self.levels) and self.levels[level + 1][0] / width >= scale:
+            level += 1
+        return level
+
+    def sourceSize(self, scale):
+        """Size of the level painted at `scale` device pixels per image pixel."""
+        return QSize(*self.levels[self.levelFor(scale)])
+
+    def overview(self):
+        """The whole image at the coarsest level, as a QImage."""
+        return QImage(tilePath(self.directory, len(self.levels) - 1, 0, 0, self.tileFormat))
+
+    def tile(self, level, col, row):
+        key = (level, col, row)
+        pixmap = self._tiles.get(key)
+        if pixmap is None:
+            pixmap = self._tiles[key] = QPixmap(tilePath(self.directory, level, col, row, self.tileFormat))
+            if len(self._tiles) > MAX_CACHED_TILES:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end(key)
+        return pixmap
+
+    def placements(self, painter, exposed, scale):
+        """The level painted at `scale` and (col, row, x, y, size) of its
+        tiles intersecting `exposed`, in device pixels of the painter."""
+        ratio = painter.device().devicePixelRatioF()
+        level = self.levelFor(scale * ratio)
+        width, height = self.levels[level]
+        f = width / float(self.levels[0][0])
+        t = self.tileSize
+        left = max(0, int(math.floor(exposed.left() * f / t)))
+        top = max(0, int(math.floor(exposed.top() * f / t)))
+        right = min(int(math.ceil(width / float(t))), int(math.ceil(exposed.right() * f / t)))
+        bottom = min(int(math.ceil(height / float(t))), int(math.ceil(exposed.bottom() * f / t)))
+        transform = painter.transform() * QTransform.fromScale(ratio, ratio)
+        placements = []
+        for row in range(top, bottom):
+            for col in range(left, right):
+                tileWidth = min(t, width - col * t)
+                tileHeight = min(t, height - row * t)
+                # Snap to device pixels so that neighbouring tiles meet exactly.
+                target = transform.mapRect(QRectF(col * t / f, row * t / f, tileWidth / f, tileHeight / f))
+                x0, y0 = int(round(target.left())), int(round(target.top()))
+                x1, y1 = int(round(target.right())), int(round(target.bottom()))
+                placements.append((col, row, x0, y0, QSize(max(1, x1 - x0), max(1, y1 - y0))))
+        return level, placements
+
+    def paint(self, painter, exposed, scale):
+        """Paint the tiles intersecting `exposed` (image coordinates) with
+        `painter`, whose transform maps image coordinates to the widget.
+        The tiles of the level are scaled by the painter."""
+        ratio = painter.device().devicePixelRatioF()
+        level, placements = self.placements(painter, exposed, scale)
+        painter.save()
+        painter.resetTransform()
+        for col, row, x0, y0, size in placements:
+            pixmap = self.tile(level, col, row)
+            painter.drawPixmap(QRectF(x0 / ratio, y0 / ratio, size.width() / ratio, size.height() / ratio),
+                               pixmap, QRectF(pixmap.rect()))
+        painter.restore()
+
+    def tileImage(self, level, col, row):
+        """The tile as a QImage, for the render thread. Kept apart from the
+        pixmaps of tile(), which only the GUI thread may touch."""
+        key = (level, col, row)
+        image = self._images.get(key)
+        if image is None:
+            image = self._images[key] = QImage(tilePath(self.directory, level, col, row, self.tileFormat))
+            if len(self._images) > MAX_CACHED_TILES:
+                self._images.popitem(last=False)
+        else:
+            self._images.move_to_end(key)
+        return image
+
+    def render(self, painter, exposed, scale, stop=None):
+        """Paint like paint(), but from QImages only so that it can run on a
+        render thread. Returns False if `stop()` turned true before all
+        tiles were painted."""
+        ratio = painter.device().devicePixelRatioF()
+        level, placements = self.placements(painter, exposed, scale)
+        painter.save()
+        painter.resetTransform()
+        try:
+            for col, row, x0, y0, size in placements:
+                if stop is not None and stop():
+                    return False
+                image = self.tileImage(level, col, row)
+                if image.isNull():
+                    continue
+                if max(size.width(), size.height()) > MAX_SCALED_TILE:
+                    painter.drawImage(QRectF(x0 / ratio, y0 / ratio, size.width() / ratio, size.height() / ratio),
+                                      image, QRectF(image.rect()))
+                    continue
+                if image.size() != size:
+                    image = image.scaled(size, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                image.setDevicePixelRatio(ratio)
+                painter.drawImage(QPointF(x0 / ratio, y0 / ratio), image)
+        finally:
+            painter.restore()
+        return True
+
+def openPyramid(filePath, stat=None):
+    """The TilePyramid of filePath, or None if none was built from the file
+    as it is now. stat is the file's, if the caller has it at hand."""
+    if not os.path.isdir(pyramidRoot(filePath)):
+        return None
+    try:
+        return TilePyramid(pyramidDirectory(filePath), stat if stat is not None else os.stat(filePath))
+    except Exception:
+        return None
+
+
+class PyramidBuilder(object):
+    """Builds the pyramids of images of at least minPixels pixels, one at a
+    time on a background thread."""
+
+    def __init__(self, minPixels):
+        self.minPixels = minPixels
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = {}
+        self._stop = threading.Event()
+
+    def request(self, filePath):
+        for done in [path for path, future in self._futures.items() if future.done()]:
+            del self._futures[done]
+        if filePath in self._futures:
+            return
+        self._futures[filePath] = self._executor.submit(self._build, filePath)
+
+    def shutdown(self):
+        self._stop.set()
+        for future in self._futures.values():
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _build(self, filePath):
+        size = imageSize(filePath)
+        if not size.isValid() or size.width() * size.height() < self.minPixels:
+            return False
+        directory = pyramidDirectory(filePath)
+        try:
+            if isCurrent(readInfo(directory), os.stat(filePath)):
+                return True
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            return buildPyramid(filePath, directory, stop=self._stop)
+        except (IOError, OSError):
+            return False
@@ -77,13 +77,21 @@ def fmtShortcut(text):
     return '<b>%s</b>+<b>%s</b>' % (mod, key)
 
 
+# Colors already generated, by label text
+_labelColors = {}
+
+
 def generateColorByText(text):
     s = ustr(text)
-    hashCode = int(hashlib.sha256(s.encode('utf-8')).hexdigest(), 16)
-    r = int((hashCode / 255) % 255)
-    g = int((hashCode / 65025)  % 255)
-    b = int((hashCode / 16581375)  % 255)
-    return QColor(r, g, b, 100)
+    color = _labelColors.get(s)
+    if color is None:
+        hashCode = int(hashlib.sha256(s.encode('utf-8')).hexdigest(), 16)
+        r = int((hashCode / 255) % 255)
+        g = int((hashCode / 65025)  % 255)
+        b = int((hashCode / 16581375)  % 255)
+        color = _labelColors[s] = QColor(r, g, b, 100)
+    # QColor is mutable: never hand out the cached instance
+    return QColor(color)
 
 def have_qstring():
     '''p3/qt5 get rid of QString wrapper as py3 has native unicode str type'''
@@ -92,12 +100,19 @@ def have_qstring():
 def util_qt_strlistclass():
     return QStringList if have_qstring() else list
 
+_digits = re.compile('([0-9]+)')
+
+def natural_key(text):
+    """
+    Key ordering text naturally, e.g. 'f3' before 'f11'. Numbers and text
+    alternate, starting with text, so any two keys compare.
+    """
+    parts = _digits.split(text)
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return tuple(parts)
+
 def natural_sort(list, key=lambda s:s):
     """
     Sort the list into natural alphanumeric order.
     """
-    def get_alphanum_key_func(key):
-        convert = lambda text: int(text) if text.isdigit() else text
-        return lambda s: [convert(c) for c in re.split('([0-9]+)', key(s))]
-    sort_key = get_alphanum_key_func(key)
-    list.sort(key=sort_key)
+    list.sort(key=lambda s: natural_key(key(s)))
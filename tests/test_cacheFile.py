@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from libs.cacheFile import bytesArray, joinNames, readCacheFile, splitNames, writeCacheFile
+
+
+class TestCacheFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_roundTrip(self):
+        names = ['a.jpg', 'été.jpg', 'bad\udcff.jpg']
+        writeCacheFile(self.path, 3, {'count': 3}, [joinNames(names), array('q', [1, -2, 3 << 40])])
+        header, (data, values) = readCacheFile(self.path, 3)
+        self.assertEqual(header['count'], 3)
+        self.assertEqual(splitNames(data, 3), names)
+        self.assertEqual(list(bytesArray('q', values, 3)), [1, -2, 3 << 40])
+        self.assertEqual(splitNames(joinNames([]), 0), [])
+        self.assertRaises(ValueError, bytesArray, 'q', values, 2)
+        self.assertRaises(ValueError, readCacheFile, self.path, 4)
+
+    def test_damagedFile_raisesValueError(self):
+        writeCacheFile(self.path, 1, {}, [b'abc'])
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for damaged in (data[:-1], data + b'x', data[:5], b'\x80\x04K\x01.'):
+            with open(self.path, 'wb') as f:
+                f.write(damaged)
+            self.assertRaises(ValueError, readCacheFile, self.path, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
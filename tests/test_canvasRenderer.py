@@ -0,0 +1,57 @@
+import unittest
+
+from PyQt5.QtCore import QPointF, QRect
+
+from libs.canvasRenderer import CanvasRenderer
+
+
+class CountingTiles(object):
+    """Tiles that paint nothing and count how often they were rendered."""
+
+    def __init__(self):
+        self.renders = 0
+
+    def render(self, painter, exposed, scale, stop=None):
+        self.renders += 1
+        return True
+
+
+class TestCanvasRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.renderer = CanvasRenderer()
+        self.frames = []
+        self.renderer.frameReady.connect(lambda generation, image, shapes: self.frames.append(image))
+
+    def tearDown(self):
+        self.renderer.shutdown()
+
+    def render(self, tiles, rect=QRect(0, 0, 100, 80), scale=1.0):
+        # Rendered here rather than on the worker, as request() would.
+        self.renderer.generation += 1
+        self.renderer._render(self.renderer.generation, tiles, [], rect, scale, 1.0, QPointF(5, 5))
+
+    def test_imageLayer_isReusedForTheSameView(self):
+        tiles = CountingTiles()
+        self.render(tiles)
+        self.render(tiles)
+        self.assertEqual(tiles.renders, 1)
+        self.assertEqual(len(self.frames), 2)
+        self.assertEqual(self.frames[0], self.frames[1])
+        self.render(tiles, scale=2.0)
+        self.render(tiles, rect=QRect(0, 0, 120, 80), scale=2.0)
+        self.assertEqual(tiles.renders, 3)
+        other = CountingTiles()
+        self.render(other, rect=QRect(0, 0, 120, 80), scale=2.0)
+        self.assertEqual(other.renders, 1)
+
+    def test_discard_forgetsTheImageLayer(self):
+        tiles = CountingTiles()
+        self.render(tiles)
+        self.renderer.discard()
+        self.render(tiles)
+        self.assertEqual(tiles.renders, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
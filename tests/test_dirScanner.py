@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libs.constants import CACHE_DIR_NAME
+from libs.dirScanner import DirScanner
+from libs.dirSnapshot import DirSnapshot, snapshotPath
+from libs.pathTable import PathTable
+
+
+class TestDirScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in ['img10.jpg', 'img2.JPG', 'notes.txt', 'b/img1.png', 'a/c/img3.jpg',
+                     os.path.join(CACHE_DIR_NAME, 'atlas.jpg')]:
+            path = os.path.join(self.root, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+        os.symlink(os.path.join(self.root, 'b'), os.path.join(self.root, 'link'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def scan(self, scanner, restored=None):
+        """Run a scan on this thread, collecting what it delivers."""
+        batches, results = [], []
+        scanner.found.connect(lambda generation, paths, folders: batches.append(paths))
+        scanner.finished.connect(lambda generation, paths, snapshot: results.append(paths))
+        if restored is not None:
+            scanner.restored.connect(lambda generation, paths: restored.append(list(paths)))
+        scanner.generation = 1
+        scanner._scan(1, self.root, ('.jpg', '.png'))
+        return batches, results
+
+    def test_streamsImages_thenNaturalOrder(self):
+        scanner = DirScanner()
+        batches, results = self.scan(scanner)
+        scanner.shutdown()
+        expected = [os.path.join(self.root, p) for p in ['a/c/img3.jpg', 'b/img1.png', 'img2.JPG', 'img10.jpg']]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(list(results[0]), expected)
+        # The first image is delivered on its own, and every image once.
+        self.assertEqual(len(batches[0]), 1)
+        self.assertEqual(sorted(sum(batches, [])), sorted(expected))
+
+    def test_snapshot_revalidatesChangedFolders(self):
+        # Folders modified just now are not trusted; age them.
+        for folder, _, _ in os.walk(self.root):
+            os.utime(folder, (1e9, 1e9))
+        scanner = DirScanner()
+        self.scan(scanner)
+        os.remove(os.path.join(self.root, 'b', 'img1.png'))
+        os.makedirs(os.path.join(self.root, 'a', 'd'))
+        open(os.path.join(self.root, 'a', 'd', 'img4.jpg'), 'w').close()
+        # Not seen: its folder's mtime is unchanged.
+        open(os.path.join(self.root, 'a', 'c', 'img5.jpg'), 'w').close()
+        os.utime(os.path.join(self.root, 'a', 'c'), (1e9, 1e9))
+        restored = []
+        scanner.shutdown()
+        scanner = DirScanner()
+        batches, results = self.scan(scanner, restored)
+        scanner.shutdown()
+        paths = [os.path.join(self.root, p) for p in ['a/c/img3.jpg', 'b/img1.png', 'img2.JPG', 'img10.jpg']]
+        self.assertEqual(restored, [paths])
+        self.assertEqual(batches, [])
+        del paths[1]
+        paths.insert(1, os.path.join(self.root, 'a/d/img4.jpg'))
+        self.assertEqual(list(results[0]), paths)
+
+    def test_snapshot_savesDataOnly(self):
+        paths = PathTable([os.path.join(self.root, 'b', 'bad\udcff.jpg'), os.path.join(self.root, 'img2.JPG')])
+        folders = {self.root: 12345, os.path.join(self.root, 'b'): None}
+        DirSnapshot(self.root, folders, paths).save()
+        snapshot = DirSnapshot.load(self.root)
+        self.assertEqual(snapshot.folders, folders)
+        self.assertEqual(list(snapshot.paths), list(paths))
+        with open(snapshotPath(self.root), 'rb') as f:
+            data = f.read()
+        # Damaged, or made by anything else: as if there were none.
+        for damaged in (data[:-1], data + b'x', b'\x80\x04K\x01.'):
+            with open(snapshotPath(self.root), 'wb') as f:
+                f.write(damaged)
+            self.assertIsNone(DirSnapshot.load(self.root))
+
+    def test_cancel_stopsDelivery(self):
+        scanner = DirScanner()
+        scanner.found.connect(lambda *args: scanner.cancel())
+        batches, results = self.scan(scanner)
+        scanner.shutdown()
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(results, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libs.dirScanner import DirScanner
+from libs.dirWatcher import DirWatcher
+
+
+class TestDirWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path in ['img1.jpg', 'a/img2.jpg', 'a/b/img3.jpg']:
+            self.touch(path)
+        # Folders modified just now are not trusted; age them.
+        for folder, _, _ in os.walk(self.root):
+            os.utime(folder, (1e9, 1e9))
+        scanner = DirScanner()
+        snapshots = []
+        scanner.finished.connect(lambda generation, catalog, snapshot: snapshots.append(snapshot))
+        scanner.generation = 1
+        scanner._scan(1, self.root, ('.jpg',))
+        scanner.shutdown()
+        self.snapshot = snapshots[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def touch(self, path):
+        path = os.path.join(self.root, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def test_changedFolders_giveAddedAndRemovedImages(self):
+        watcher = DirWatcher()
+        changes = []
+        watcher.changed.connect(lambda generation, change: changes.append(change))
+        watcher._index(watcher.generation, self.snapshot, ('.jpg',))
+        self.assertEqual(changes, [])
+        self.touch('a/img4.jpg')
+        self.touch('c/img5.jpg')
+        os.remove(self.path('img1.jpg'))
+        shutil.rmtree(self.path('a', 'b'))
+        watcher._apply(watcher.generation, [self.path('a'), self.root])
+        watcher.shutdown()
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(sorted(changes[0].added), [self.path('a', 'img4.jpg'), self.path('c', 'img5.jpg')])
+        self.assertEqual(changes[0].added[self.path('c', 'img5.jpg')][0], 0)
+        self.assertEqual(sorted(changes[0].removed), [self.path('a', 'b', 'img3.jpg'), self.path('img1.jpg')])
+        self.assertEqual(changes[0].folders, [self.path('c')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from PyQt5.QtGui import QImage
+from PyQt5.QtCore import QBuffer, QByteArray, QIODevice
+
+from libs.exifThumbnail import findThumbnail, readThumbnail
+
+
+def jpegBytes(width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(0xff336699)
+    data = QByteArray()
+    buf = QBuffer(data)
+    buf.open(QIODevice.WriteOnly)
+    image.save(buf, 'JPG')
+    return bytes(data)
+
+
+def exifSegment(thumbnail, orientation=1):
+    """A little endian APP1 segment with IFD0 (orientation) and IFD1 (thumbnail)."""
+    ifd0 = struct.pack('<H', 1) + struct.pack('<HHIHH', 0x0112, 3, 1, orientation, 0) + struct.pack('<I', 26)
+    ifd1 = struct.pack('<H', 2) + struct.pack('<HHII', 0x0201, 4, 1, 56) + struct.pack('<HHII', 0x0202, 4, 1, len(thumbnail))
+    ifd1 += struct.pack('<I', 0)
+    tiff = b'II*\x00' + struct.pack('<I', 8) + ifd0 + ifd1 + thumbnail
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+class TestExifThumbnail(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def writeJpeg(self, orientation):
+        body = jpegBytes(400, 300)
+        path = os.path.join(self.tmp, 'photo.jpg')
+        with open(path, 'wb') as f:
+            f.write(body[:2] + exifSegment(jpegBytes(160, 120), orientation) + body[2:])
+        return path
+
+    def test_readThumbnail(self):
+        path = self.writeJpeg(1)
+        thumbnail = readThumbnail(path)
+        self.assertEqual((thumbnail.width(), thumbnail.height()), (160, 120))
+        # The file itself still decodes.
+        self.assertEqual(QImage(path).width(), 400)
+
+    def test_readThumbnail_appliesOrientation(self):
+        thumbnail = readThumbnail(self.writeJpeg(6))
+        self.assertEqual((thumbnail.width(), thumbnail.height()), (120, 160))
+
+    def test_noThumbnail(self):
+        self.assertIsNone(findThumbnail(jpegBytes(40, 30)))
+        self.assertTrue(readThumbnail(os.path.join(self.tmp, 'missing.jpg')).isNull())
+
+
+if __name__ == '__main__':
+    unittest.main()
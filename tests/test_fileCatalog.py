@@ -0,0 +1,85 @@
+import random
+import unittest
+
+from libs.fileCatalog import FileCatalog, joinKeys, pathKey
+
+
+class TestFileCatalog(unittest.TestCase):
+
+    def test_naturalOrder_andNeighbours(self):
+        catalog = FileCatalog(['/p/img10.jpg', '/p/IMG2.jpg', '/p/img1.jpg', '/o/z.jpg'])
+        self.assertEqual(list(catalog), ['/o/z.jpg', '/p/img1.jpg', '/p/IMG2.jpg', '/p/img10.jpg'])
+        self.assertEqual(catalog.position('/p/IMG2.jpg'), 2)
+        self.assertEqual(catalog.next('/p/IMG2.jpg'), '/p/img10.jpg')
+        self.assertEqual(catalog.previous('/o/z.jpg'), None)
+        self.assertEqual(catalog.next('/p/img10.jpg'), None)
+        self.assertEqual(catalog.position('/p/missing.jpg'), None)
+        # Deleted paths still have neighbours, from where they were.
+        self.assertEqual(catalog.next('/p/img1a.jpg'), '/p/IMG2.jpg')
+        self.assertEqual(catalog.previous('/p/img1a.jpg'), '/p/img1.jpg')
+        self.assertRaises(ValueError, catalog.index, '/p/missing.jpg')
+
+    def test_insertRemove_keepPositionsRight(self):
+        paths = ['/p/img%d.jpg' % i for i in range(0, 100, 2)]
+        catalog = FileCatalog(paths)
+        self.assertEqual(catalog.insert('/p/img51.jpg'), 26)
+        self.assertEqual(catalog.insert('/p/img3.jpg'), 2)
+        self.assertEqual(catalog.remove('/p/img0.jpg'), 0)
+        self.assertEqual(catalog.remove('/p/missing.jpg'), None)
+        expected = sorted(paths[1:] + ['/p/img51.jpg', '/p/img3.jpg'], key=lambda p: int(p[6:-4]))
+        self.assertEqual(list(catalog), expected)
+        for i, path in enumerate(reversed(expected)):
+            self.assertEqual(catalog.position(path), len(expected) - 1 - i)
+        self.assertEqual(catalog.insert('/p/img3.jpg'), 1)
+        self.assertEqual(len(catalog), len(expected))
+        restored = FileCatalog(expected, ordered=True)
+        self.assertEqual(restored.remove('/p/img2.jpg'), 0)
+        self.assertEqual(restored.insert('/p/img1.jpg'), 0)
+        self.assertEqual(restored.position('/p/img3.jpg'), 1)
+
+    def test_keysFromFolderAndName(self):
+        for folder, name in [('/p2/', 'img10.jpg'), ('/p/', '7.jpg'), ('', 'a1b'), ('/x1/y/', 'Z')]:
+            self.assertEqual(joinKeys(pathKey(folder), pathKey(name)), pathKey(folder + name))
+        # Different paths with the same key are all found.
+        catalog = FileCatalog(['/p/img1.jpg', '/p/IMG01.jpg', '/p/img01.jpg', '/p/img2.jpg'])
+        for path in catalog:
+            self.assertEqual(catalog[catalog.position(path)], path)
+        self.assertIsNone(catalog.position('/p/Img1.jpg'))
+
+    def test_positions_followInsertsAndRemoves(self):
+        rng = random.Random(1)
+        expected = ['/p/%d/img%d.jpg' % (i % 7, i) for i in range(0, 600, 3)]
+        catalog = FileCatalog(expected)
+        expected = list(catalog)
+        for step in range(900):
+            if rng.random() < 0.5 and expected:
+                path = rng.choice(expected)
+                self.assertEqual(catalog.remove(path), expected.index(path))
+                expected.remove(path)
+            else:
+                path = '/p/%d/img%d.jpg' % (rng.randrange(7), rng.randrange(600))
+                i = catalog.insert(path)
+                if path not in expected:
+                    expected.insert(i, path)
+            if step % 50 == 0:
+                self.assertEqual(list(catalog), expected)
+                for i, path in enumerate(expected):
+                    self.assertEqual(catalog.position(path), i)
+        self.assertEqual([catalog.position(path) for path in expected], list(range(len(expected))))
+        self.assertEqual(list(catalog), sorted(expected, key=pathKey))
+
+    def test_append_keepsScanOrder(self):
+        catalog = FileCatalog()
+        catalog.extend(['/b.jpg', '/a.jpg', '/b.jpg'])
+        self.assertEqual(list(catalog), ['/b.jpg', '/a.jpg'])
+        self.assertEqual(catalog.position('/a.jpg'), 1)
+        self.assertTrue(catalog == ['/b.jpg', '/a.jpg'])
+        self.assertTrue(catalog != FileCatalog(catalog))
+        self.assertEqual(catalog.insert('/0.jpg'), 2)
+        self.assertEqual(catalog.remove('/b.jpg'), 0)
+        self.assertEqual(catalog.position('/0.jpg'), 1)
+        self.assertEqual(catalog.next('/c.jpg'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from PyQt5.QtCore import Qt
+
+from libs.fileCatalog import FileCatalog
+from libs.fileListModel import FileListModel
+
+
+class TestFileListModel(unittest.TestCase):
+
+    def test_appendAndReset_notifyInBulk(self):
+        model = FileListModel()
+        inserted, resets = [], []
+        model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        model.modelReset.connect(lambda: resets.append(True))
+        paths = []
+        model.setFilePaths(paths)
+        model.appendFilePaths(['/a/1.jpg', '/a/2.jpg'])
+        model.appendFilePaths(['/b/3.jpg'])
+        self.assertEqual(inserted, [(0, 1), (2, 2)])
+        self.assertEqual(paths, ['/a/1.jpg', '/a/2.jpg', '/b/3.jpg'])
+        self.assertEqual(model.rowCount(), 3)
+        self.assertEqual(model.data(model.index(2), Qt.DisplayRole), '/b/3.jpg')
+        self.assertIsNone(model.filePath(3))
+        model.setFilePaths([])
+        self.assertEqual(model.rowCount(), 0)
+        self.assertEqual(len(resets), 2)
+
+    def test_append_announcesOnlyNewRows(self):
+        model = FileListModel()
+        inserted = []
+        model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+        model.setFilePaths(FileCatalog(['/a/1.jpg', '/a/2.jpg']))
+        model.appendFilePaths(['/a/2.jpg', '/b/3.jpg', '/b/3.jpg'])
+        model.appendFilePaths(['/a/1.jpg'])
+        self.assertEqual(inserted, [(2, 2)])
+        self.assertEqual(model.rowCount(), 3)
+        self.assertEqual(model.filePath(2), '/b/3.jpg')
+
+    def test_insertRemove_keepCatalogOrder(self):
+        model = FileListModel()
+        changes = []
+        model.rowsInserted.connect(lambda parent, first, last: changes.append(('+', first)))
+        model.rowsRemoved.connect(lambda parent, first, last: changes.append(('-', first)))
+        model.setFilePaths(FileCatalog(['/a/1.jpg', '/a/10.jpg']))
+        self.assertEqual(model.insertFilePath('/a/2.jpg'), 1)
+        self.assertEqual(model.insertFilePath('/a/2.jpg'), 1)
+        self.assertEqual(model.removeFilePath('/a/1.jpg'), 0)
+        self.assertIsNone(model.removeFilePath('/a/1.jpg'))
+        self.assertEqual(changes, [('+', 1), ('-', 0)])
+        self.assertEqual(model.filePath(1), '/a/10.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QApplication
+
+from libs.glCanvas import GLCanvas, GLScrollArea, openGLAvailable
+from libs.tileGrid import TileGrid
+
+
+class TestGLCanvas(unittest.TestCase):
+    """Smoke test of the OpenGL canvas, e.g. on Mesa's llvmpipe with
+    LIBGL_ALWAYS_SOFTWARE=1 under Xvfb. Skipped without OpenGL."""
+
+    def test_paintsTheImage(self):
+        app = QApplication.instance() or QApplication([])
+        if not openGLAvailable():
+            # Not left to the traceback of the skip, which may destroy it
+            # in the middle of a later test.
+            del app
+            self.skipTest('OpenGL is not available')
+        image = QImage(1500, 900, QImage.Format_RGB32)
+        image.fill(QColor(200, 40, 40))
+        image.setPixelColor(1499, 899, QColor(0, 0, 255))
+        canvas, scroll = GLCanvas(), GLScrollArea()
+        scroll.setWidget(canvas)
+        scroll.resize(400, 300)
+        scroll.show()
+        canvas.loadTiles(TileGrid(image, tileSize=512))
+        canvas.scale = 0.25
+        canvas.adjustSize()
+        frame = canvas.grabFramebuffer()
+        self.assertFalse(frame.isNull())
+        offset = canvas.offsetToCenter()
+        x, y = int((10 + offset.x()) * 0.25), int((10 + offset.y()) * 0.25)
+        self.assertEqual(frame.pixelColor(x, y), QColor(200, 40, 40))
+        canvas.renderer.shutdown()
+        scroll.close()
+        del app
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyQt5.QtGui import QImage
+
+from libs.imageCache import ImageCache, imageKey, imageBytes, mipmapKey
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+
+
+def makeImage(width, height=10):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(0)
+    return image
+
+
+class TestImageCache(unittest.TestCase):
+
+    def test_evictsLeastRecentlyUsed_byBytes(self):
+        one = imageBytes(makeImage(10))
+        cache = ImageCache(3 * one)
+        for name in 'abc':
+            cache.put((name, 0, 0), makeImage(10))
+        cache.get(('a', 0, 0))
+        cache.put(('d', 0, 0), makeImage(10))
+        self.assertIsNone(cache.get(('b', 0, 0)))
+        self.assertIsNotNone(cache.get(('a', 0, 0)))
+        self.assertEqual(cache.used, 3 * one)
+
+        # A single image larger than the whole budget is never cached.
+        self.assertFalse(cache.put(('e', 0, 0), makeImage(100)))
+        self.assertEqual(len(cache), 3)
+
+    def test_key_changesWhenFileIsEdited(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'a.bmp')
+            shutil.copy(os.path.join(dir_name, 'test.512.512.bmp'), path)
+            cache = ImageCache(10 << 20)
+            oldKey = imageKey(path)
+            cache.put(oldKey, makeImage(10))
+            os.utime(path, ns=(0, 0))
+            newKey = imageKey(path)
+            self.assertNotEqual(oldKey, newKey)
+            self.assertIsNone(cache.get(newKey))
+
+            # Storing the new decode drops the stale one for the same path.
+            cache.put(newKey, makeImage(10))
+            self.assertEqual(len(cache), 1)
+
+            # Mipmaps are counted by the bytes given, next to the decode.
+            cache.put(mipmapKey(newKey, makeImage(10).size()), [makeImage(5)], 1000)
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(cache.used, imageBytes(makeImage(10)) + 1000)
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import QImage
+
+from libs.imageCache import ImageCache
+from libs.imageLoader import ImageLoader
+from libs.imagePrefetcher import ImagePrefetcher
+
+
+class TestImageLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.prefetcher = ImagePrefetcher(ImageCache(8 << 20))
+        self.loader = ImageLoader(self.prefetcher)
+        self.signals = []
+        self.loader.opened.connect(lambda g, path, opened: self.signals.append(('opened', opened)))
+        self.loader.loaded.connect(lambda g, path, image, size: self.signals.append(('loaded', image, size)))
+        self.loader.tilesLoaded.connect(lambda g, path, tiles, image: self.signals.append(('tiles', tiles)))
+
+    def tearDown(self):
+        self.loader.shutdown()
+        self.prefetcher.shutdown()
+        shutil.rmtree(self.dir)
+
+    def load(self, filePath, maxSize=None, jsonPath=None):
+        # Run here rather than on the worker, as request() would.
+        self.loader.generation += 1
+        self.loader._load(self.loader.generation, filePath, maxSize, jsonPath)
+
+    def test_load_readsStatAndSidecarOffTheGuiThread(self):
+        path = os.path.join(self.dir, 'photo.jpg')
+        image = QImage(400, 300, QImage.Format_RGB32)
+        image.fill(Qt.darkBlue)
+        image.save(path)
+        jsonPath = os.path.join(self.dir, 'photo.json')
+        with open(jsonPath, 'w') as f:
+            json.dump({'image': 'photo', 'year': '1962'}, f)
+        self.load(path, QSize(200, 200), jsonPath)
+        self.assertEqual([signal[0] for signal in self.signals], ['opened', 'loaded'])
+        opened = self.signals[0][1]
+        self.assertEqual(opened.stat.st_size, os.path.getsize(path))
+        self.assertEqual(opened.attributes['year'], '1962')
+        self.assertEqual(self.signals[1][1].size(), QSize(200, 150))
+        self.assertEqual(self.signals[1][2], QSize(400, 300))
+
+    def test_load_createsMissingSidecar(self):
+        path = os.path.join(self.dir, 'photo.jpg')
+        image = QImage(40, 30, QImage.Format_RGB32)
+        image.fill(Qt.darkBlue)
+        image.save(path)
+        jsonPath = os.path.join(self.dir, 'photo.json')
+        self.load(path, None, jsonPath)
+        self.assertTrue(os.path.isfile(jsonPath))
+        attributes = self.signals[0][1].attributes
+        self.assertEqual(attributes['image'], 'photo')
+        self.assertEqual(attributes['year'], '')
+
+    def test_load_mappedFile_isReportedWithItsTiles(self):
+        path = os.path.join(self.dir, 'scan.bmp')
+        image = QImage(64, 48, QImage.Format_RGB888)
+        image.fill(Qt.darkBlue)
+        image.save(path)
+        self.load(path)
+        self.assertEqual([signal[0] for signal in self.signals], ['opened', 'tiles'])
+        self.assertEqual(self.signals[1][1].imageSize, QSize(64, 48))
+
+    def test_load_missingFile_stopsAfterOpened(self):
+        self.load(os.path.join(self.dir, 'gone.jpg'), None, os.path.join(self.dir, 'gone.json'))
+        self.assertEqual(len(self.signals), 1)
+        self.assertIsNone(self.signals[0][1].stat)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'gone.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import QImage
+
+from libs.imageCache import ImageCache, imageKey, previewKey
+from libs.imagePrefetcher import ImagePrefetcher
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+
+
+class TestImagePrefetcher(unittest.TestCase):
+
+    def test_window_followsDirection(self):
+        prefetcher = ImagePrefetcher(ImageCache(1 << 20), ahead=2, behind=1)
+        files = ['f%d' % i for i in range(10)]
+        self.assertEqual(prefetcher.window(files, 5, 1), ['f6', 'f4', 'f7'])
+        self.assertEqual(prefetcher.window(files, 5, -1), ['f4', 'f6', 'f3'])
+        self.assertEqual(prefetcher.window(files, 9, 1), ['f8'])
+        prefetcher.shutdown()
+
+    def test_take_countsHitsAndMisses(self):
+        cache = ImageCache(1 << 20)
+        prefetcher = ImagePrefetcher(cache, ahead=1, behind=0)
+        image = os.path.join(dir_name, 'test.512.512.bmp')
+        missing = os.path.join(dir_name, 'missing.bmp')
+        prefetcher.prefetch(['current', image], 0)
+        self.assertEqual(prefetcher.take(image)[0].width(), 512)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(prefetcher.take(missing))
+        self.assertEqual(prefetcher.counters()['hits'], 1)
+        self.assertEqual(prefetcher.counters()['misses'], 1)
+        prefetcher.shutdown()
+
+    def test_prefetch_decodesPreviews(self):
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'large.jpg')
+            image = QImage(800, 600, QImage.Format_RGB32)
+            image.fill(Qt.darkGreen)
+            image.save(path)
+            cache = ImageCache(8 << 20)
+            prefetcher = ImagePrefetcher(cache, ahead=1, behind=0)
+            prefetcher.prefetch(['current', path], 0, maxSize=QSize(200, 200))
+            preview, fullSize = prefetcher.take(path)
+            self.assertEqual(preview.size(), QSize(200, 150))
+            self.assertEqual(fullSize, QSize(800, 600))
+            self.assertNotIn(imageKey(path), cache)
+            self.assertIn(previewKey(imageKey(path)), cache)
+            # The full decode is preferred once there is one.
+            prefetcher.decode(path).result()
+            self.assertEqual(prefetcher.take(path)[0].size(), QSize(800, 600))
+            prefetcher.shutdown()
+        finally:
+            shutil.rmtree(folder)
+
+    def test_take_noWait_doesNotCountMiss(self):
+        prefetcher = ImagePrefetcher(ImageCache(1 << 20))
+        self.assertIsNone(prefetcher.take(os.path.join(dir_name, 'missing.bmp'), wait=False))
+        self.assertEqual(prefetcher.counters()['misses'], 0)
+        prefetcher.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import gc
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QColor, QGuiApplication, QImage, QImageWriter, QPainter, QPicture
+
+from libs.mappedImage import mapImage, isMappable
+from libs.tileGrid import buildMipmaps
+
+
+def topDownBmp(width, height, pixel):
+    """A 24 bit BMP with rows stored top to bottom (negative height)."""
+    stride = (width * 3 + 3) & ~3
+    row = bytes(bytearray(pixel)) * width + b'\x00' * (stride - width * 3)
+    info = struct.pack('<IiiHHIIiiII', 40, width, -height, 1, 24, 0, stride * height, 0, 0, 0, 0)
+    header = struct.pack('<2sIHHI', b'BM', 14 + 40 + stride * height, 0, 0, 14 + 40)
+    return header + info + row * height
+
+
+class TestMappedImage(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_topDownBmp_isMapped(self):
+        path = os.path.join(self.dir, 'top.bmp')
+        with open(path, 'wb') as f:
+            f.write(topDownBmp(5, 3, (30, 20, 10)))
+        mapped = mapImage(path)
+        self.assertIsNotNone(mapped)
+        self.assertEqual((mapped.image.width(), mapped.image.height()), (5, 3))
+        self.assertEqual(mapped.image.pixelColor(4, 2), QColor(10, 20, 30))
+
+    def test_uncompressedTiff_matchesDecoder(self):
+        path = os.path.join(self.dir, 'scan.tif')
+        image = QImage(37, 21, QImage.Format_RGB888)
+        image.fill(QColor(200, 100, 50))
+        image.setPixelColor(36, 20, QColor(1, 2, 3))
+        writer = QImageWriter(path)
+        writer.setCompression(0)
+        self.assertTrue(writer.write(image))
+        mapped = mapImage(path)
+        self.assertIsNotNone(mapped)
+        self.assertEqual(mapped.image.convertToFormat(QImage.Format_RGB888), image)
+
+    def test_bottomUpBmp_isShownTheRightWayUp(self):
+        image = QImage(1200, 700, QImage.Format_RGB888)
+        image.fill(QColor(0, 0, 0))
+        image.setPixelColor(3, 0, QColor(255, 0, 0))
+        image.setPixelColor(1100, 650, QColor(0, 0, 255))
+        path = os.path.join(self.dir, 'bottom.bmp')
+        image.save(path)
+        mapped = mapImage(path)
+        self.assertTrue(mapped.flipped)
+        grid = mapped.tileGrid()
+        tile = grid.copy(grid.sourceRect(0, 0))
+        self.assertEqual(tile.pixelColor(3, 0), QColor(255, 0, 0))
+        self.assertEqual(grid.copy(grid.sourceRect(2, 1)).pixelColor(1100 - 1024, 650 - 512), QColor(0, 0, 255))
+        mipmap = buildMipmaps(grid.image, flipped=grid.flipped)[0]
+        self.assertGreater(mipmap.pixelColor(1, 0).red(), 0)
+
+    def test_tileGrid_paintsFromTheMapping(self):
+        app = QGuiApplication.instance() or QGuiApplication([])
+        image = QImage(1200, 700, QImage.Format_RGB888)
+        image.fill(QColor(0, 0, 0))
+        image.setPixelColor(3, 0, QColor(255, 0, 0))
+        image.setPixelColor(1100, 650, QColor(0, 0, 255))
+        path = os.path.join(self.dir, 'bottom.bmp')
+        image.save(path)
+        grid = mapImage(path).tileGrid()
+        frame = QImage(1200, 700, QImage.Format_RGB32)
+        p = QPainter(frame)
+        grid.paint(p, QRectF(0, 0, 1200, 700), 1.0)
+        p.end()
+        self.assertEqual(frame.pixelColor(3, 0), QColor(255, 0, 0))
+        self.assertEqual(frame.pixelColor(1100, 650), QColor(0, 0, 255))
+        self.assertEqual(len(grid._tiles), 0)
+        # Painted from copies of the tiles, e.g. for OpenGL
+        picture = QPicture()
+        p = QPainter(picture)
+        grid.paint(p, QRectF(0, 0, 1200, 700), 1.0)
+        p.end()
+        frame.fill(QColor(255, 255, 255))
+        p = QPainter(frame)
+        picture.play(p)
+        p.end()
+        self.assertEqual(frame.pixelColor(3, 0), QColor(255, 0, 0))
+        self.assertEqual(frame.pixelColor(1100, 650), QColor(0, 0, 255))
+        del app
+
+    def test_image_keepsTheFileMapped(self):
+        path = os.path.join(self.dir, 'top.bmp')
+        with open(path, 'wb') as f:
+            f.write(topDownBmp(5, 3, (30, 20, 10)))
+        image = mapImage(path).image
+        gc.collect()
+        self.assertEqual(image.copy().pixelColor(4, 2), QColor(10, 20, 30))
+
+    def test_compressed_isNotMapped(self):
+        image = QImage(8, 8, QImage.Format_RGB888)
+        image.fill(QColor(0, 0, 0))
+        compressed = os.path.join(self.dir, 'lzw.tif')
+        writer = QImageWriter(compressed)
+        writer.setCompression(1)
+        writer.write(image)
+        self.assertFalse(isMappable(compressed))
+        self.assertIsNone(mapImage(compressed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import pickle
+import unittest
+
+from libs.pathTable import PathTable, splitPath
+
+
+class TestPathTable(unittest.TestCase):
+
+    def test_storesFoldersOnce_andRestoresPaths(self):
+        paths = ['/a/1.jpg', '/a/2.jpg', '/b/été.jpg', '/b/bad\udcff.jpg', 'loose.jpg']
+        table = PathTable(paths)
+        self.assertEqual(list(table), paths)
+        self.assertEqual(table[2], paths[2])
+        self.assertEqual(table[-1], 'loose.jpg')
+        self.assertEqual(table.folders, ['/a/', '/b/', ''])
+        self.assertEqual(splitPath('/a/1.jpg'), ('/a/', '1.jpg'))
+        self.assertEqual(list(pickle.loads(pickle.dumps(table))), paths)
+
+    def test_insertDelete_andCompare(self):
+        table = PathTable(['/a/%d.jpg' % i for i in range(10)])
+        table.insert(0, '/a/first.jpg')
+        del table[5]
+        expected = ['/a/first.jpg'] + ['/a/%d.jpg' % i for i in range(10) if i != 4]
+        self.assertEqual(list(table), expected)
+        self.assertTrue(table == expected)
+        self.assertTrue(table == PathTable(expected))
+        self.assertTrue(table.reordered(range(len(table))) == PathTable(expected))
+        for i in range(6):
+            del table[0]
+        # Compacted: the names of removed entries are dropped.
+        self.assertEqual(len(table._pool), sum(len(name) for name in ['5.jpg', '6.jpg', '7.jpg', '8.jpg', '9.jpg']))
+        self.assertEqual(list(table), expected[6:])
+        self.assertTrue(table != PathTable(expected[6:-1] + ['/b/9.jpg']))
+
+    def test_parts_roundTrip(self):
+        table = PathTable(['/a/1.jpg', '/b/été.jpg', '/b/bad\udcff.jpg', '/a/2.jpg'])
+        table.insert(0, '/c/0.jpg')
+        del table[2]
+        folders, folderIds, lengths, names = table.parts()
+        self.assertEqual(len(names), sum(lengths))
+        copy = PathTable.fromParts(folders, folderIds, lengths, names)
+        self.assertEqual(list(copy), list(table))
+        copy.append('/a/3.jpg')
+        self.assertEqual(copy.folders, table.folders)
+        self.assertRaises(ValueError, PathTable.fromParts, folders, folderIds, lengths, names[:-1])
+        self.assertRaises(ValueError, PathTable.fromParts, folders[:1], folderIds, lengths, names)
+
+
+if __name__ == '__main__':
+    unittest.main()
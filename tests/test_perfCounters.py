@@ -0,0 +1,38 @@
+import unittest
+
+from libs.perfCounters import PerfCounters
+
+
+class TestPerfCounters(unittest.TestCase):
+
+    def test_stats_rollingPercentiles(self):
+        perf = PerfCounters(window=100)
+        for ms in range(1, 201):
+            perf.record('paintEvent', float(ms))
+        stats = perf.stats('paintEvent')
+        self.assertEqual(stats['count'], 100)
+        self.assertEqual(stats['last'], 200.0)
+        self.assertEqual(stats['p50'], 150.0)
+        self.assertEqual(stats['p99'], 199.0)
+        self.assertEqual(perf.stats('missing')['count'], 0)
+
+    def test_stats_nearestRankOnSmallWindow(self):
+        perf = PerfCounters(window=10)
+        for ms in range(1, 11):
+            perf.record('frame', float(ms))
+        stats = perf.stats('frame')
+        self.assertEqual(stats['p50'], 5.0)
+        self.assertEqual(stats['p95'], 10.0)
+
+    def test_counters_includeTimersAndGauges(self):
+        perf = PerfCounters()
+        with perf.timer('adjustScale'):
+            pass
+        perf.set('shapesPainted', 3)
+        counters = perf.counters()
+        self.assertEqual(counters['adjustScale']['count'], 1)
+        self.assertEqual(counters['shapesPainted'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
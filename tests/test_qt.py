@@ -1,7 +1,11 @@
 
+import shutil
+import tempfile
 from unittest import TestCase
 
 from labelImg import get_main_app
+from libs.dirSnapshot import DirSnapshot
+from libs.fileCatalog import FileCatalog
 
 
 class TestMainWindow(TestCase):
@@ -18,3 +22,21 @@ class TestMainWindow(TestCase):
 
     def test_noop(self):
         pass
+
+    def test_dirScanFinished_adoptsOrderedCatalog(self):
+        root = tempfile.mkdtemp()
+        try:
+            # Streamed in scan order, which happens to be natural order.
+            streamed = FileCatalog()
+            streamed.extend(['/p/img1.jpg', '/p/img5.jpg'])
+            self.win.dirname = root
+            self.win.mImgFileList = streamed
+            self.win.fileListModel.setFilePaths(streamed)
+            ordered = FileCatalog(['/p/img1.jpg', '/p/img5.jpg'])
+            self.win.dirScanFinished(self.win.dirScanner.generation, ordered, DirSnapshot(root))
+            self.assertIs(self.win.mImgFileList, ordered)
+            self.assertIs(self.win.fileListModel.filePaths, ordered)
+            self.assertEqual(self.win.fileListModel.insertFilePath('/p/img3.jpg'), 1)
+        finally:
+            self.win.dirWatcher.stop()
+            shutil.rmtree(root)
@@ -0,0 +1,47 @@
+import unittest
+
+from PyQt5.QtCore import QPointF, QRectF
+from PyQt5.QtGui import QColor
+
+from libs.shape import Shape, DEFAULT_LINE_COLOR
+
+
+class TestShape(unittest.TestCase):
+
+    def setUp(self):
+        self.shape = Shape('wagon')
+        for point in [(10, 10), (50, 10), (50, 30), (10, 30)]:
+            self.shape.addPoint(QPointF(*point))
+        self.shape.close()
+
+    def test_geometry_followsPointChanges(self):
+        shape = self.shape
+        self.assertEqual(shape.boundingRect(), QRectF(10, 10, 40, 20))
+        self.assertTrue(shape.containsPoint(QPointF(20, 20)))
+        shape.moveBy(QPointF(100, 0))
+        self.assertEqual(shape.boundingRect(), QRectF(110, 10, 40, 20))
+        self.assertFalse(shape.containsPoint(QPointF(20, 20)))
+        shape[-1] = QPointF(100, 40)
+        self.assertEqual(shape[3], QPointF(100, 40))
+        self.assertEqual(shape.boundingRect(), QRectF(100, 10, 50, 30))
+        self.assertEqual(shape.nearestVertex(QPointF(149, 31), 2), 2)
+
+    def test_index_outOfRange_raisesIndexError(self):
+        empty = Shape('wagon')
+        self.assertRaises(IndexError, lambda: empty[-1])
+        self.assertRaises(IndexError, lambda: empty[0])
+        self.assertRaises(IndexError, lambda: self.shape[-5])
+        self.assertRaises(IndexError, lambda: self.shape[4])
+        self.assertEqual(self.shape[-4], self.shape[0])
+
+    def test_colors_overrideClassDefault(self):
+        other = self.shape.copy()
+        self.assertEqual(self.shape.line_color, DEFAULT_LINE_COLOR)
+        self.shape.line_color = QColor(1, 2, 3)
+        self.assertEqual(self.shape.copy().line_color, QColor(1, 2, 3))
+        self.assertEqual(other.line_color, Shape.line_color)
+        self.assertEqual(other.points, self.shape.points)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+from PyQt5.QtCore import QPointF
+
+from libs.shape import Shape
+from libs.shapeIndex import ShapeIndex
+
+
+def box(x, y, w, h):
+    shape = Shape()
+    for point in [(x, y), (x + w, y), (x + w, y + h), (x, y + h)]:
+        shape.addPoint(QPointF(*point))
+    shape.close()
+    return shape
+
+
+class TestShapeIndex(unittest.TestCase):
+
+    def test_query_topmostFirst(self):
+        index = ShapeIndex(cellSize=50)
+        below, above, far = box(0, 0, 200, 100), box(150, 50, 100, 100), box(1000, 1000, 10, 10)
+        index.rebuild([below, above, far])
+        self.assertEqual(index.query(QPointF(160, 60)), [above, below])
+        self.assertEqual(index.query(QPointF(10, 10)), [below])
+        self.assertEqual(index.query(QPointF(500, 500)), [])
+        self.assertEqual(index.query(QPointF(1015, 1005), margin=6), [far])
+
+    def test_update_followsMovesAndRemoval(self):
+        index = ShapeIndex(cellSize=50)
+        shape = box(0, 0, 20, 20)
+        index.insert(shape)
+        shape.moveBy(QPointF(300, 300))
+        index.update(shape)
+        self.assertEqual(index.query(QPointF(10, 10)), [])
+        self.assertEqual(index.query(QPointF(310, 310)), [shape])
+        index.remove(shape)
+        self.assertEqual(index.query(QPointF(310, 310)), [])
+        self.assertEqual(len(index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
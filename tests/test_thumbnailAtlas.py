@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from libs.thumbnailAtlas import INDEX_FILENAME, ThumbnailAtlas
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+
+
+class TestThumbnailAtlas(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.tmp, 'cache')
+        self.images = []
+        for i in range(3):
+            path = os.path.join(self.tmp, 'img%d.bmp' % i)
+            shutil.copy(os.path.join(dir_name, 'test.512.512.bmp'), path)
+            self.images.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_fill_persistsAcrossReopen(self):
+        atlas = ThumbnailAtlas(self.cacheDir, size=32)
+        added = []
+        atlas.fill(self.images, lambda path, slot: added.append(slot))
+        atlas.wait()
+        self.assertEqual(sorted(added), [0, 1, 2])
+        atlas.close()
+
+        atlas = ThumbnailAtlas(self.cacheDir, size=32)
+        self.assertEqual(len(atlas), 3)
+        thumbnail = atlas.thumbnail(self.images[1])
+        self.assertEqual((thumbnail.width(), thumbnail.height()), (32, 32))
+        self.assertTrue(atlas.isCurrent(self.images[1], os.stat(self.images[1])))
+
+        # An edited file is outdated and refilled into the same slot.
+        os.utime(self.images[1], ns=(0, 0))
+        self.assertFalse(atlas.isCurrent(self.images[1], os.stat(self.images[1])))
+        added = []
+        atlas.fill(self.images, lambda path, slot: added.append(slot))
+        atlas.wait()
+        self.assertEqual(added, [1])
+        self.assertTrue(atlas.thumbnail(os.path.join(self.tmp, 'missing.bmp')).isNull())
+        atlas.close()
+
+    def test_badIndex_isACacheMiss(self):
+        atlas = ThumbnailAtlas(self.cacheDir, size=32)
+        atlas.fill(self.images)
+        atlas.wait()
+        atlas.close()
+        indexPath = os.path.join(self.cacheDir, INDEX_FILENAME)
+        with open(indexPath, 'rb') as f:
+            index = f.read()
+        for damaged in (index[:-1], index + b'x', b'\x80\x04K\x01.'):
+            with open(indexPath, 'wb') as f:
+                f.write(damaged)
+            atlas = ThumbnailAtlas(self.cacheDir, size=32)
+            self.assertEqual(len(atlas), 0)
+            atlas.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
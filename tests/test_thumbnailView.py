@@ -0,0 +1,79 @@
+import os
+import unittest
+
+try:
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+except ImportError:
+    from PyQt4.QtGui import QApplication, QImage
+
+from libs.fileListModel import FileListModel
+from libs.thumbnailView import MAX_PENDING_REQUESTS, ThumbnailLoader, ThumbnailModel
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+
+
+class TestThumbnailLoader(unittest.TestCase):
+
+    def setUp(self):
+        # Without its worker the queue is left as the requests made it.
+        self.loader = ThumbnailLoader()
+        self.loader.stop()
+
+    def test_request_keepsNewestAndSkipsDuplicates(self):
+        for row in range(MAX_PENDING_REQUESTS + 10):
+            self.loader.request(row, 'f%d' % row)
+        self.loader.request(MAX_PENDING_REQUESTS + 9, 'f%d' % (MAX_PENDING_REQUESTS + 9))
+        queue = list(self.loader._queue)
+        self.assertEqual(len(queue), MAX_PENDING_REQUESTS)
+        self.assertEqual(queue[0], (10, 'f10'))
+        # Served from the end: the newest request first.
+        self.assertEqual(queue[-1], (MAX_PENDING_REQUESTS + 9, 'f%d' % (MAX_PENDING_REQUESTS + 9)))
+        self.assertEqual(self.loader._pending, set(queue))
+
+    def test_retain_dropsRowsOutOfSight(self):
+        for row in range(10):
+            self.loader.request(row, 'f%d' % row)
+        self.loader.retain(3, 5)
+        self.assertEqual(list(self.loader._queue), [(3, 'f3'), (4, 'f4'), (5, 'f5')])
+        # A dropped row can be asked for again.
+        self.loader.request(0, 'f0')
+        self.assertEqual(self.loader._queue[-1], (0, 'f0'))
+        self.loader.clear()
+        self.assertEqual(len(self.loader._queue), 0)
+        self.assertEqual(self.loader._pending, set())
+
+
+class TestThumbnailModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.source = FileListModel()
+        self.source.setFilePaths(['/p/a.jpg', '/p/b.jpg'])
+        self.model = ThumbnailModel()
+        self.model.setSourceModel(self.source)
+        self.changed = []
+        self.model.dataChanged.connect(lambda first, last, roles: self.changed.append(first.row()))
+        self.image = QImage(os.path.join(dir_name, 'test.512.512.bmp'))
+
+    def tearDown(self):
+        self.model.loader.stop()
+
+    def test_thumbnailLoaded_ignoresRowsWhosePathChanged(self):
+        self.model.thumbnailLoaded(0, '/p/b.jpg', self.image)
+        self.assertEqual(self.changed, [])
+        self.assertNotIn('/p/b.jpg', self.model._pixmaps)
+        self.model.thumbnailLoaded(1, '/p/b.jpg', self.image)
+        self.assertEqual(self.changed, [1])
+        self.assertIn('/p/b.jpg', self.model._pixmaps)
+
+    def test_thumbnailLoaded_ignoresFailedDecodes(self):
+        self.model.thumbnailLoaded(0, '/p/a.jpg', QImage())
+        self.assertEqual(self.changed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
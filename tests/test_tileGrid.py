@@ -0,0 +1,64 @@
+import unittest
+
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QGuiApplication, QImage, QPainter
+
+from libs.tileGrid import TileGrid, buildMipmaps, pixmapBytes
+
+
+class TestTileGrid(unittest.TestCase):
+
+    def test_render_matchesScaledImage(self):
+        image = QImage(300, 200, QImage.Format_RGB32)
+        image.fill(QColor(10, 20, 30))
+        image.setPixelColor(299, 199, QColor(250, 0, 0))
+        grid = TileGrid(image, tileSize=64)
+        frame = QImage(150, 100, QImage.Format_RGB32)
+        frame.fill(Qt.white)
+        p = QPainter(frame)
+        p.scale(0.5, 0.5)
+        self.assertFalse(grid.render(p, QRectF(0, 0, 300, 200), 0.5, stop=lambda: True))
+        self.assertTrue(grid.render(p, QRectF(0, 0, 300, 200), 0.5))
+        p.end()
+        self.assertEqual(frame.pixelColor(10, 10), QColor(10, 20, 30))
+        self.assertGreater(frame.pixelColor(149, 99).red(), 60)
+        # No pixmaps, which only the GUI thread may create
+        self.assertEqual(len(grid._tiles), 0)
+
+    def test_mipmaps_pickedNearestAboveScale(self):
+        image = QImage(2000, 1000, QImage.Format_RGB32)
+        image.fill(Qt.gray)
+        mipmaps = buildMipmaps(image, minSize=200)
+        self.assertEqual([m.width() for m in mipmaps], [1000, 500, 250])
+        grid = TileGrid(image)
+        self.assertEqual(grid.sourceSize(0.1).width(), 2000)
+        grid.setMipmaps(mipmaps)
+        self.assertEqual(grid.sourceSize(0.1).width(), 250)
+        self.assertEqual(grid.sourceSize(0.3).width(), 1000)
+        self.assertEqual(grid.sourceSize(2.0).width(), 2000)
+        self.assertEqual(grid.levelFor(0.25).imageSize, image.size())
+
+    def test_tiles_stayWithinBudget(self):
+        app = QGuiApplication.instance() or QGuiApplication([])
+        image = QImage(1024, 1024, QImage.Format_RGB32)
+        image.fill(Qt.gray)
+        grid = TileGrid(image, tileSize=64)
+        tileBytes = pixmapBytes(grid.tile(0, 0))
+        grid._tiles.setBudget(10 * tileBytes)
+        for row in range(16):
+            for col in range(16):
+                grid.tile(col, row)
+        self.assertEqual(len(grid._tiles), 10)
+        self.assertLessEqual(grid._tiles.used, 10 * tileBytes)
+        self.assertIn(((1024, 15, 15), 64), grid._tiles)
+        grid.setMipmaps(buildMipmaps(image, minSize=200))
+        mipmap = grid._mipmaps[0]
+        self.assertIs(mipmap._tiles, grid._tiles)
+        mipmap.tile(0, 0)
+        self.assertIn(((512, 0, 0), 64), grid._tiles)
+        self.assertIn(((1024, 15, 15), 64), grid._tiles)
+        del app
+
+
+if __name__ == '__main__':
+    unittest.main()
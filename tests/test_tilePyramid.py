@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PyQt5.QtGui import QImage, QColor
+
+from libs.tilePyramid import INFO_FILENAME, PyramidBuilder, TilePyramid, buildPyramid, openPyramid, \
+    pyramidDirectory, tilePath
+
+
+class TestTilePyramid(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'scan.png')
+        image = QImage(1100, 700, QImage.Format_RGB888)
+        image.fill(QColor(40, 80, 120))
+        image.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_build_writesAllLevels(self):
+        directory = os.path.join(self.dir, 'pyramid')
+        self.assertTrue(buildPyramid(self.path, directory, tileSize=256))
+        pyramid = TilePyramid(directory)
+        self.assertEqual(pyramid.levels, [(1100, 700), (550, 350), (275, 175), (137, 87)])
+        self.assertEqual((pyramid.imageSize.width(), pyramid.imageSize.height()), (1100, 700))
+        self.assertEqual((pyramid.overview().width(), pyramid.overview().height()), (137, 87))
+        self.assertEqual(QImage(tilePath(directory, 0, 4, 2)).width(), 1100 - 4 * 256)
+        self.assertEqual(pyramid.levelFor(1.0), 0)
+        self.assertEqual(pyramid.levelFor(0.5), 1)
+        self.assertEqual(pyramid.levelFor(0.3), 1)
+        self.assertEqual(pyramid.levelFor(0.2), 2)
+        self.assertEqual(pyramid.levelFor(0.1), 3)
+
+    def test_build_keepsAlpha(self):
+        path = os.path.join(self.dir, 'cutout.png')
+        image = QImage(600, 400, QImage.Format_ARGB32)
+        image.fill(QColor(200, 0, 0, 0))
+        image.save(path)
+        directory = os.path.join(self.dir, 'pyramid')
+        self.assertTrue(buildPyramid(path, directory, tileSize=256))
+        pyramid = TilePyramid(directory)
+        self.assertEqual(pyramid.tileFormat, 'png')
+        self.assertTrue(pyramid.overview().hasAlphaChannel())
+        self.assertEqual(pyramid.overview().pixelColor(10, 10).alpha(), 0)
+        self.assertEqual(pyramid.tileImage(0, 2, 1).pixelColor(10, 10).alpha(), 0)
+
+    def test_builder_skipsSmallImages(self):
+        self.assertIsNone(openPyramid(self.path))
+        builder = PyramidBuilder(minPixels=2000 * 2000)
+        self.assertFalse(builder._build(self.path))
+        builder.minPixels = 1000
+        self.assertTrue(builder._build(self.path))
+        builder.shutdown()
+        self.assertTrue(os.path.isdir(pyramidDirectory(self.path)))
+        self.assertEqual(openPyramid(self.path).levels[0], (1100, 700))
+
+    def test_pyramid_followsEditsInPlace(self):
+        builder = PyramidBuilder(minPixels=1000)
+        self.assertTrue(builder._build(self.path))
+        # Same size, new pixels: the pyramid is outdated.
+        with open(self.path, 'r+b') as f:
+            f.seek(os.path.getsize(self.path) // 2)
+            f.write(b'x')
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(openPyramid(self.path))
+        image = QImage(1100, 700, QImage.Format_RGB888)
+        image.fill(QColor(200, 0, 0))
+        image.save(self.path)
+        self.assertTrue(builder._build(self.path))
+        self.assertEqual(openPyramid(self.path).overview().pixelColor(10, 10).red(), 200)
+        builder.shutdown()
+
+    def test_damagedInfo_isNoPyramid(self):
+        self.assertTrue(PyramidBuilder(minPixels=1000)._build(self.path))
+        for damaged in (b'\x80\x04K\x01.', b'{"version": 3, "levels": []}', b'[]'):
+            with open(os.path.join(pyramidDirectory(self.path), INFO_FILENAME), 'wb') as f:
+                f.write(damaged)
+            self.assertIsNone(openPyramid(self.path))
+
+    def test_builder_forgetsFinishedBuilds(self):
+        builder = PyramidBuilder(minPixels=2000 * 2000)
+        builder.request(self.path)
+        builder._futures[self.path].result()
+        builder.request(os.path.join(self.dir, 'other.png'))
+        self.assertEqual(list(builder._futures), [os.path.join(self.dir, 'other.png')])
+        builder.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()